@@ -0,0 +1,4 @@
+import os
+
+# pytest (pytest-django): test keshi va channel layer (settings.TESTING)
+os.environ.setdefault("DJANGO_TESTING", "1")
@@ -0,0 +1,166 @@
+import gzip
+import json
+import os
+import re
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .maintenance import prune_servings
+from .models import Meal, Serving
+from .reports import build_monthly_reports, month_bounds, parse_month
+from .rollups import rebuild_rollups
+
+MONTH_RE = re.compile(r"^\d{4}-\d{2}$")
+PART_RE = re.compile(r"^part-(\d+)\.ndjson\.gz$")
+FIELDS = ("id", "meal_id", "user_id", "date_served", "portion_count")
+
+
+def month_dir(month):
+    return os.path.join(
+        settings.SERVING_ARCHIVE_ROOT, parse_month(month).strftime("%Y-%m")
+    )
+
+
+def archive_parts(month):
+    directory = month_dir(month)
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(name for name in os.listdir(directory) if PART_RE.match(name))
+    return [os.path.join(directory, name) for name in names]
+
+
+# Arxivlangan oylar: ["2024-01", ...]
+def archived_months():
+    root = settings.SERVING_ARCHIVE_ROOT
+    if not os.path.isdir(root):
+        return []
+    months = [name for name in os.listdir(root) if MONTH_RE.match(name)]
+    return sorted(month for month in months if archive_parts(month))
+
+
+# Bazada saqlanadigan oxirgi `months` oy: undan oldingi oylar arxivlanadi
+def retention_cutoff(months=None):
+    if months is None:
+        months = settings.SERVING_RETENTION_MONTHS
+    month = timezone.localdate().replace(day=1)
+    index = month.year * 12 + month.month - 1 - months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+# Oyning hamma qatorlari yangi qism faylga: avval vaqtinchalik faylga
+# yoziladi, keyin os.replace — yarim yozilgan qism hech qachon ko‘rinmaydi.
+# (qatorlar soni, eng katta id) qaytariladi
+def write_part(month, servings):
+    directory = month_dir(month)
+    os.makedirs(directory, exist_ok=True)
+    parts = archive_parts(month)
+    number = int(PART_RE.match(os.path.basename(parts[-1])).group(1)) if parts else 0
+    count, last_pk = 0, None
+    handle, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        rows = servings.order_by("pk").values_list(*FIELDS).iterator(chunk_size=5000)
+        with os.fdopen(handle, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb") as stream:
+                for row in rows:
+                    record = dict(zip(FIELDS, row))
+                    record["date_served"] = record["date_served"].isoformat()
+                    stream.write(json.dumps(record).encode() + b"\n")
+                    count += 1
+                    last_pk = record["id"]
+            raw.flush()
+            os.fsync(raw.fileno())
+        if count:
+            os.replace(
+                tmp_path, os.path.join(directory, f"part-{number + 1:04d}.ndjson.gz")
+            )
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return count, last_pk
+
+
+# Bitta oyni arxivlash: kunlik yig‘indi va yetishmayotgan hisobotlar xom
+# qatorlardan tayyorlanadi, qatorlar qism faylga yoziladi, keyin qismlab o‘chiriladi.
+# Qayta ishga tushirish xavfsiz: o‘chirishdan oldin to‘xtagan bo‘lsa, qatorlar
+# keyingi qismga qayta yoziladi, o‘qishda id bo‘yicha takrorlar tashlanadi
+def archive_month(month, chunk_size=10000, progress=None):
+    month = parse_month(month)
+    start, end = month_bounds(month)
+    servings = Serving.objects.filter(date_served__gte=start, date_served__lt=end)
+    if not servings.exists():
+        return {"month": month.strftime("%Y-%m"), "archived": 0, "deleted": 0}
+    last_day = timezone.localdate(end) - timedelta(days=1)
+    if not archive_parts(month):
+        # Birinchi marta: barcha xom qatorlar hali bazada
+        rebuild_rollups(since=month, until=last_day)
+        # Faqat yo‘q hisobotlar yaratiladi: mavjudlari tarix — ularning
+        # possible_portions va ogohlantirishi joriy zaxiradan qayta yozilmaydi.
+        # Tayyorlangan porsiyalar kunlik yig‘indidan olinadi, shuning uchun
+        # o‘chirilgandan keyin ham qayta hisoblash mumkin
+        missing = list(
+            Meal.objects.exclude(reports__month=month).values_list("pk", flat=True)
+        )
+        if missing:
+            build_monthly_reports(month, missing)
+
+    archived, last_pk = write_part(month, servings)
+    deleted = 0
+    for count, _ in prune_servings(
+        last_day + timedelta(days=1), chunk_size, since=month, max_pk=last_pk
+    ):
+        deleted += count
+        if progress is not None:
+            progress(month, archived, deleted)
+    return {"month": month.strftime("%Y-%m"), "archived": archived, "deleted": deleted}
+
+
+# Saqlash muddatidan (before oyidan) oldingi barcha oylarni arxivlash
+def archive_expired(before=None, chunk_size=10000, progress=None):
+    before = parse_month(before) if before is not None else retention_cutoff()
+    cutoff = timezone.make_aware(datetime.combine(before, datetime.min.time()))
+    months = list(
+        Serving.objects.filter(date_served__lt=cutoff).dates("date_served", "month")
+    )
+    results = []
+    for index, month in enumerate(months):
+        started = time.perf_counter()
+
+        def report(month, archived, deleted, index=index):
+            progress(
+                {
+                    "month": month.strftime("%Y-%m"),
+                    "months_done": index,
+                    "months_total": len(months),
+                    "archived": archived,
+                    "deleted": deleted,
+                }
+            )
+
+        result = archive_month(month, chunk_size, report if progress else None)
+        result["seconds"] = round(time.perf_counter() - started, 3)
+        results.append(result)
+    return results
+
+
+# Arxivlangan oy qatorlari (audit uchun), ixtiyoriy ovqat/foydalanuvchi filtri
+def read_archive(month, meal_id=None, user_id=None):
+    parts = archive_parts(month)
+    # Takrorlar faqat qayta ishga tushirilgan arxivlashda (bir nechta qism)
+    seen = set() if len(parts) > 1 else None
+    for path in parts:
+        with gzip.open(path, "rt", encoding="utf-8") as stream:
+            for line in stream:
+                record = json.loads(line)
+                if seen is not None:
+                    if record["id"] in seen:
+                        continue
+                    seen.add(record["id"])
+                if meal_id is not None and record["meal_id"] != meal_id:
+                    continue
+                if user_id is not None and record["user_id"] != user_id:
+                    continue
+                yield record
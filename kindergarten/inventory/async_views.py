@@ -0,0 +1,225 @@
+import base64
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db.models import Count, F, Q, Sum
+from django.http import JsonResponse
+from django.utils.dateparse import parse_date
+from rest_framework.utils.encoders import JSONEncoder
+
+from .authentication import authenticate_token
+from .cache import REPORTS, SERVINGS, STOCK, aget_or_compute
+from .models import Ingredient, Meal, Report, ServingDailyRollup
+from .pagination import ReportCursorPagination
+from .portions import graph_portions, to_count
+from .rollups import day_range, monthly_totals
+from .serializers import IngredientSerializer, ReportSerializer
+from .views import range_key
+
+# Sinxron API bilan bir xil kesh kalitlari va javob maydonlari: ikkala
+# yo‘l bir-birining keshlangan natijasidan foydalanadi
+
+
+def json_response(data, status=200, headers=None):
+    return JsonResponse(
+        data, encoder=JSONEncoder, safe=False, status=status, headers=headers
+    )
+
+
+def _session_user(request):
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
+        return None
+    hasattr(user, "role")  # rolni shu oqimda yuklab qo‘yish
+    return user
+
+
+# DRF TokenAuthentication + SessionAuthentication'ning async muqobili
+async def authenticate(request):
+    scheme, _, key = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() == "token":
+        # Sinxron API bilan bir xil keshlangan token -> (foydalanuvchi, rol)
+        principal = await sync_to_async(authenticate_token)(key.strip())
+        if principal is None or not principal[0].is_active:
+            return None, "Invalid token."
+        return principal[0], None
+    user = await sync_to_async(_session_user)(request)
+    if user is None:
+        return None, "Authentication credentials were not provided."
+    return user, None
+
+
+# Faqat GET, autentifikatsiya talab qilinadi (IsAuthenticated kabi)
+def async_api(view):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return json_response(
+                {"detail": f'Method "{request.method}" not allowed.'},
+                status=405,
+                headers={"Allow": "GET, HEAD"},
+            )
+        user, error = await authenticate(request)
+        if user is None:
+            return json_response(
+                {"detail": error}, status=401, headers={"WWW-Authenticate": "Token"}
+            )
+        request.user = user
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def bad_date():
+    return json_response(
+        {"error": "Sana YYYY-MM-DD formatida bo‘lishi kerak"}, status=400
+    )
+
+
+@async_api
+async def ingredient_list(request):
+    fields = IngredientSerializer.Meta.fields
+    return json_response([row async for row in Ingredient.objects.values(*fields)])
+
+
+@async_api
+async def low_stock(request):
+    async def compute():
+        rows = Ingredient.objects.filter(quantity__lte=F("min_quantity")).values(
+            *IngredientSerializer.Meta.fields
+        )
+        return [row async for row in rows]
+
+    return json_response(await aget_or_compute(STOCK, ("low_stock",), compute))
+
+
+def _encode_cursor(report):
+    raw = f"{report['month'].isoformat()}|{report['id']}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def _decode_cursor(cursor):
+    month, _, pk = base64.urlsafe_b64decode(cursor.encode()).decode().partition("|")
+    month = parse_date(month)
+    if month is None:
+        raise ValueError(cursor)
+    return month, int(pk)
+
+
+# Hisobotlar: -month, -id bo‘yicha keyset sahifalash (faqat "next" havolasi)
+@async_api
+async def report_list(request):
+    paginator = ReportCursorPagination
+    page_size = request.GET.get(paginator.page_size_query_param)
+    try:
+        page_size = min(int(page_size or paginator.page_size), paginator.max_page_size)
+        cursor = request.GET.get("cursor")
+        after = _decode_cursor(cursor) if cursor else None
+    except (TypeError, ValueError, UnicodeDecodeError):
+        return json_response({"detail": "Invalid cursor"}, status=404)
+    if page_size < 1:
+        page_size = paginator.page_size
+
+    reports = Report.objects.order_by(*paginator.ordering)
+    if after is not None:
+        month, pk = after
+        reports = reports.filter(Q(month__lt=month) | Q(month=month, id__lt=pk))
+    fields = [field for field in ReportSerializer.Meta.fields if field != "meal"]
+    rows = [row async for row in reports.values(*fields, "meal__name")[: page_size + 1]]
+
+    next_url = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        query = request.GET.copy()
+        query["cursor"] = _encode_cursor(rows[-1])
+        next_url = request.build_absolute_uri(f"{request.path}?{query.urlencode()}")
+    results = []
+    for row in rows:
+        row["meal"] = row.pop("meal__name")
+        results.append({field: row[field] for field in ReportSerializer.Meta.fields})
+    return json_response({"next": next_url, "previous": None, "results": results})
+
+
+@async_api
+async def report_warnings(request):
+    async def compute():
+        rows = (
+            Report.objects.filter(warning_triggered=True)
+            .values("meal__name")
+            .annotate(count=Count("pk"))
+        )
+        return [row async for row in rows]
+
+    return json_response(await aget_or_compute(REPORTS, ("warnings",), compute))
+
+
+@async_api
+async def portion_estimate(request):
+    try:
+        meal_id = int(request.GET.get("meal_id"))
+    except (TypeError, ValueError):
+        meal_id = None
+    meal = await Meal.objects.filter(pk=meal_id).afirst() if meal_id else None
+    if meal is None:
+        return json_response({"error": "Ovqat topilmadi"}, status=404)
+
+    # Retsept grafi jarayon ichida (qulf bilan) — sinxron qism oqimda ishlaydi
+    async def compute():
+        portions = await sync_to_async(graph_portions)([meal.id])
+        return to_count(portions[meal.id])
+
+    portions = await aget_or_compute(STOCK, ("portions", meal.id), compute)
+    return json_response({"meal": meal.name, "possible_portions": portions})
+
+
+@async_api
+async def servings_by_user(request):
+    try:
+        days = day_range(request.GET)
+    except ValueError:
+        return bad_date()
+
+    async def compute():
+        rows = (
+            ServingDailyRollup.objects.filter(**days)
+            .values("user__username")
+            .annotate(total_portions=Sum("portions"))
+            .order_by("user__username")
+        )
+        return [row async for row in rows]
+
+    return json_response(
+        await aget_or_compute(SERVINGS, range_key("by_user", days), compute)
+    )
+
+
+@async_api
+async def servings_by_date(request):
+    try:
+        days = day_range(request.GET)
+    except ValueError:
+        return bad_date()
+
+    async def compute():
+        return await sync_to_async(monthly_totals)(days)
+
+    return json_response(
+        await aget_or_compute(SERVINGS, range_key("by_date", days), compute)
+    )
+
+
+@async_api
+async def meals_by_type(request):
+    try:
+        days = day_range(request.GET, "daily_rollups__day")
+    except ValueError:
+        return bad_date()
+    portions = Sum("daily_rollups__portions", filter=Q(**days) if days else None)
+
+    async def compute():
+        rows = Meal.objects.values("type").annotate(portions=portions)
+        return [row async for row in rows]
+
+    return json_response(
+        await aget_or_compute(SERVINGS, range_key("by_type", days), compute)
+    )
@@ -0,0 +1,167 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .cache import AUTH, make_key, namespace_version_with
+from .models import UserRole
+
+# Parol xeshi keshga yozilmaydi — foydalanuvchida kechiktirilgan maydon bo‘ladi
+USER_FIELDS = [
+    field.attname for field in User._meta.concrete_fields if field.name != "password"
+]
+TOKEN_FIELDS = [field.attname for field in Token._meta.concrete_fields]
+
+
+# Jarayon ichidagi LRU: kalit -> (AUTH versiyasi, muddat, qiymat). Versiya
+# oshsa (rol yoki foydalanuvchi o‘zgardi) yozuvlar keyingi o‘qishda tashlanadi.
+# Hisoblagichlar jarayon bo‘yicha: LRU, umumiy kesh va baza murojaatlari
+class PrincipalCache:
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = dict.fromkeys(
+            ["hits", "misses", "shared_hits", "shared_misses", "revoked"], 0
+        )
+
+    def count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (
+                entry[0] != version or entry[1] < time.monotonic()
+            ):
+                del self._entries[key]
+                entry = None
+            self.counters["hits" if entry else "misses"] += 1
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def set(self, key, version, value):
+        with self._lock:
+            self._entries[key] = (version, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.counters = dict.fromkeys(self.counters, 0)
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self.counters,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+            }
+
+
+principals = PrincipalCache(settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TTL)
+
+
+# Token keshda ochiq ko‘rinishda saqlanmaydi
+def _digest(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _revoked_key(digest):
+    return f"auth:revoked:{digest}"
+
+
+# Token, foydalanuvchi va rol bitta JOIN so‘rov bilan. Keshga yoziladigan
+# oddiy qiymatlar qaytariladi, token topilmasa None
+def load_principal(key):
+    token = Token.objects.select_related("user", "user__role").filter(key=key).first()
+    if token is None:
+        return None
+    user = token.user
+    try:
+        role = user.role.role
+    except UserRole.DoesNotExist:
+        role = None
+    return (
+        [getattr(token, name) for name in TOKEN_FIELDS],
+        [getattr(user, name) for name in USER_FIELDS],
+        role,
+    )
+
+
+# Har so‘rov uchun yangi (bazadan o‘qilgandek) User va Token obyektlari
+def build_principal(principal):
+    token_values, user_values, role = principal
+    user = User.from_db(User.objects.db, USER_FIELDS, user_values)
+    user._cached_role = role
+    token = Token.from_db(Token.objects.db, TOKEN_FIELDS, token_values)
+    token.user = user
+    return user, token
+
+
+# Token -> (user, token): avval jarayon LRU'si, keyin umumiy kesh, oxiri baza.
+# AUTH versiyasi va bekor qilish belgisi bitta kesh so‘rovida o‘qiladi;
+# versiya bazadan o‘qishdan oldin olinadi — parallel invalidatsiya yo‘qolmaydi
+def authenticate_token(key):
+    digest = _digest(key)
+    version, flags = namespace_version_with(AUTH, [_revoked_key(digest)])
+    if flags:
+        # Yaqinda bekor qilingan: keshlar chetlab o‘tiladi, baza hal qiladi
+        # (logout tranzaksiyasi bekor bo‘lgan bo‘lsa token hali ham amal qiladi)
+        principals.count("revoked")
+        principal = load_principal(key)
+        return build_principal(principal) if principal else None
+    principal = principals.get(digest, version)
+    if principal is None:
+        shared_key = make_key(AUTH, "token", digest)
+        if settings.AUTH_CACHE_SHARED:
+            principal = cache.get(shared_key)
+            principals.count("shared_hits" if principal else "shared_misses")
+        if principal is None:
+            principal = load_principal(key)
+            if principal is None:
+                return None
+            if settings.AUTH_CACHE_SHARED:
+                cache.set(shared_key, principal, settings.AUTH_CACHE_TTL)
+        principals.set(digest, version, principal)
+    return build_principal(principal)
+
+
+# Tokenni darhol bekor qilish (logout): shu jarayon LRU'si va umumiy keshdan
+# o‘chiriladi, boshqa jarayonlar esa belgini keyingi so‘rovdayoq ko‘radi.
+# Belgi LRU muddaticha yashaydi — undan eski yozuvlar o‘zi eskiradi
+def revoke_token(key):
+    digest = _digest(key)
+    principals.discard(digest)
+    cache.set(_revoked_key(digest), 1, settings.AUTH_CACHE_TTL)
+    cache.delete(make_key(AUTH, "token", digest))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        principal = authenticate_token(key)
+        if principal is None:
+            raise exceptions.AuthenticationFailed(_("Invalid token."))
+        user, token = principal
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+        return user, token
@@ -0,0 +1,131 @@
+import asyncio
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+# Hosila qiymatlar guruhlari. Har bir guruh o‘z versiyasiga ega: versiyani
+# oshirish guruhdagi barcha kalitlarni bir amal bilan eskirtiradi
+STOCK = "stock"  # porsiya baholari, kam zaxira (Ingredient/Recipe yozuvlari)
+SERVINGS = "servings"  # analitika (Serving yozuvlari)
+REPORTS = "reports"  # hisobot ogohlantirishlari (Report yozuvlari)
+RECIPES = "recipes"  # jarayon ichidagi retsept grafi (Recipe/Meal yozuvlari)
+AUTH = "auth"  # token -> (foydalanuvchi, rol) (Token/User/UserRole yozuvlari)
+
+DEFAULT_TIMEOUT = 300
+LOCK_TIMEOUT = 30
+LOCK_WAIT = 5.0
+LOCK_POLL = 0.05
+
+_MISSING = object()
+
+
+def _version_key(namespace):
+    return f"derived:{namespace}:version"
+
+
+# Boshlang‘ich versiya vaqtdan olinadi: kesh tozalangandan keyin ham
+# jarayonlardagi eski versiya bilan to‘qnashmaydi
+def _initial_version():
+    return int(time.time() * 1000)
+
+
+def namespace_version(namespace):
+    return cache.get_or_set(_version_key(namespace), _initial_version, timeout=None)
+
+
+# Versiya va qo‘shimcha kalitlar bitta so‘rovda (get_many): {kalit: qiymat}
+def namespace_version_with(namespace, keys):
+    version_key = _version_key(namespace)
+    values = cache.get_many([version_key, *keys])
+    version = values.pop(version_key, None)
+    if version is None:
+        version = namespace_version(namespace)
+    return version, values
+
+
+def _key(namespace, version, parts):
+    suffix = ":".join(str(part) for part in parts)
+    return f"derived:{namespace}:v{version}:{suffix}"
+
+
+def make_key(namespace, *parts):
+    return _key(namespace, namespace_version(namespace), parts)
+
+
+def invalidate(*namespaces):
+    for namespace in namespaces:
+        try:
+            cache.incr(_version_key(namespace))
+        except ValueError:
+            # Versiya kaliti yo‘q (yoki o‘chib ketgan) — yangisini boshlash
+            cache.set(_version_key(namespace), _initial_version(), timeout=None)
+
+
+# Yozuv tranzaksiyasi commit bo‘lgandan keyin invalidatsiya qilish —
+# aks holda parallel o‘quvchi eski qiymatni keshga qayta yozishi mumkin
+def invalidate_on_commit(*namespaces):
+    transaction.on_commit(lambda: invalidate(*namespaces), robust=True)
+
+
+# Read-through: keshda bo‘lmasa hisoblab saqlaydi. Bir vaqtda faqat bitta
+# jarayon hisoblaydi (cache.add qulfi), qolganlari natijani kutadi
+def get_or_compute(namespace, parts, compute, timeout=DEFAULT_TIMEOUT):
+    key = make_key(namespace, *parts)
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    lock_key = f"{key}:lock"
+    if cache.add(lock_key, 1, LOCK_TIMEOUT):
+        try:
+            value = compute()
+            cache.set(key, value, timeout)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL)
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if cache.get(lock_key) is None:
+            break
+    # Qulf egasi ulgurmadi yoki xato bilan chiqdi — keshsiz hisoblash
+    return compute()
+
+
+# Async view'lar uchun xuddi shu kalitlar va qulf: kutish asyncio.sleep bilan,
+# ishchi oqim band qilinmaydi. compute — korutina funksiyasi
+async def anamespace_version(namespace):
+    return await cache.aget_or_set(
+        _version_key(namespace), _initial_version, timeout=None
+    )
+
+
+async def aget_or_compute(namespace, parts, compute, timeout=DEFAULT_TIMEOUT):
+    key = _key(namespace, await anamespace_version(namespace), parts)
+    value = await cache.aget(key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    lock_key = f"{key}:lock"
+    if await cache.aadd(lock_key, 1, LOCK_TIMEOUT):
+        try:
+            value = await compute()
+            await cache.aset(key, value, timeout)
+        finally:
+            await cache.adelete(lock_key)
+        return value
+
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(LOCK_POLL)
+        value = await cache.aget(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if await cache.aget(lock_key) is None:
+            break
+    return await compute()
@@ -1,12 +1,163 @@
+import asyncio
+import json
+from abc import ABC, abstractmethod
+
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
-     import json
 
-     class InventoryConsumer(AsyncWebsocketConsumer):
-         async def connect(self):
-             await self.accept()
+from .events import (
+    INVENTORY_GROUP,
+    PORTIONS_GROUP,
+    ingredient_states,
+    portion_states,
+)
+from .graph import recipe_graph
+
+
+class SubscriptionConsumer(ABC, AsyncWebsocketConsumer):
+    # Faqat tizimga kirgan foydalanuvchilar uchun guruh obunasi.
+    # Mijoz {"action": "subscribe", ...} yuborib kuzatiladigan obyektlarni tanlaydi.
+    # Voris group, resolve_subscription va send_snapshot'ni beradi
+    group = None
+
+    async def connect(self):
+        if not self.scope["user"].is_authenticated:
+            await self.close()
+            return
+        self.subscribed = None  # None — barchasi
+        await self.channel_layer.group_add(self.group, self.channel_name)
+        await self.accept()
+        await self.send_snapshot()
+
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(self.group, self.channel_name)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            message = json.loads(text_data or "")
+        except ValueError:
+            await self.send_json({"type": "error", "error": "JSON noto‘g‘ri"})
+            return
+        if not isinstance(message, dict) or message.get("action") != "subscribe":
+            await self.send_json({"type": "error", "error": "Noma’lum amal"})
+            return
+        try:
+            subscribed = await self.resolve_subscription(message)
+        except ValueError as error:
+            await self.send_json(
+                {"type": "error", "error": f"Id ro‘yxati noto‘g‘ri: {error}"}
+            )
+            return
+        self.subscribed = subscribed or None
+        await self.send_snapshot()
+
+    # Obuna xabari -> kuzatiladigan id'lar to‘plami (bo‘sh — barchasi).
+    # Noto‘g‘ri xabar uchun ValueError
+    @abstractmethod
+    async def resolve_subscription(self, message):
+        pass
+
+    # Mijoz yuborgan id'lar ro‘yxati butun songa keltiriladi ("3" -> 3):
+    # hodisalardagi id'lar int, aks holda obuna jimgina hech narsaga mos kelmaydi
+    @staticmethod
+    def id_list(message, key):
+        value = message.get(key)
+        if value is None:
+            return set()
+        if not isinstance(value, list) or any(
+            isinstance(item, bool) for item in value
+        ):
+            raise ValueError(key)
+        try:
+            return {int(item) for item in value}
+        except (TypeError, ValueError):
+            raise ValueError(key)
+
+    # Ulanganda va obuna o‘zgarganda self.subscribed bo‘yicha joriy holat
+    @abstractmethod
+    async def send_snapshot(self):
+        pass
+
+    async def send_json(self, content):
+        await self.send(text_data=json.dumps(content))
+
+
+class InventoryConsumer(SubscriptionConsumer):
+    # Kam zaxira hodisalari shu vaqt (soniya) davomida jamlanib, bitta xabar
+    # bilan yuboriladi
+    debounce = 0.5
+    group = INVENTORY_GROUP
+    flush_task = None
+
+    async def connect(self):
+        self.known_low = {}
+        self.pending = {}
+        await super().connect()
+
+    async def disconnect(self, close_code):
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+        await super().disconnect(close_code)
+
+    # {"action": "subscribe", "ingredients": [1, 2], "meals": [3]}
+    async def resolve_subscription(self, message):
+        ingredient_ids = self.id_list(message, "ingredients")
+        meal_ids = self.id_list(message, "meals")
+        if meal_ids:
+            ingredient_ids |= await self.meal_ingredients(meal_ids)
+        return ingredient_ids
+
+    async def stock_changed(self, event):
+        for item in event["ingredients"]:
+            if self.subscribed is None or item["id"] in self.subscribed:
+                self.pending[item["id"]] = item
+        if self.pending and self.flush_task is None:
+            self.flush_task = asyncio.ensure_future(self.flush_later())
+
+    async def flush_later(self):
+        await asyncio.sleep(self.debounce)
+        self.flush_task = None
+        pending, self.pending = self.pending, {}
+        events = []
+        for pk, item in pending.items():
+            # Faqat kam zaxiraga o‘tish yoki undan chiqish yuboriladi
+            if self.known_low.get(pk, False) != item["low"]:
+                self.known_low[pk] = item["low"]
+                events.append(item)
+        if events:
+            await self.send_json({"type": "low_stock", "events": events})
+
+    async def send_snapshot(self):
+        states = await database_sync_to_async(ingredient_states)(self.subscribed)
+        self.known_low = {item["id"]: item["low"] for item in states}
+        await self.send_json(
+            {"type": "snapshot", "low_stock": [item for item in states if item["low"]]}
+        )
+
+    @database_sync_to_async
+    def meal_ingredients(self, meal_ids):
+        graph = recipe_graph()
+        return {pk for meal_id in meal_ids for pk, _ in graph.get(meal_id, ())}
+
+
+class PortionConsumer(SubscriptionConsumer):
+    # Ovqat berish ekrani uchun: ulanganda barcha baholar, keyin faqat
+    # o‘zgargan porsiya sonlari
+    group = PORTIONS_GROUP
+
+    # {"action": "subscribe", "meals": [1, 2]}
+    async def resolve_subscription(self, message):
+        return self.id_list(message, "meals")
 
-         async def disconnect(self, close_code):
-             pass
+    async def portions_changed(self, event):
+        portions = [
+            item
+            for item in event["portions"]
+            if self.subscribed is None or item["meal_id"] in self.subscribed
+        ]
+        if portions:
+            await self.send_json({"type": "portions", "portions": portions})
 
-         async def receive(self, text_data):
-             await self.send(text_data=json.dumps({'message': 'Ingredient kam zaxirada!'}))
\ No newline at end of file
+    async def send_snapshot(self):
+        portions = await database_sync_to_async(portion_states)(self.subscribed)
+        await self.send_json({"type": "snapshot", "portions": portions})
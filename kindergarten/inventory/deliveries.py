@@ -0,0 +1,205 @@
+import codecs
+import csv
+import json
+import math
+from collections import defaultdict
+from datetime import date
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Ingredient
+from .signals import stock_changed
+
+FORMATS = ("csv", "ndjson")
+BATCH_SIZE = 500
+
+
+# Fayl nomidan format: .csv -> csv, .ndjson/.jsonl/.json -> ndjson
+def guess_format(filename, default=None):
+    suffix = (filename or "").rsplit(".", 1)[-1].lower()
+    if suffix == "csv":
+        return "csv"
+    if suffix in ("ndjson", "jsonl", "json"):
+        return "ndjson"
+    return default
+
+
+# Satrlar oqimi (str) -> (qator raqami, lug‘at yoki None, xato yoki None)
+def read_rows(lines, fmt):
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+    for line_no, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_no, None, "JSON noto‘g‘ri"
+            continue
+        yield line_no, row, None
+
+
+def read_upload(upload, fmt):
+    return read_rows(codecs.iterdecode(upload, "utf-8-sig"), fmt)
+
+
+# JSON so‘rov tanasidagi ro‘yxat (qator raqami — 1 dan boshlab)
+def read_items(items):
+    for line, row in enumerate(items, start=1):
+        yield line, row, None
+
+
+# Bitta yetkazib berish qatori: (nomi, miqdor, sana, min_quantity) yoki xato
+def parse_delivery(row, today=None):
+    if not isinstance(row, dict):
+        return None, "Qator formati noto‘g‘ri"
+    name = str(row.get("name") or "").strip()
+    if not name:
+        return None, "Nomi kiritilmagan"
+    if len(name) > Ingredient._meta.get_field("name").max_length:
+        return None, "Nomi juda uzun"
+    try:
+        quantity = float(row.get("quantity"))
+    except (TypeError, ValueError):
+        return None, "Miqdor noto‘g‘ri"
+    if not quantity > 0 or quantity == float("inf"):
+        return None, "Miqdor musbat son bo‘lishi kerak"
+    delivery_date = row.get("delivery_date") or None
+    if delivery_date is None:
+        delivery_date = today or timezone.localdate()
+    elif not isinstance(delivery_date, date):
+        delivery_date = parse_date(str(delivery_date))
+        if delivery_date is None:
+            return None, "Sana YYYY-MM-DD formatida bo‘lishi kerak"
+    min_quantity = row.get("min_quantity")
+    if min_quantity not in (None, ""):
+        try:
+            min_quantity = float(min_quantity)
+        except (TypeError, ValueError):
+            return None, "Minimal miqdor noto‘g‘ri"
+        # inf/nan saqlansa ingredientlar ro‘yxatini JSON'ga aylantirib bo‘lmaydi
+        if not math.isfinite(min_quantity) or min_quantity < 0:
+            return None, "Minimal miqdor noto‘g‘ri"
+    else:
+        min_quantity = None
+    return (name, quantity, delivery_date, min_quantity), None
+
+
+# Bitta partiya: bir xil mahsulotlar jamlanadi, yangilari 0 miqdor bilan
+# yaratiladi, keyin barcha miqdorlar bitta bulk_update'da F() bilan qo‘shiladi.
+# Porsiya baholari commit'dan keyin bir marta qayta hisoblanadi. Yangi
+# yaratilgan mahsulotlar soni qaytariladi
+def apply_deliveries(deliveries):
+    quantities = defaultdict(float)
+    dates = {}
+    min_quantities = {}
+    for name, quantity, delivery_date, min_quantity in deliveries:
+        quantities[name] += quantity
+        dates[name] = max(dates.get(name, delivery_date), delivery_date)
+        if min_quantity is not None:
+            min_quantities[name] = min_quantity
+    if not quantities:
+        return 0
+
+    with transaction.atomic():
+        ids = dict(
+            Ingredient.objects.filter(name__in=quantities).values_list("name", "pk")
+        )
+        new = [name for name in quantities if name not in ids]
+        if new:
+            # Parallel import bir xil nomni yaratgan bo‘lsa ham miqdor yo‘qolmaydi:
+            # bu yerda faqat qator kafolatlanadi, qo‘shish pastda
+            Ingredient.objects.bulk_create(
+                [
+                    Ingredient(
+                        name=name,
+                        quantity=0,
+                        delivery_date=dates[name],
+                        min_quantity=min_quantities.get(name, 0.0),
+                    )
+                    for name in new
+                ],
+                ignore_conflicts=True,
+            )
+            ids.update(
+                Ingredient.objects.filter(name__in=new).values_list("name", "pk")
+            )
+        Ingredient.objects.bulk_update(
+            [
+                Ingredient(
+                    pk=ids[name],
+                    quantity=F("quantity") + quantity,
+                    delivery_date=Greatest(F("delivery_date"), Value(dates[name])),
+                )
+                for name, quantity in quantities.items()
+            ],
+            ["quantity", "delivery_date"],
+        )
+        existing = [name for name in min_quantities if name not in new]
+        if existing:
+            Ingredient.objects.bulk_update(
+                [
+                    Ingredient(pk=ids[name], min_quantity=min_quantities[name])
+                    for name in existing
+                ],
+                ["min_quantity"],
+            )
+        # bulk_* signal yubormaydi — partiya uchun bitta qayta hisob
+        stock_changed(ingredient_ids=ids.values())
+    return len(new)
+
+
+# (qator, lug‘at, xato) oqimini partiyalab qo‘llash. Xato qatorlar
+# o‘tkazib yuboriladi va hisobotda qaytariladi. Faylni o‘qib bo‘lmasa
+# (kodlash, CSV) import to‘xtaydi, lekin oldingi partiyalar allaqachon
+# qo‘llangan: stopped_at["line"] — birinchi ishlanmagan qator, qayta
+# yuborishda shu qatordan boshlash kerak (aks holda miqdorlar ikki marta qo‘shiladi)
+def import_deliveries(rows, batch_size=BATCH_SIZE, max_errors=1000):
+    summary = {"rows": 0, "applied": 0, "created": 0, "stopped_at": None}
+    names = set()
+    errors = []
+    rows = iter(rows)
+    today = timezone.localdate()
+    last_line = 0
+    while True:
+        chunk = []
+        read_error = None
+        try:
+            for item in islice(rows, batch_size):
+                chunk.append(item)
+        except (UnicodeDecodeError, csv.Error) as exc:
+            read_error = exc
+        batch = []
+        for line, row, error in chunk:
+            summary["rows"] += 1
+            last_line = line
+            if error is None:
+                delivery, error = parse_delivery(row, today)
+            if error is not None:
+                if len(errors) < max_errors:
+                    errors.append({"line": line, "error": error})
+                continue
+            batch.append(delivery)
+            names.add(delivery[0])
+        summary["created"] += apply_deliveries(batch)
+        summary["applied"] += len(batch)
+        if read_error is not None:
+            summary["stopped_at"] = {
+                "line": last_line + 1,
+                "error": f"Fayl o‘qib bo‘lmadi: {read_error}",
+            }
+            break
+        if not chunk:
+            break
+    summary["ingredients"] = len(names)
+    summary["failed"] = summary["rows"] - summary["applied"]
+    summary["errors"] = errors
+    return summary
@@ -0,0 +1,76 @@
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from .models import Ingredient, Meal, PortionEstimate
+
+logger = logging.getLogger(__name__)
+
+INVENTORY_GROUP = "inventory"
+PORTIONS_GROUP = "portions"
+
+
+def ingredient_states(ingredient_ids=None):
+    ingredients = Ingredient.objects.all()
+    if ingredient_ids is not None:
+        ingredients = ingredients.filter(pk__in=ingredient_ids)
+    return [
+        {
+            "id": pk,
+            "name": name,
+            "quantity": quantity,
+            "min_quantity": min_quantity,
+            "low": quantity <= min_quantity,
+        }
+        for pk, name, quantity, min_quantity in ingredients.values_list(
+            "pk", "name", "quantity", "min_quantity"
+        )
+    ]
+
+
+def portion_states(meal_ids=None):
+    estimates = PortionEstimate.objects.all()
+    if meal_ids is not None:
+        estimates = estimates.filter(meal_id__in=meal_ids)
+    return [
+        {"meal_id": meal_id, "meal": name, "possible_portions": portions}
+        for meal_id, name, portions in estimates.values_list(
+            "meal_id", "meal__name", "possible_portions"
+        )
+    ]
+
+
+def _group_send(group, message):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(group, message)
+    except Exception:
+        # Kanal qatlami ishlamasa ham yozish yo‘llari to‘xtamasligi kerak
+        logger.exception("%s guruhiga xabar yuborib bo‘lmadi", group)
+
+
+# Bitta tranzaksiyada o‘zgargan mahsulotlar holatini bitta xabar bilan
+# guruhga yuborish. Kam zaxiraga o‘tish/chiqish consumer'da aniqlanadi
+def broadcast_stock(ingredient_ids):
+    if not ingredient_ids:
+        return
+    _group_send(
+        INVENTORY_GROUP,
+        {"type": "stock.changed", "ingredients": ingredient_states(ingredient_ids)},
+    )
+
+
+# Faqat o‘zgargan porsiya sonlarini yuborish: {meal_id: porsiyalar}.
+# Xabar maydonlari portion_states() (snapshot) bilan bir xil
+def broadcast_portions(changed):
+    if not changed:
+        return
+    names = dict(Meal.objects.filter(pk__in=changed).values_list("pk", "name"))
+    portions = [
+        {"meal_id": meal_id, "meal": names.get(meal_id), "possible_portions": count}
+        for meal_id, count in changed.items()
+    ]
+    _group_send(PORTIONS_GROUP, {"type": "portions.changed", "portions": portions})
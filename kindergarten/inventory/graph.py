@@ -0,0 +1,79 @@
+import threading
+from collections import defaultdict
+
+from django.db import connection, transaction
+
+from .cache import RECIPES, invalidate, namespace_version
+from .models import Recipe
+
+# Jarayon ichidagi retsept grafi: {meal_id: ((ingredient_id, miqdor), ...)}
+# va teskari indeks {ingredient_id: frozenset(meal_id)}. Umumiy keshdagi
+# RECIPES versiyasi o‘zgarganda qayta quriladi
+_EMPTY = {"version": None, "recipes": {}, "users": {}}
+_graph = _EMPTY
+_lock = threading.Lock()
+# Joriy oqim commit qilinmagan retsept o‘zgarishini kiritganmi
+_dirty = threading.local()
+
+
+def _build(version):
+    recipes = defaultdict(list)
+    users = defaultdict(set)
+    for meal_id, ingredient_id, quantity in Recipe.objects.values_list(
+        "meal_id", "ingredient_id", "quantity"
+    ):
+        recipes[meal_id].append((ingredient_id, quantity))
+        users[ingredient_id].add(meal_id)
+    return {
+        "version": version,
+        "recipes": {meal_id: tuple(rows) for meal_id, rows in recipes.items()},
+        "users": {pk: frozenset(meal_ids) for pk, meal_ids in users.items()},
+    }
+
+
+def _current():
+    global _graph
+    if getattr(_dirty, "pending", False):
+        if connection.in_atomic_block:
+            # O‘z tranzaksiyasidagi o‘zgarishlarni ko‘rish uchun vaqtinchalik
+            # graf; rollback bo‘lishi mumkin, shuning uchun saqlanmaydi
+            return _build(None)
+        _dirty.pending = False
+    # Versiya qurishdan oldin o‘qiladi: qurish paytida yozuv bo‘lsa keyingi
+    # chaqiruv grafni yana qayta quradi
+    version = namespace_version(RECIPES)
+    graph = _graph
+    if graph["version"] != version:
+        with _lock:
+            graph = _graph
+            if graph["version"] != version:
+                graph = _graph = _build(version)
+    return graph
+
+
+def recipe_graph():
+    return _current()["recipes"]
+
+
+def meal_recipe(meal_id):
+    return recipe_graph().get(meal_id, ())
+
+
+def ingredient_users(ingredient_ids):
+    users = _current()["users"]
+    return set().union(*(users.get(pk, ()) for pk in ingredient_ids))
+
+
+def _published():
+    _dirty.pending = False
+    invalidate(RECIPES)
+
+
+# Recipe/Meal yozuvlari: shu jarayondagi graf darhol tashlanadi, barcha
+# jarayonlardagisi commit'dan keyin umumiy versiyani oshirish orqali
+def recipes_changed():
+    global _graph
+    _dirty.pending = True
+    with _lock:
+        _graph = _EMPTY
+    transaction.on_commit(_published, robust=True)
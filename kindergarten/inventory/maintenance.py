@@ -0,0 +1,155 @@
+import time
+from datetime import datetime
+
+from django.core.management.color import no_style
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from . import materialized
+from .cache import RECIPES, REPORTS, SERVINGS, STOCK, invalidate_on_commit
+from .models import Serving, ServingDailyRollup
+from .rollups import detach_user_rollups
+
+# SET_NULL o‘rniga: (kun, ovqat, NULL) qatori yagona bo‘lishi kerak
+# (rollup_day_meal_no_user_uniq), shuning uchun qatorlar NULL qatorga qo‘shiladi
+DETACH = {(ServingDailyRollup, "user"): detach_user_rollups}
+
+
+# Tozalanadigan modellarga bog‘langan barcha jadvallar: CASCADE bog‘liqlar
+# ham o‘chiriladi, SET_NULL ustunlar NULL qilinadi. Natija — o‘chirish
+# tartibi (avval bog‘liq jadvallar) va NULL qilinadigan (model, ustun)lar
+def wipe_plan(targets):
+    order, nullify = [], []
+    seen = set()
+
+    def visit(model):
+        if model in seen:
+            return
+        seen.add(model)
+        for relation in model._meta.get_fields(include_hidden=True):
+            # Faqat teskari FK/O2O; M2M through jadvali o‘z FK'si bilan keladi
+            if relation.concrete or relation.many_to_many:
+                continue
+            related = relation.related_model
+            if related in targets or relation.on_delete is models.CASCADE:
+                visit(related)
+            elif relation.on_delete is models.SET_NULL:
+                nullify.append((related, relation.field))
+            elif relation.on_delete is not models.DO_NOTHING:
+                raise ValueError(
+                    f"{related._meta.db_table} jadvali {model._meta.db_table} "
+                    "yozuvlarini o‘chirishga yo‘l qo‘ymaydi"
+                )
+        order.append(model)
+
+    for model in targets:
+        visit(model)
+    nullify = [(model, field) for model, field in nullify if model not in seen]
+    return order, nullify
+
+
+# Xom DELETE: Django collector va signallarsiz, bitta tranzaksiyada.
+# Har bir jadval uchun (jadval, qatorlar, soniya) qaytariladi.
+# truncate=True — barcha jadvallar backendning flush SQL'i bilan birdaniga
+# (PostgreSQL'da TRUNCATE ... RESTART IDENTITY), qatorlar soni noma'lum.
+# Tashqi jadval FK bilan bog‘langan bo‘lsa (masalan, --only users'da
+# inventory_serving.user_id) PostgreSQL TRUNCATE'ni rad etadi, CASCADE esa
+# tashqi jadvalni ham bo‘shatadi — bunday rejada xom DELETE ishlatiladi
+def wipe(targets, reset_sequences=True, truncate=False):
+    order, nullify = wipe_plan(targets)
+    truncate = truncate and not nullify
+    quote = connection.ops.quote_name
+    stats = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for model, field in nullify:
+            started = time.perf_counter()
+            detach = DETACH.get((model, field.name))
+            if detach is not None:
+                count = detach()
+            else:
+                cursor.execute(
+                    f"UPDATE {quote(model._meta.db_table)} "
+                    f"SET {quote(field.column)} = NULL "
+                    f"WHERE {quote(field.column)} IS NOT NULL"
+                )
+                count = cursor.rowcount
+            stats.append(
+                (
+                    f"{model._meta.db_table}.{field.column} = NULL",
+                    count,
+                    time.perf_counter() - started,
+                )
+            )
+        if truncate:
+            started = time.perf_counter()
+            if connection.vendor == "postgresql":
+                # Kechiktirilgan FK tekshiruvlari kutib turgan jadvalni
+                # TRUNCATE qilib bo‘lmaydi — ular hozir bajariladi
+                cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+            tables = [model._meta.db_table for model in order]
+            for sql in connection.ops.sql_flush(
+                no_style(), tables, reset_sequences=reset_sequences
+            ):
+                cursor.execute(sql)
+            stats.append((", ".join(tables), None, time.perf_counter() - started))
+            reset_sequences = False
+        for model in [] if truncate else order:
+            started = time.perf_counter()
+            cursor.execute(f"DELETE FROM {quote(model._meta.db_table)}")
+            stats.append(
+                (model._meta.db_table, cursor.rowcount, time.perf_counter() - started)
+            )
+        if reset_sequences:
+            sequences = [
+                {"table": model._meta.db_table, "column": model._meta.pk.column}
+                for model in order
+                if isinstance(model._meta.pk, models.AutoField)
+            ]
+            for sql in connection.ops.sequence_reset_by_name_sql(
+                no_style(), sequences
+            ):
+                cursor.execute(sql)
+        # Keshlangan hosila qiymatlar va retsept grafi endi eskirgan
+        invalidate_on_commit(STOCK, SERVINGS, REPORTS, RECIPES)
+        materialized.refresh_on_commit()
+    return stats
+
+
+# DATE kunidan oldingi porsiyalarni qismlab o‘chirish (saqlash muddati).
+# Har qism alohida tranzaksiya — uzun blokirovkalarsiz. Kunlik yig‘indilar
+# saqlanib qoladi, shuning uchun analitika o‘zgarmaydi. since — quyi chegara
+# (kun), max_pk — faqat shu id gacha (arxivlangan) qatorlar
+def prune_servings(before, chunk_size=10000, since=None, max_pk=None):
+    def midnight(day):
+        return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+    servings = Serving.objects.filter(date_served__lt=midnight(before))
+    if since is not None:
+        servings = servings.filter(date_served__gte=midnight(since))
+    if max_pk is not None:
+        servings = servings.filter(pk__lte=max_pk)
+    servings = servings.order_by("pk")
+
+    # QuerySet.delete() emas: Serving post_delete signali porsiyalarni kunlik
+    # yig‘indidan ayiradi, bu yerda esa yig‘indilar saqlanib qolishi kerak.
+    # Bundan tashqari u har qatorni signal uchun xotiraga yuklaydi
+    quote = connection.ops.quote_name
+    date_served = quote(Serving._meta.get_field("date_served").column)
+    sql = (
+        f"DELETE FROM {quote(Serving._meta.db_table)} "
+        f"WHERE {quote(Serving._meta.pk.column)} BETWEEN %s AND %s "
+        f"AND {date_served} < %s"
+    )
+    params = [connection.ops.adapt_datetimefield_value(midnight(before))]
+    if since is not None:
+        sql += f" AND {date_served} >= %s"
+        params.append(connection.ops.adapt_datetimefield_value(midnight(since)))
+    while True:
+        bounds = list(servings.values_list("pk", flat=True)[:chunk_size])
+        if not bounds:
+            break
+        started = time.perf_counter()
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, [bounds[0], bounds[-1], *params])
+            deleted = cursor.rowcount
+        yield deleted, time.perf_counter() - started
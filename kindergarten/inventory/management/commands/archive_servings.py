@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.archive import archive_expired, archived_months, retention_cutoff
+from inventory.reports import parse_month
+
+
+class Command(BaseCommand):
+    help = (
+        "Saqlash muddatidan eski porsiyalarni oyma-oy gzip NDJSON arxivga "
+        "ko'chirish (yig'indilar va hisobotlar bazada qoladi)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--before",
+            help="Shu oydan (YYYY-MM) oldingi oylar, standart: saqlash muddati",
+        )
+        parser.add_argument(
+            "--months",
+            type=int,
+            help="Bazada saqlanadigan oxirgi oylar soni (SERVING_RETENTION_MONTHS)",
+        )
+        parser.add_argument("--chunk-size", type=int, default=10000)
+        parser.add_argument(
+            "--list", action="store_true", help="Arxivlangan oylarni ko'rsatish"
+        )
+        parser.add_argument(
+            "--celery",
+            action="store_true",
+            help="Celery vazifasi sifatida yuborish (holat task id bo'yicha)",
+        )
+
+    def handle(self, *args, **options):
+        if options["list"]:
+            for month in archived_months():
+                self.stdout.write(month)
+            return
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size musbat bo'lishi kerak")
+        before = options["before"]
+        if before is None:
+            if options["months"] is not None and options["months"] < 0:
+                raise CommandError("--months manfiy bo'lmasin")
+            before = retention_cutoff(options["months"]).strftime("%Y-%m")
+        # Celery'ga yuborishdan oldin: xato oy worker ichida emas, shu yerda
+        try:
+            before = parse_month(before).strftime("%Y-%m")
+        except ValueError:
+            raise CommandError("Oy YYYY-MM formatida bo'lishi kerak")
+
+        if options["celery"]:
+            from inventory.tasks import archive_servings
+
+            result = archive_servings.delay(before, options["chunk_size"])
+            self.stdout.write(
+                self.style.SUCCESS(f"{before} gacha arxivlash yuborildi: {result.id}")
+            )
+            return
+
+        def progress(meta):
+            if options["verbosity"] > 1:
+                self.stdout.write(
+                    f"{meta['month']}: {meta['deleted']}/{meta['archived']} "
+                    f"o'chirildi ({meta['months_done'] + 1}/{meta['months_total']})"
+                )
+
+        results = archive_expired(before, options["chunk_size"], progress)
+        for result in results:
+            self.stdout.write(
+                f"{result['month']}: {result['archived']} ta arxivlandi, "
+                f"{result['deleted']} ta o'chirildi ({result['seconds']:.2f} s)"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f"{before} gacha {len(results)} oy arxivlandi")
+        )
@@ -0,0 +1,102 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from inventory.models import ServingDailyRollup
+from inventory.reports import (
+    compute_report_rows,
+    merge_report_rows,
+    parse_month,
+    report_units,
+)
+
+
+def _init_worker():
+    # spawn rejimida Django'ni sozlash; fork'da meros qolgan ulanishlarni yopish
+    django.setup()
+    connections.close_all()
+
+
+def _run_unit(unit):
+    month, meal_ids = unit
+    return compute_report_rows(month, meal_ids)
+
+
+class Command(BaseCommand):
+    help = "O'tgan oylar uchun hisobotlarni parallel qayta hisoblash"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", help="Boshlang'ich oy (YYYY-MM)")
+        parser.add_argument("--until", help="Oxirgi oy (YYYY-MM), standart: joriy oy")
+        parser.add_argument(
+            "--workers", type=int, default=1, help="Parallel jarayonlar soni"
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=100, help="Bir birlikdagi ovqatlar soni"
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Mavjud hisobotlarni ham qayta hisoblash",
+        )
+        parser.add_argument(
+            "--celery",
+            action="store_true",
+            help="Ishni Celery workerlariga chord sifatida yuborish",
+        )
+
+    def handle(self, *args, **options):
+        since = options["since"]
+        if since is None:
+            # Kunlik yig'indilar arxivlangan oylarni ham qamraydi
+            first = ServingDailyRollup.objects.order_by("day").first()
+            if first is None:
+                self.stdout.write(self.style.WARNING("Berilgan porsiyalar topilmadi"))
+                return
+            since = first.day
+        try:
+            since = parse_month(since).strftime("%Y-%m")
+            until = parse_month(options["until"]).strftime("%Y-%m")
+        except ValueError:
+            raise CommandError("Oy YYYY-MM formatida bo'lishi kerak")
+        if options["workers"] < 1 or options["chunk_size"] < 1:
+            raise CommandError("--workers va --chunk-size musbat bo'lishi kerak")
+
+        if options["celery"]:
+            from inventory.tasks import backfill_reports
+
+            backfill_reports.delay(
+                since, until, options["chunk_size"], options["force"]
+            )
+            self.stdout.write(
+                self.style.SUCCESS(f"{since} — {until} Celery'ga yuborildi")
+            )
+            return
+
+        started = time.perf_counter()
+        units = report_units(since, until, options["chunk_size"], options["force"])
+        rows = []
+        if options["workers"] == 1:
+            for unit in units:
+                rows.extend(_run_unit(unit))
+        else:
+            # Jarayonlar o'z ulanishlarini ochishi uchun
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=options["workers"], initializer=_init_worker
+            ) as pool:
+                for unit_rows in pool.map(_run_unit, units):
+                    rows.extend(unit_rows)
+        saved = merge_report_rows(rows) if rows else 0
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{since} — {until}: {len(units)} birlik, {saved} hisobot, "
+                f"{elapsed:.2f} s ({saved / elapsed if elapsed else 0:.0f} hisobot/s, "
+                f"{options['workers']} jarayon)"
+            )
+        )
@@ -0,0 +1,132 @@
+import http.client
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Dashboard ochilganda bir vaqtda so'raladigan o'qish yo'llari
+PATHS = [
+    "ingredients/",
+    "ingredients/low_stock/",
+    "reports/",
+    "reports/warnings/",
+    "servings/by_user/",
+    "servings/by_date/",
+    "meals/by_type/",
+]
+
+
+def percentile(values, fraction):
+    return values[max(math.ceil(fraction * len(values)) - 1, 0)]
+
+
+# Bitta manzilga yuklama: har bir oqim o'z keep-alive ulanishidan foydalanadi
+def run_load(base_url, token, paths, total, concurrency, timeout):
+    parts = urlsplit(base_url)
+    connection_class = (
+        http.client.HTTPSConnection
+        if parts.scheme == "https"
+        else http.client.HTTPConnection
+    )
+    prefix = parts.path.rstrip("/") + "/"
+    headers = {"Authorization": f"Token {token}"}
+    counter = iter(range(total))
+    lock = threading.Lock()
+    latencies, errors = [], []
+
+    def worker():
+        connection = connection_class(parts.netloc, timeout=timeout)
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                break
+            path = prefix + paths[index % len(paths)]
+            started = time.perf_counter()
+            try:
+                connection.request("GET", path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = connection_class(parts.netloc, timeout=timeout)
+                ok = False
+            elapsed = time.perf_counter() - started
+            with lock:
+                (latencies if ok else errors).append(elapsed)
+        connection.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    wall = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "ok": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / wall if wall else 0,
+        "p50": percentile(latencies, 0.5) * 1000 if latencies else 0,
+        "p99": percentile(latencies, 0.99) * 1000 if latencies else 0,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Sinxron (gunicorn/WSGI) va async (daphne/ASGI) o'qish API'larini "
+        "yuklama ostida solishtirish: so'rov/s va p50/p99 kechikish. Serverlar "
+        "oldindan ishga tushirilgan bo'lishi kerak, masalan: "
+        "gunicorn -w 4 -b :8000 kindergarten.wsgi va "
+        "daphne -p 8001 kindergarten.asgi:application"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sync-url", default="http://127.0.0.1:8000/api/")
+        parser.add_argument("--async-url", default="http://127.0.0.1:8001/api/async/")
+        parser.add_argument(
+            "--token",
+            default=os.environ.get("API_TOKEN"),
+            help="API token (standart: API_TOKEN muhit o'zgaruvchisi)",
+        )
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--concurrency", type=int, default=32)
+        parser.add_argument(
+            "--paths", default=",".join(PATHS), help="Yo'llar, vergul bilan"
+        )
+        parser.add_argument("--timeout", type=float, default=30.0)
+
+    def handle(self, *args, **options):
+        if not options["token"]:
+            raise CommandError("--token yoki API_TOKEN kerak")
+        if options["requests"] < 1 or options["concurrency"] < 1:
+            raise CommandError("--requests va --concurrency musbat bo'lishi kerak")
+        paths = [path.strip().lstrip("/") for path in options["paths"].split(",")]
+        targets = [
+            ("sync", options["sync_url"]),
+            ("async", options["async_url"]),
+        ]
+
+        self.stdout.write(
+            f"{'rejim':>6} {'rps':>9} {'p50 ms':>8} {'p99 ms':>8} "
+            f"{'ok':>7} {'xato':>6}"
+        )
+        for label, url in targets:
+            if not url:
+                continue
+            result = run_load(
+                url,
+                options["token"],
+                paths,
+                options["requests"],
+                options["concurrency"],
+                options["timeout"],
+            )
+            self.stdout.write(
+                f"{label:>6} {result['rps']:>9.1f} {result['p50']:>8.1f} "
+                f"{result['p99']:>8.1f} {result['ok']:>7} {result['errors']:>6}"
+            )
@@ -0,0 +1,73 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.optimizer import milp, optimize_menu
+
+
+# Tasodifiy retsept matritsasi: har bir ovqat kamida bitta mahsulot ishlatadi
+def synthetic_snapshot(ingredients, meals, density, seed):
+    rng = np.random.default_rng(seed)
+    shape = (ingredients, meals)
+    matrix = np.where(rng.random(shape) < density, rng.integers(1, 200, shape), 0)
+    matrix[rng.integers(0, ingredients, meals), np.arange(meals)] = rng.integers(
+        1, 200, meals
+    )
+    return {
+        "matrix": matrix.astype(float),
+        "meal_ids": np.arange(1, meals + 1),
+        "ingredient_ids": np.arange(1, ingredients + 1),
+        "meal_index": {pk: pk - 1 for pk in range(1, meals + 1)},
+        "stock": rng.integers(1_000, 100_000, ingredients).astype(float),
+    }
+
+
+class Command(BaseCommand):
+    help = "Menyu optimizatorining yechish vaqtini o'lchash (sintetik ma'lumotlar)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="20x50,100x200,300x1000",
+            help="ovqatlar x mahsulotlar o'lchamlari, vergul bilan",
+        )
+        parser.add_argument("--density", type=float, default=0.05)
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--time-limit", type=float, default=10.0)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [
+                tuple(int(part) for part in size.split("x"))
+                for size in options["sizes"].split(",")
+            ]
+        except ValueError:
+            raise CommandError("O'lcham formati: 100x200")
+        if milp is None:
+            raise CommandError("MILP uchun scipy o'rnatilmagan (requirements.txt)")
+
+        self.stdout.write(
+            f"{'ovqat':>6} {'mahsulot':>9} {'usul':>7} {'ms (min)':>10} "
+            f"{'ms (avg)':>10} {'porsiya':>9}"
+        )
+        for meals, ingredients in sizes:
+            snapshot = synthetic_snapshot(
+                ingredients, meals, options["density"], options["seed"]
+            )
+            for method in ("greedy", "milp"):
+                timings = []
+                for _ in range(options["repeat"]):
+                    started = time.perf_counter()
+                    result = optimize_menu(
+                        method=method,
+                        time_limit=options["time_limit"],
+                        snapshot=snapshot,
+                    )
+                    timings.append((time.perf_counter() - started) * 1000)
+                self.stdout.write(
+                    f"{meals:>6} {ingredients:>9} {method:>7} {min(timings):>10.1f} "
+                    f"{sum(timings) / len(timings):>10.1f} "
+                    f"{result['total_portions']:>9}"
+                )
@@ -0,0 +1,199 @@
+import json
+import math
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, transaction
+
+from inventory.models import Ingredient, Meal, Serving
+from inventory.stock import deduct_stock, meal_demand
+
+PROFILES = ["default", "production"]
+KINDS = ["read", "write"]
+
+
+def percentile(values, fraction):
+    return values[max(math.ceil(fraction * len(values)) - 1, 0)]
+
+
+# Bitta "so'rov": o'quvchi dashboard ma'lumotlarini, yozuvchi serve_meal'ni
+# takrorlaydi. So'rov oxirida ulanish Django'dagidek yopiladi yoki
+# (CONN_MAX_AGE > 0 bo'lsa) keyingi so'rovga qoladi
+def read_once(meal_ids, user, rng):
+    list(Ingredient.objects.values("id", "name", "quantity", "min_quantity"))
+    list(
+        Serving.objects.order_by("-pk").values("id", "meal_id", "portion_count")[:50]
+    )
+
+
+def write_once(meal_ids, user, rng):
+    meal = Meal.objects.get(pk=rng.choice(meal_ids))
+    with transaction.atomic():
+        deduct_stock(meal_demand(meal, 1))
+        Serving.objects.create(meal=meal, user=user, portion_count=1)
+
+
+def run_worker(kind, start_at, seconds):
+    operation = write_once if kind == "write" else read_once
+    meal_ids = list(
+        Meal.objects.filter(recipes__isnull=False)
+        .distinct()
+        .values_list("pk", flat=True)
+    )
+    user = User.objects.order_by("pk").first()
+    close_old_connections()
+    rng = random.Random(os.getpid())
+    latencies, errors = [], 0
+    time.sleep(max(start_at - time.time(), 0))
+    deadline = start_at + seconds
+    while time.time() < deadline:
+        started = time.perf_counter()
+        try:
+            operation(meal_ids, user, rng)
+            latencies.append(time.perf_counter() - started)
+        except OperationalError:
+            # "database is locked"
+            errors += 1
+        close_old_connections()
+    return {"ok": len(latencies), "errors": errors, "latencies": latencies}
+
+
+class Command(BaseCommand):
+    help = (
+        "SQLite profillarini parallel yuklamada solishtirish: alohida "
+        "jarayonlar (gunicorn ishchilari kabi) vaqtinchalik bazaga bir vaqtda "
+        "o'qiydi va serve_meal yozuvlarini bajaradi; o'qish/yozish soni, "
+        "'database is locked' xatolari va p99 kechikish chiqariladi"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument("--writers", type=int, default=4)
+        parser.add_argument("--seconds", type=float, default=5.0)
+        parser.add_argument(
+            "--profiles", default=",".join(PROFILES), help="Profillar, vergul bilan"
+        )
+        parser.add_argument(
+            "--busy-timeout", type=int, default=5000, help="production profili, ms"
+        )
+        # Ichki: bitta ishchi jarayon
+        parser.add_argument("--worker", choices=KINDS, help="ichki")
+        parser.add_argument("--start-at", type=float, help="ichki")
+
+    def handle(self, *args, **options):
+        if options["worker"]:
+            result = run_worker(
+                options["worker"], options["start_at"], options["seconds"]
+            )
+            self.stdout.write(json.dumps(result))
+            return
+
+        profiles = [name.strip() for name in options["profiles"].split(",")]
+        unknown = set(profiles) - set(PROFILES)
+        if unknown:
+            raise CommandError(f"Noma'lum profil: {', '.join(sorted(unknown))}")
+        if options["readers"] < 0 or options["writers"] < 0:
+            raise CommandError("--readers va --writers manfiy bo'lmasligi kerak")
+
+        workdir = tempfile.mkdtemp(prefix="sqlite-bench-")
+        try:
+            template = os.path.join(workdir, "template.sqlite3")
+            self.stdout.write("Sinov bazasi tayyorlanmoqda (migrate + populate_data)")
+            self.manage(template, "default", "migrate", "--noinput")
+            self.manage(template, "default", "populate_data")
+            with sqlite3.connect(template) as db:
+                # Benchmark davomida zaxira tugamasin
+                db.execute("UPDATE inventory_ingredient SET quantity = 1e12")
+
+            self.stdout.write(
+                f"{'profil':>10} {'o‘qish/s':>10} {'yozish/s':>10} "
+                f"{'o‘qish p99':>11} {'yozish p99':>11} {'qulf xato':>10}"
+            )
+            for profile in profiles:
+                path = os.path.join(workdir, f"{profile}.sqlite3")
+                shutil.copyfile(template, path)
+                results = self.run_profile(path, profile, options)
+                self.stdout.write(
+                    f"{profile:>10} {results['read']['rps']:>10.1f} "
+                    f"{results['write']['rps']:>10.1f} "
+                    f"{results['read']['p99']:>9.1f}ms "
+                    f"{results['write']['p99']:>9.1f}ms "
+                    f"{results['read']['errors'] + results['write']['errors']:>10}"
+                )
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def environment(self, path, profile, options):
+        return {
+            **os.environ,
+            "DATABASE_URL": "",
+            "SQLITE_PATH": path,
+            "SQLITE_PROFILE": profile,
+            "SQLITE_BUSY_TIMEOUT": str(options.get("busy_timeout", 5000)),
+        }
+
+    def manage(self, path, profile, *args, options=None):
+        completed = subprocess.run(
+            [sys.executable, "-m", "django", *args, "-v", "0"],
+            cwd=settings.BASE_DIR,
+            env=self.environment(path, profile, options or {}),
+            capture_output=True,
+            text=True,
+        )
+        if completed.returncode:
+            raise CommandError(completed.stderr.strip().splitlines()[-1])
+        return completed.stdout
+
+    def run_profile(self, path, profile, options):
+        # Ishchilar Django'ni yuklab bo'lgach bir vaqtda boshlaydi
+        start_at = time.time() + 3
+        env = self.environment(path, profile, options)
+        kinds = ["read"] * options["readers"] + ["write"] * options["writers"]
+        processes = [
+            (
+                kind,
+                subprocess.Popen(
+                    [
+                        sys.executable,
+                        "-m",
+                        "django",
+                        "benchmark_sqlite",
+                        "--worker",
+                        kind,
+                        "--start-at",
+                        str(start_at),
+                        "--seconds",
+                        str(options["seconds"]),
+                    ],
+                    cwd=settings.BASE_DIR,
+                    env=env,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL,
+                    text=True,
+                ),
+            )
+            for kind in kinds
+        ]
+        totals = {kind: {"ok": 0, "errors": 0, "latencies": []} for kind in KINDS}
+        for kind, process in processes:
+            output, _ = process.communicate()
+            if process.returncode:
+                raise CommandError(f"{kind} ishchisi xato bilan tugadi")
+            result = json.loads(output.strip().splitlines()[-1])
+            totals[kind]["ok"] += result["ok"]
+            totals[kind]["errors"] += result["errors"]
+            totals[kind]["latencies"].extend(result["latencies"])
+        for total in totals.values():
+            latencies = sorted(total.pop("latencies"))
+            total["rps"] = total["ok"] / options["seconds"]
+            total["p99"] = percentile(latencies, 0.99) * 1000 if latencies else 0
+        return totals
@@ -1,10 +1,40 @@
-from django.core.management.base import BaseCommand
+import time
+
 from django.contrib.auth.models import User
-from inventory.models import Ingredient, Meal, Recipe, Serving, UserRole, Report
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from inventory.maintenance import prune_servings, wipe
+from inventory.models import (
+    Ingredient,
+    Meal,
+    PortionEstimate,
+    Recipe,
+    Report,
+    Serving,
+    ServingDailyRollup,
+    UserRole,
+)
+
+# Kunlik yig‘indilar porsiyalardan hosil bo‘ladi — ular bilan birga tozalanadi,
+# aks holda analitika o‘chirilgan porsiyalarni ko‘rsatishda davom etadi
+SCOPES = {
+    "servings": [Serving, ServingDailyRollup],
+    "rollups": [ServingDailyRollup],
+    "reports": [Report],
+    "estimates": [PortionEstimate],
+    "recipes": [Recipe],
+    "ingredients": [Ingredient],
+    "meals": [Meal],
+    "users": [UserRole, User],
+}
 
 
 class Command(BaseCommand):
-    help = "Ma'lumotlar bazasidagi barcha ma'lumotlarni tozalash"
+    help = (
+        "Ma'lumotlar bazasini tozalash: xom DELETE bilan (signallarsiz) bitta "
+        "tranzaksiyada yoki --servings-before bilan eski porsiyalarni qismlab"
+    )
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -12,39 +42,83 @@ class Command(BaseCommand):
             action="store_true",
             help="Tozalashni tasdiqlash",
         )
+        parser.add_argument(
+            "--only",
+            nargs="+",
+            choices=sorted(SCOPES),
+            help="Faqat shu jadvallar (bog'liq jadvallar ham tozalanadi)",
+        )
+        parser.add_argument(
+            "--servings-before",
+            metavar="YYYY-MM-DD",
+            help="Shu kundan oldingi porsiyalarni o'chirish (saqlash muddati)",
+        )
+        parser.add_argument("--chunk-size", type=int, default=10000)
+        parser.add_argument(
+            "--truncate",
+            action="store_true",
+            help="Barcha jadvallarni bitta flush/TRUNCATE bilan tozalash",
+        )
+        parser.add_argument(
+            "--keep-sequences",
+            action="store_true",
+            help="ID hisoblagichlarini qayta boshlamaslik",
+        )
 
     def handle(self, *args, **options):
+        before = options["servings_before"]
+        if before is not None:
+            before = parse_date(before)
+            if before is None:
+                raise CommandError("Sana YYYY-MM-DD formatida bo'lishi kerak")
+            if options["only"] or options["truncate"]:
+                raise CommandError(
+                    "--servings-before --only/--truncate bilan birga ishlatilmaydi"
+                )
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size musbat bo'lishi kerak")
+
         if not options["confirm"]:
             self.stdout.write(
                 self.style.WARNING(
                     """
-Ehtiyot bo'ling! Bu komanda BAZADAGI BARCHA MA'LUMOTLARNI O'CHIRIB TASHLAYDI!
+Ehtiyot bo'ling! Bu komanda BAZADAGI MA'LUMOTLARNI O'CHIRIB TASHLAYDI!
 Agar ishonchingiz komil bo'lsa, --confirm flagini qo'shing:
-python manage.py db_tozalash --confirm
+python manage.py clear_db --confirm
                 """
                 )
             )
             return
 
-        # Modellarni tozalash tartibi (foreign key bog'liqliklarini hisobga olgan holda)
-        models_to_clear = [
-            Serving,
-            Report,
-            Recipe,
-            UserRole,
-            Ingredient,
-            Meal,
-            User,
-        ]
-
-        for model in models_to_clear:
-            count, _ = model.objects.all().delete()
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f"{model.__name__} jadvalidan {count} ta yozuv o'chirildi"
+        started = time.perf_counter()
+        if before is not None:
+            self.prune(before, options["chunk_size"], options["verbosity"])
+        else:
+            scopes = options["only"] or list(SCOPES)
+            targets = [model for scope in scopes for model in SCOPES[scope]]
+            try:
+                stats = wipe(
+                    targets,
+                    reset_sequences=not options["keep_sequences"],
+                    truncate=options["truncate"],
                 )
+            except ValueError as exc:
+                raise CommandError(str(exc))
+            for table, count, elapsed in stats:
+                count = "?" if count is None else count
+                self.stdout.write(f"{table}: {count} ta yozuv ({elapsed:.2f} s)")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Tozalash tugadi ({time.perf_counter() - started:.2f} s)"
             )
+        )
 
+    def prune(self, before, chunk_size, verbosity):
+        total = 0
+        for deleted, elapsed in prune_servings(before, chunk_size):
+            total += deleted
+            if verbosity > 1:
+                self.stdout.write(f"{deleted} ta porsiya o'chirildi ({elapsed:.2f} s)")
         self.stdout.write(
-            self.style.SUCCESS("Barcha jadvallar muvaffaqiyatli tozalandi!")
+            f"{Serving._meta.db_table}: {before} gacha {total} ta porsiya o'chirildi"
         )
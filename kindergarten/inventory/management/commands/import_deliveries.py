@@ -0,0 +1,68 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.deliveries import (
+    BATCH_SIZE,
+    FORMATS,
+    guess_format,
+    import_deliveries,
+    read_rows,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Yetkazib berishlarni CSV yoki NDJSON fayldan import qilish "
+        "(miqdorlar mavjud zaxiraga qo'shiladi)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Fayl yo'li yoki stdin uchun '-'")
+        parser.add_argument("--format", choices=FORMATS)
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            "--show-errors", type=int, default=20, help="Ko'rsatiladigan xatolar soni"
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or guess_format(path)
+        if fmt is None:
+            raise CommandError("Formatni aniqlab bo'lmadi: --format csv|ndjson")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size musbat bo'lishi kerak")
+
+        started = time.perf_counter()
+        if path == "-":
+            summary = self.run(sys.stdin, fmt, options["batch_size"])
+        else:
+            try:
+                stream = open(path, encoding="utf-8-sig", newline="")
+            except OSError as exc:
+                raise CommandError(f"Faylni ochib bo'lmadi: {exc}")
+            with stream:
+                summary = self.run(stream, fmt, options["batch_size"])
+
+        for error in summary["errors"][: options["show_errors"]]:
+            self.stderr.write(f"{error['line']}-qator: {error['error']}")
+        stopped = summary["stopped_at"]
+        style = self.style.SUCCESS if stopped is None else self.style.WARNING
+        self.stdout.write(
+            style(
+                f"{summary['applied']}/{summary['rows']} ta qator qo'llandi, "
+                f"{summary['ingredients']} ta mahsulot "
+                f"({summary['created']} ta yangi), {summary['failed']} ta xato "
+                f"({time.perf_counter() - started:.2f} s)"
+            )
+        )
+        if stopped is not None:
+            # Oldingi qatorlar qo'llangan: qayta import shu qatordan boshlanadi
+            raise CommandError(
+                f"{stopped['line']}-qatorda to'xtadi: {stopped['error']}. "
+                f"Undan oldingi qatorlar qo'llandi"
+            )
+
+    def run(self, stream, fmt, batch_size):
+        return import_deliveries(read_rows(stream, fmt), batch_size=batch_size)
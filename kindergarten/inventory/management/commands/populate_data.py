@@ -1,153 +1,279 @@
-from django.core.management.base import BaseCommand
-import random
+import time
 from datetime import datetime, timedelta
-from django.utils import timezone
+from itertools import islice
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
-from inventory.models import Ingredient, Meal, Recipe, Serving, UserRole, Report, PortionEstimate
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from inventory.graph import recipes_changed
+from inventory.models import Ingredient, Meal, Recipe, Serving, UserRole
+from inventory.reports import build_monthly_reports, iter_months
+from inventory.rollups import rebuild_rollups
+from inventory.signals import stock_changed
+
+ROLES = ["admin", "chef", "manager"]
+INGREDIENTS = [
+    ("Rice", 5000),
+    ("Chicken", 3000),
+    ("Beef", 2000),
+    ("Potatoes", 4000),
+    ("Carrots", 2000),
+    ("Onions", 3000),
+    ("Tomatoes", 2500),
+    ("Cucumbers", 1500),
+    ("Flour", 3500),
+    ("Eggs", 1000),
+]
+MEALS = [
+    ("Plov", "nonushta"),
+    ("Manti", "nonushta"),
+    ("Shashlik", "nonushta"),
+    ("Lagman", "nonushta"),
+    ("Somsa", "nonushta"),
+    ("Omelette", "ushta"),
+    ("Porridge", "ushta"),
+    ("Sandwich", "ushta"),
+]
+HEAVY = {"Rice", "Flour", "Potatoes"}
+MEAT = {"Chicken", "Beef"}
+
 
 class Command(BaseCommand):
-    help = 'Populates the database with mock data'
+    help = (
+        "Sintetik ma'lumotlar generatori (benchmark uchun). Qayta ishga "
+        "tushirilganda mavjud yozuvlar takrorlanmaydi"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=5)
+        parser.add_argument("--meals", type=int, default=len(MEALS))
+        parser.add_argument("--ingredients", type=int, default=len(INGREDIENTS))
+        parser.add_argument("--days", type=int, default=90)
+        parser.add_argument("--servings-per-day", type=int, default=10)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--password",
+            default="password",
+            help="Yangi foydalanuvchilar uchun umumiy parol (bir marta xeshlanadi)",
+        )
 
     def handle(self, *args, **options):
-        users = []
-        roles = ['admin', 'chef', 'manager']
-        for i in range(1, 6):
-            user = User.objects.create_user(
-                username=f'user{i}',
-                password=f'password{i}',
-                first_name=f'First{i}',
-                last_name=f'Last{i}',
-                email=f'user{i}@example.com'
-            )
-            role = UserRole.objects.create(
-                user=user,
-                role=random.choice(roles)
+        for name in ("users", "meals", "ingredients", "batch_size"):
+            if options[name] < 1:
+                flag = name.replace("_", "-")
+                raise CommandError(f"--{flag} musbat bo'lishi kerak")
+        if options["days"] < 0 or options["servings_per_day"] < 0:
+            raise CommandError("--days va --servings-per-day manfiy bo'lmasin")
+        self.rng = np.random.default_rng(options["seed"])
+        self.batch_size = options["batch_size"]
+
+        users = self.stage("foydalanuvchilar", self.create_users, options)
+        ingredients = self.stage("mahsulotlar", self.create_ingredients, options)
+        meals = self.stage("ovqatlar", self.create_meals, options)
+        self.stage("retseptlar", self.create_recipes, meals, ingredients)
+        since = timezone.localdate() - timedelta(days=options["days"] - 1)
+        self.stage(
+            "porsiyalar",
+            self.create_servings,
+            meals,
+            users,
+            since,
+            options["days"],
+            options["servings_per_day"],
+        )
+        self.stage("hosila ma'lumotlar", self.rebuild_derived, ingredients)
+
+    # Har bir bosqich uchun bitta qator: yozuvlar soni va vaqt
+    def stage(self, label, func, *args):
+        started = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - started
+        if isinstance(result, int):
+            label = f"{label}: {result}"
+        elif result is not None:
+            label = f"{label}: {len(result)}"
+        self.stdout.write(self.style.SUCCESS(f"{label} ({elapsed:.2f} s)"))
+        return result
+
+    # Bir xil nomli yozuvlar qayta yaratilmaydi (ignore_conflicts), keyin
+    # barcha kerakli yozuvlar bitta so'rovda o'qiladi
+    def ensure(self, model, field, objects):
+        model.objects.bulk_create(
+            objects, batch_size=self.batch_size, ignore_conflicts=True
+        )
+        names = [getattr(obj, field) for obj in objects]
+        existing = {}
+        for start in range(0, len(names), self.batch_size):
+            chunk = names[start : start + self.batch_size]
+            existing.update(
+                model.objects.filter(**{f"{field}__in": chunk}).in_bulk(
+                    field_name=field
+                )
             )
-            users.append(user)
-            self.stdout.write(self.style.SUCCESS(f"Created user: {user.username} with role {role.role}"))
-
-        # Create ingredients
-        ingredients = [
-            {"name": "Rice", "min_quantity": 5000},
-            {"name": "Chicken", "min_quantity": 3000},
-            {"name": "Beef", "min_quantity": 2000},
-            {"name": "Potatoes", "min_quantity": 4000},
-            {"name": "Carrots", "min_quantity": 2000},
-            {"name": "Onions", "min_quantity": 3000},
-            {"name": "Tomatoes", "min_quantity": 2500},
-            {"name": "Cucumbers", "min_quantity": 1500},
-            {"name": "Flour", "min_quantity": 3500},
-            {"name": "Eggs", "min_quantity": 1000},
+        return [existing[name] for name in names]
+
+    def create_users(self, options):
+        password = make_password(options["password"])
+        users = self.ensure(
+            User,
+            "username",
+            [
+                User(
+                    username=f"user{i}",
+                    password=password,
+                    first_name=f"First{i}",
+                    last_name=f"Last{i}",
+                    email=f"user{i}@example.com",
+                )
+                for i in range(1, options["users"] + 1)
+            ],
+        )
+        roles = self.rng.choice(ROLES, size=len(users)).tolist()
+        UserRole.objects.bulk_create(
+            [UserRole(user=user, role=role) for user, role in zip(users, roles)],
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+        return [user.pk for user in users]
+
+    def create_ingredients(self, options):
+        count = options["ingredients"]
+        specs = INGREDIENTS[:count] + [
+            (f"Ingredient {i}", int(self.rng.integers(500, 5000)))
+            for i in range(len(INGREDIENTS) + 1, count + 1)
         ]
+        today = timezone.localdate()
+        ages = self.rng.integers(1, 31, size=len(specs))
+        factors = self.rng.uniform(1.5, 3.0, size=len(specs))
+        ingredients = self.ensure(
+            Ingredient,
+            "name",
+            [
+                Ingredient(
+                    name=name,
+                    quantity=float(minimum * factor),
+                    delivery_date=today - timedelta(days=int(age)),
+                    min_quantity=minimum,
+                )
+                for (name, minimum), age, factor in zip(specs, ages, factors)
+            ],
+        )
+        return {ingredient.pk: ingredient.name for ingredient in ingredients}
 
-        ingredient_objs = []
-        for ing in ingredients:
-            days_ago = random.randint(1, 30)
-            obj = Ingredient.objects.create(
-                name=ing["name"],
-                quantity=random.uniform(ing["min_quantity"] * 1.5, ing["min_quantity"] * 3),
-                delivery_date=timezone.now() - timedelta(days=days_ago),
-                min_quantity=ing["min_quantity"]
-            )
-            ingredient_objs.append(obj)
-            self.stdout.write(self.style.SUCCESS(f"Created ingredient: {obj.name} ({obj.quantity}g)"))
-
-        # Create meals
-        meals = [
-            {"name": "Plov", "type": "nonushta"},
-            {"name": "Manti", "type": "nonushta"},
-            {"name": "Shashlik", "type": "nonushta"},
-            {"name": "Lagman", "type": "nonushta"},
-            {"name": "Somsa", "type": "nonushta"},
-            {"name": "Omelette", "type": "ushta"},
-            {"name": "Porridge", "type": "ushta"},
-            {"name": "Sandwich", "type": "ushta"},
+    def create_meals(self, options):
+        count = options["meals"]
+        specs = MEALS[:count] + [
+            (f"Meal {i}", "nonushta" if i % 2 else "ushta")
+            for i in range(len(MEALS) + 1, count + 1)
         ]
+        meals = self.ensure(Meal, "name", [Meal(name=n, type=t) for n, t in specs])
+        return [meal.pk for meal in meals]
 
-        meal_objs = []
-        for m in meals:
-            obj = Meal.objects.create(
-                name=m["name"],
-                type=m["type"]
+    # Har bir ovqatga 3-7 ta tasodifiy mahsulot. Retsepti bor ovqatlar
+    # o'zgartirilmaydi
+    def create_recipes(self, meals, ingredients):
+        ingredient_ids = list(ingredients)
+        has_recipes = set()
+        for start in range(0, len(meals), self.batch_size):
+            chunk = meals[start : start + self.batch_size]
+            has_recipes.update(
+                Recipe.objects.filter(meal_id__in=chunk).values_list(
+                    "meal_id", flat=True
+                )
             )
-            meal_objs.append(obj)
-            self.stdout.write(self.style.SUCCESS(f"Created meal: {obj.name} ({obj.type})"))
-
-        # Create recipes (assign ingredients to meals)
-        for meal in meal_objs:
-            # Select 3-7 random ingredients for each meal
-            num_ingredients = random.randint(3, 7)
-            selected_ingredients = random.sample(ingredient_objs, num_ingredients)
-            
-            for ing in selected_ingredients:
-                # Determine quantity based on ingredient type
-                if ing.name in ["Rice", "Flour", "Potatoes"]:
-                    quantity = random.uniform(100, 500)
-                elif ing.name in ["Chicken", "Beef"]:
-                    quantity = random.uniform(50, 300)
+        recipes = []
+        for meal_id in meals:
+            if meal_id in has_recipes:
+                continue
+            size = min(int(self.rng.integers(3, 8)), len(ingredient_ids))
+            for pk in self.rng.choice(ingredient_ids, size=size, replace=False):
+                name = ingredients[int(pk)]
+                if name in HEAVY:
+                    low, high = 100, 500
+                elif name in MEAT:
+                    low, high = 50, 300
                 else:
-                    quantity = random.uniform(20, 150)
-                    
-                Recipe.objects.create(
-                    meal=meal,
-                    ingredient=ing,
-                    quantity=quantity
-                )
-                self.stdout.write(self.style.SUCCESS(f"Created recipe: {meal.name} with {ing.name} ({quantity}g)"))
-
-        # Create servings (covering last 3 months)
-        now = timezone.now()
-        for i in range(90):  # Last 90 days
-            date = now - timedelta(days=i)
-            # Create 5-15 servings per day
-            for _ in range(random.randint(5, 15)):
-                meal = random.choice(meal_objs)
-                user = random.choice(users)
-                
-                Serving.objects.create(
-                    meal=meal,
-                    user=user,
-                    date_served=date,
-                    portion_count=random.randint(1, 5)
-                )
-            self.stdout.write(self.style.SUCCESS(f"Created servings for {date.strftime('%Y-%m-%d')}"))
-
-        # Create monthly reports (for last 12 months)
-        for i in range(12):
-            month = now.replace(day=1) - timedelta(days=30*i)
-            for meal in meal_objs:
-                prepared = random.randint(50, 300)
-                possible = prepared + random.randint(-20, 50)
-                difference = ((prepared - possible) / possible) * 100 if possible > 0 else 0
-                
-                Report.objects.create(
-                    month=month,
-                    meal=meal,
-                    prepared_portions=prepared,
-                    possible_portions=possible,
-                    difference_percentage=difference,
-                    warning_triggered=difference < -10
+                    low, high = 20, 150
+                recipes.append(
+                    Recipe(
+                        meal_id=meal_id,
+                        ingredient_id=int(pk),
+                        quantity=float(self.rng.uniform(low, high)),
+                    )
                 )
-            self.stdout.write(self.style.SUCCESS(f"Created reports for {month.strftime('%Y-%m')}"))
-
-        # Create portion estimates
-        for meal in meal_objs:
-            # Get all recipes for this meal
-            recipes = Recipe.objects.filter(meal=meal)
-            
-            # Calculate possible portions based on ingredient quantities
-            min_portions = None
-            for recipe in recipes:
-                # Get the ingredient
-                ing = recipe.ingredient
-                # Calculate how many portions we can make with this ingredient
-                portions = int(ing.quantity / recipe.quantity)
-                if min_portions is None or portions < min_portions:
-                    min_portions = portions
-            
-            if min_portions is not None:
-                PortionEstimate.objects.create(
-                    meal=meal,
-                    possible_portions=max(0, min_portions)
-                )
-                self.stdout.write(self.style.SUCCESS(f"Created portion estimate for {meal.name}: {min_portions} portions"))
\ No newline at end of file
+        Recipe.objects.bulk_create(
+            recipes, batch_size=self.batch_size, ignore_conflicts=True
+        )
+        # bulk_create signal yubormaydi — retsept grafini qo'lda eskirtirish
+        recipes_changed()
+        return recipes
+
+    # Porsiyalar faqat hali porsiyasi yo'q kunlar uchun yaratiladi — qayta
+    # ishga tushirish takrorlamaydi, --days oshirilsa eski kunlar qo'shiladi
+    def create_servings(self, meals, users, since, days, per_day):
+        self.new_days = []
+        if not days or not per_day:
+            return 0
+        start = timezone.make_aware(datetime.combine(since, datetime.min.time()))
+        filled = set(
+            Serving.objects.filter(date_served__gte=start).dates("date_served", "day")
+        )
+        missing = [
+            since + timedelta(days=offset)
+            for offset in range(days)
+            if since + timedelta(days=offset) not in filled
+        ]
+        self.new_days = missing
+        rows = self.serving_rows(missing, meals, users, per_day)
+        # bulk_create emas: date_served auto_now_add, u har qatorning sanasini
+        # hozirgi vaqtga almashtiradi. Xom INSERT pre_save'ni chetlab o'tadi
+        quote = connection.ops.quote_name
+        columns = ", ".join(
+            quote(Serving._meta.get_field(name).column)
+            for name in ("meal", "user", "date_served", "portion_count")
+        )
+        sql = (
+            f"INSERT INTO {quote(Serving._meta.db_table)} ({columns}) "
+            "VALUES (%s, %s, %s, %s)"
+        )
+        created = 0
+        while True:
+            chunk = list(islice(rows, self.batch_size * 10))
+            if not chunk:
+                break
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(sql, chunk)
+            created += len(chunk)
+        return created
+
+    def serving_rows(self, days, meals, users, per_day):
+        meals, users = np.array(meals), np.array(users)
+        for day in days:
+            midnight = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+            # Ish kuni 08:00 - 18:00 oralig'ida
+            seconds = np.sort(self.rng.integers(8 * 3600, 18 * 3600, size=per_day))
+            meal_ids = self.rng.choice(meals, size=per_day)
+            user_ids = self.rng.choice(users, size=per_day)
+            portions = self.rng.integers(1, 6, size=per_day)
+            rows = zip(
+                seconds.tolist(), meal_ids.tolist(), user_ids.tolist(), portions.tolist()
+            )
+            adapt = connection.ops.adapt_datetimefield_value
+            for second, meal_id, user_id, count in rows:
+                served = adapt(midnight + timedelta(seconds=second))
+                yield meal_id, user_id, served, count
+
+    # Bulk yozuvlar signal yubormaydi: yangi kunlar uchun yig'indilar va
+    # hisobotlar, barcha porsiya baholari bir marta qayta hisoblanadi
+    def rebuild_derived(self, ingredients):
+        if self.new_days:
+            since = min(self.new_days)
+            rebuild_rollups(since=since)
+            for month in iter_months(since, timezone.localdate()):
+                build_monthly_reports(month)
+        stock_changed(ingredient_ids=ingredients.keys())
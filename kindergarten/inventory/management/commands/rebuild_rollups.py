@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from inventory.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Kunlik porsiya yig'indilarini xom Serving ma'lumotlaridan qayta qurish"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", help="Boshlang'ich kun (YYYY-MM-DD)")
+        parser.add_argument("--until", help="Oxirgi kun (YYYY-MM-DD)")
+
+    def handle(self, *args, **options):
+        since, until = options["since"], options["until"]
+        for value in (since, until):
+            if value and parse_date(value) is None:
+                raise CommandError("Sana YYYY-MM-DD formatida bo'lishi kerak")
+        started = time.perf_counter()
+        count = rebuild_rollups(since, until)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{count} ta kunlik yig'indi qayta qurildi "
+                f"({time.perf_counter() - started:.2f} s)"
+            )
+        )
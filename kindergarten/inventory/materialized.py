@@ -0,0 +1,70 @@
+from datetime import date, timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+# PostgreSQL materialized view'lari (0005 migratsiyasi). SQLite'da yo‘q —
+# chaqiruvchilar jonli so‘rovga qaytadi
+MONTHLY_PORTIONS = "inventory_monthly_portions"
+
+
+def enabled():
+    return connection.vendor == "postgresql"
+
+
+def next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+# Kunlik yig‘indilar jadvalidan qayta hisoblash. CONCURRENTLY — yangilanish
+# vaqtida o‘qishlar bloklanmaydi
+def refresh_monthly_portions():
+    if not enabled():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {MONTHLY_PORTIONS}")
+    return True
+
+
+# Yopilgan oy yozuvlari o‘zgardi (orqaga sanali porsiya, qayta qurish,
+# tozalash) — view tranzaksiya muvaffaqiyatli tugagach yangilanadi
+def refresh_on_commit():
+    if enabled():
+        transaction.on_commit(refresh_monthly_portions)
+
+
+# View'dan olinadigan oylar oralig‘i [start, end): since/until (kunlar) ichida
+# to‘liq qamrab olingan va yangilanish paytida yopilgan oylar. None — view
+# ishlatilmaydi. start None bo‘lsa quyi chegara yo‘q
+def covered_months(since=None, until=None):
+    if not enabled():
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT refreshed_at FROM {MONTHLY_PORTIONS} LIMIT 1")
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    end = timezone.localtime(row[0]).date().replace(day=1)
+    if until is not None:
+        end = min(end, (until + timedelta(days=1)).replace(day=1))
+    start = None
+    if since is not None:
+        start = since if since.day == 1 else next_month(since)
+        if start >= end:
+            return None
+    return start, end
+
+
+# {(yil, oy): porsiyalar} — covered_months() oralig‘i uchun
+def monthly_portions(start, end):
+    sql = f"SELECT month, SUM(portions) FROM {MONTHLY_PORTIONS} WHERE month < %s"
+    params = [end]
+    if start is not None:
+        sql += " AND month >= %s"
+        params.append(start)
+    with connection.cursor() as cursor:
+        cursor.execute(sql + " GROUP BY month", params)
+        return {
+            (month.year, month.month): int(portions)
+            for month, portions in cursor.fetchall()
+        }
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.21 on 2026-10-18 12:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['ingredient', 'meal'], name='recipe_ingredient_meal_idx'),
+        ),
+    ]
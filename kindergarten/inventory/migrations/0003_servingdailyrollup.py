@@ -0,0 +1,51 @@
+# Generated by Django 4.2.21 on 2026-10-18 12:21
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+import django.db.models.deletion
+
+
+# Mavjud porsiyalardan kunlik yig‘indilarni to‘ldirish (rollups.rebuild_rollups
+# bilan bir xil guruhlash) — aks holda analitika bo‘sh qaytadi
+def fill_rollups(apps, schema_editor):
+    Serving = apps.get_model("inventory", "Serving")
+    ServingDailyRollup = apps.get_model("inventory", "ServingDailyRollup")
+    rows = (
+        Serving.objects.annotate(day=TruncDate("date_served"))
+        .values("day", "meal_id", "user_id")
+        .annotate(portions=Sum("portion_count"))
+        .order_by()
+    )
+    ServingDailyRollup.objects.bulk_create(
+        (ServingDailyRollup(**row) for row in rows.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('inventory', '0002_recipe_recipe_ingredient_meal_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ServingDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('portions', models.PositiveIntegerField(default=0)),
+                ('meal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='inventory.meal')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='daily_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Serving Daily Rollup',
+                'verbose_name_plural': 'Serving Daily Rollups',
+                'unique_together': {('day', 'meal', 'user')},
+            },
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
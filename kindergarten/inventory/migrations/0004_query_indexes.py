@@ -0,0 +1,33 @@
+# Generated by Django 4.2.21 on 2026-10-18 12:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_servingdailyrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(condition=models.Q(('quantity__lte', models.F('min_quantity'))), fields=['name', 'quantity', 'min_quantity'], name='ingredient_low_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='report',
+            index=models.Index(condition=models.Q(('warning_triggered', True)), fields=['meal'], name='report_warning_meal_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='serving',
+            index=models.Index(fields=['meal', 'date_served'], name='serving_meal_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='serving',
+            index=models.Index(fields=['date_served', 'meal', 'portion_count'], name='serving_date_meal_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servingdailyrollup',
+            index=models.Index(fields=['user', 'day', 'portions'], name='rollup_user_day_idx'),
+        ),
+    ]
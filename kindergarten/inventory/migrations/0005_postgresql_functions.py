@@ -0,0 +1,80 @@
+from django.db import migrations
+
+# Faqat PostgreSQL: SQLite'da portions.FloorDiv umumiy ifoda bilan,
+# oylik yig‘indilar esa to‘g‘ridan-to‘g‘ri kunlik jadvaldan hisoblanadi
+
+# Python'dagi float "//" natijasi: floor(a / b) yaxlitlanishda bittaga oshib
+# ketishi mumkin (1.0 / 0.1 = 10.0, lekin 1.0 // 0.1 = 9.0). q * b aniq
+# ko‘paytmasi Dekker usulida (xatosiz) a bilan solishtiriladi
+FLOOR_DIV_SQL = """
+CREATE OR REPLACE FUNCTION inventory_floor_div(a double precision, b double precision)
+RETURNS double precision AS $$
+DECLARE
+    q double precision := floor(a / b);
+    p double precision := q * b;
+    c double precision;
+    qh double precision;
+    ql double precision;
+    bh double precision;
+    bl double precision;
+BEGIN
+    c := 134217729 * q;
+    qh := c - (c - q);
+    ql := q - qh;
+    c := 134217729 * b;
+    bh := c - (c - b);
+    bl := b - bh;
+    IF a - p < ((qh * bh - p) + qh * bl + ql * bh) + ql * bl THEN
+        RETURN q - 1;
+    END IF;
+    RETURN q;
+END
+$$ LANGUAGE plpgsql IMMUTABLE STRICT PARALLEL SAFE
+"""
+
+# Oy x ovqat bo‘yicha porsiyalar. refreshed_at — yangilangan vaqt: undan
+# oldin yopilgan oylargina ishlatiladi, qolgani jonli hisoblanadi.
+# UNIQUE indeks REFRESH ... CONCURRENTLY uchun kerak
+MONTHLY_PORTIONS_SQL = [
+    """
+    CREATE MATERIALIZED VIEW inventory_monthly_portions AS
+    SELECT date_trunc('month', day)::date AS month,
+           meal_id,
+           SUM(portions)::bigint AS portions,
+           now() AS refreshed_at
+    FROM inventory_servingdailyrollup
+    GROUP BY 1, 2
+    """,
+    """
+    CREATE UNIQUE INDEX inventory_monthly_portions_uniq
+    ON inventory_monthly_portions (month, meal_id)
+    """,
+]
+
+
+def forwards(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for sql in [FLOOR_DIV_SQL, *MONTHLY_PORTIONS_SQL]:
+        schema_editor.execute(sql)
+
+
+def backwards(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP MATERIALIZED VIEW IF EXISTS inventory_monthly_portions")
+    schema_editor.execute(
+        "DROP FUNCTION IF EXISTS "
+        "inventory_floor_div(double precision, double precision)"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+# O‘chirilgan foydalanuvchilardan qolgan takror (kun, ovqat, NULL) qatorlarni
+# bittaga birlashtirish — aks holda cheklov qo‘shilmaydi
+def merge_orphan_rollups(apps, schema_editor):
+    ServingDailyRollup = apps.get_model("inventory", "ServingDailyRollup")
+    orphans = ServingDailyRollup.objects.filter(user__isnull=True)
+    duplicates = (
+        orphans.values("day", "meal_id")
+        .annotate(rows=Count("pk"), keep=Min("pk"), portions=Sum("portions"))
+        .filter(rows__gt=1)
+        .order_by()
+    )
+    for row in duplicates:
+        group = orphans.filter(day=row["day"], meal_id=row["meal_id"])
+        group.filter(pk=row["keep"]).update(portions=row["portions"])
+        group.exclude(pk=row["keep"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_postgresql_functions'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_orphan_rollups, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='servingdailyrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', True)), fields=('day', 'meal'), name='rollup_day_meal_no_user_uniq'),
+        ),
+    ]
@@ -15,6 +15,14 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = "Ingredient"
         verbose_name_plural = "Ingredients"
+        indexes = [
+            # low_stock sharti uchun qisman indeks
+            models.Index(
+                fields=["name", "quantity", "min_quantity"],
+                condition=models.Q(quantity__lte=models.F("min_quantity")),
+                name="ingredient_low_stock_idx",
+            ),
+        ]
 
 
 class Meal(models.Model):
@@ -43,6 +51,12 @@ class Recipe(models.Model):
         verbose_name = "Recipe"
         verbose_name_plural = "Recipes"
         unique_together = ["meal", "ingredient"]
+        indexes = [
+            # Mahsulot -> ovqatlar teskari indeksi (porsiya bahosini yangilash uchun)
+            models.Index(
+                fields=["ingredient", "meal"], name="recipe_ingredient_meal_idx"
+            ),
+        ]
 
 
 class Serving(models.Model):
@@ -59,6 +73,46 @@ class Serving(models.Model):
     class Meta:
         verbose_name = "Serving"
         verbose_name_plural = "Servings"
+        indexes = [
+            # Ovqat + sana oralig‘i bo‘yicha filtrlar
+            models.Index(fields=["meal", "date_served"], name="serving_meal_date_idx"),
+            # Oylik hisobot: sana oralig‘i, meal bo‘yicha guruhlash (qoplovchi)
+            models.Index(
+                fields=["date_served", "meal", "portion_count"],
+                name="serving_date_meal_idx",
+            ),
+        ]
+
+
+class ServingDailyRollup(models.Model):
+    day = models.DateField()
+    meal = models.ForeignKey(
+        Meal, on_delete=models.CASCADE, related_name="daily_rollups"
+    )
+    user = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, related_name="daily_rollups"
+    )
+    portions = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.meal.name} ({self.day}): {self.portions} portions"
+
+    class Meta:
+        verbose_name = "Serving Daily Rollup"
+        verbose_name_plural = "Serving Daily Rollups"
+        unique_together = ["day", "meal", "user"]
+        constraints = [
+            # UNIQUE NULL'larni farqli deb hisoblaydi: o‘chirilgan foydalanuvchilar
+            # uchun (kun, ovqat) bo‘yicha bitta qator bo‘lishi alohida ta'minlanadi
+            models.UniqueConstraint(
+                fields=["day", "meal"],
+                condition=models.Q(user__isnull=True),
+                name="rollup_day_meal_no_user_uniq",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["user", "day", "portions"], name="rollup_user_day_idx"),
+        ]
 
 
 class UserRole(models.Model):
@@ -96,6 +150,14 @@ class Report(models.Model):
             "meal",
             "month",
         ]
+        indexes = [
+            # Faqat ogohlantirishli hisobotlar uchun qisman indeks
+            models.Index(
+                fields=["meal"],
+                condition=models.Q(warning_triggered=True),
+                name="report_warning_meal_idx",
+            ),
+        ]
 
 
 class PortionEstimate(models.Model):
@@ -0,0 +1,161 @@
+import math
+import time
+
+import numpy as np
+
+from .models import Meal
+from .planning import PlanError, stock_snapshot
+
+try:
+    from scipy.optimize import Bounds, LinearConstraint, milp
+except ImportError:  # scipy ixtiyoriy — bo‘lmasa faqat greedy ishlaydi
+    milp = None
+
+METHODS = ("auto", "milp", "greedy")
+
+
+# Menyu cheklovlari: [{"meal_id": 1, "min": 0, "max": 50, "weight": 1}, ...].
+# meals=None — grafdagi barcha ovqatlar, og‘irligi 1 (jami porsiyalar)
+def parse_targets(snapshot, meals=None):
+    meal_index = snapshot["meal_index"]
+    if meals is None:
+        meals = [{"meal_id": pk} for pk in meal_index]
+    if not isinstance(meals, list) or not meals:
+        raise PlanError("Ovqatlar ro‘yxati bo‘lishi kerak")
+    targets = {}
+    for item in meals:
+        try:
+            meal_id = int(item["meal_id"])
+            lower = int(item.get("min") or 0)
+            upper = item.get("max")
+            upper = math.inf if upper is None else int(upper)
+            weight = float(item.get("weight", 1))
+        except (KeyError, TypeError, ValueError, OverflowError, AttributeError):
+            raise PlanError("Ovqat cheklovi noto‘g‘ri")
+        if lower < 0 or upper < lower or not 0 <= weight < math.inf:
+            raise PlanError(f"Ovqat cheklovi noto‘g‘ri: {meal_id}")
+        targets[meal_id] = (lower, upper, weight)
+
+    # Zaxira sarflamaydigan ovqatlar yechimga kirmaydi: ular maksimal porsiyada
+    unknown = {pk for pk in targets if pk not in meal_index}
+    if unknown:
+        known = Meal.objects.filter(pk__in=unknown).values_list("pk", flat=True)
+        missing = unknown - set(known)
+        if missing:
+            raise PlanError(f"Ovqat topilmadi: {min(missing)}")
+    matrix = snapshot["matrix"]
+    free = unknown | {
+        pk
+        for pk in targets
+        if pk not in unknown and not matrix[:, meal_index[pk]].any()
+    }
+    if free:
+        unbounded = [pk for pk in free if math.isinf(targets[pk][1])]
+        if unbounded:
+            raise PlanError(
+                f"Retseptsiz ovqat uchun maksimal porsiya kerak: {min(unbounded)}"
+            )
+    return targets, free
+
+
+# Greedy: har qadamda "tanqis" mahsulotlarni kam ishlatadigan ovqatga
+# (og‘irlik / zaxira bosimi) qolgan sig‘imning yarmi beriladi. Sig‘imi
+# tugagan ovqatlar keyingi qadamlarda hisobga olinmaydi
+def solve_greedy(A, stock, lower, upper, weight):
+    x = lower.astype(float)
+    remaining = stock - A @ x
+    active = np.flatnonzero(weight > 0)
+    while active.size:
+        sub = A[:, active]
+        clamped = np.maximum(remaining, 0.0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fits = np.where(sub > 0, np.floor_divide(clamped[:, None], sub), np.inf)
+            cap = np.minimum(fits.min(axis=0), upper[active] - x[active])
+            pressure = (sub / np.maximum(clamped, 1e-9)[:, None]).sum(axis=0)
+        open_ = cap >= 1
+        if not open_.all():
+            active, cap, pressure = active[open_], cap[open_], pressure[open_]
+            if not active.size:
+                break
+        best = int((weight[active] / pressure).argmax())
+        step = math.ceil(cap[best] / 2)
+        x[active[best]] += step
+        remaining -= A[:, active[best]] * step
+    return x
+
+
+def solve_milp(A, stock, lower, upper, weight, time_limit):
+    result = milp(
+        c=-weight,
+        constraints=LinearConstraint(A, -np.inf, stock),
+        integrality=np.ones(len(weight)),
+        bounds=Bounds(lower, upper),
+        options={"time_limit": time_limit},
+    )
+    if result.x is None:
+        return None
+    x = np.round(result.x)
+    # Yaxlitlash xatosi zaxiradan oshirmasligi kerak
+    if np.any(A @ x > stock + 1e-6) or np.any(x < lower):
+        return None
+    return x
+
+
+# Umumiy og‘irlikni (standart: jami porsiyalar) maksimallashtiruvchi butun
+# sonli porsiyalar. auto: scipy bo‘lsa MILP, natija greedy bilan solishtiriladi
+def optimize_menu(meals=None, method="auto", time_limit=5.0, snapshot=None):
+    if method not in METHODS:
+        raise PlanError(f"Usul noma’lum: {method}")
+    if method == "milp" and milp is None:
+        raise PlanError("MILP uchun scipy o‘rnatilmagan")
+    snapshot = snapshot or stock_snapshot()
+    targets, free = parse_targets(snapshot, meals)
+
+    meal_ids = [pk for pk in targets if pk not in free]
+    columns = [snapshot["meal_index"][pk] for pk in meal_ids]
+    A = snapshot["matrix"][:, columns]
+    rows = A.any(axis=1)
+    A, stock = A[rows], snapshot["stock"][rows]
+    ingredient_ids = snapshot["ingredient_ids"][rows]
+    lower = np.array([targets[pk][0] for pk in meal_ids], dtype=float)
+    upper = np.array([targets[pk][1] for pk in meal_ids], dtype=float)
+    weight = np.array([targets[pk][2] for pk in meal_ids], dtype=float)
+
+    short = A @ lower > stock
+    if short.any():
+        raise PlanError(
+            "Minimal porsiyalar uchun zaxira yetarli emas: "
+            f"{int(ingredient_ids[short.argmax()])}"
+        )
+
+    started = time.perf_counter()
+    x, used_method = None, "greedy"
+    if not meal_ids:
+        x = lower
+    elif method != "greedy" and milp is not None:
+        x = solve_milp(A, stock, lower, upper, weight, time_limit)
+        used_method = "milp"
+    if meal_ids and method != "milp":
+        greedy = solve_greedy(A, stock, lower, upper, weight)
+        if x is None or weight @ greedy > weight @ x:
+            x, used_method = greedy, "greedy"
+    if x is None:
+        raise PlanError("Yechim topilmadi")
+    elapsed = time.perf_counter() - started
+
+    portions = {pk: int(count) for pk, count in zip(meal_ids, x)}
+    for pk in free:
+        portions[pk] = targets[pk][1]
+    remaining = stock - A @ x
+    # To‘liq ishlatilgan mahsulotlar: birorta rejadagi ovqatga ham yetmaydi
+    blocked = ((A > 0) & (remaining[:, None] < A)).any(axis=1)
+    return {
+        "method": used_method,
+        "portions": portions,
+        "total_portions": sum(portions.values()),
+        "objective": float(
+            weight @ x + sum(targets[pk][1] * targets[pk][2] for pk in free)
+        ),
+        "bottlenecks": [int(pk) for pk in ingredient_ids[blocked]],
+        "solve_ms": round(elapsed * 1000, 3),
+    }
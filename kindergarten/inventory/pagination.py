@@ -0,0 +1,65 @@
+import json
+
+from django.http import StreamingHttpResponse
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class BaseCursorPagination(CursorPagination):
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+
+class ServingCursorPagination(BaseCursorPagination):
+    ordering = ("-date_served", "-id")
+
+
+class ReportCursorPagination(BaseCursorPagination):
+    ordering = ("-month", "-id")
+
+
+class RecipeCursorPagination(BaseCursorPagination):
+    ordering = ("id",)
+
+
+# ?stream=1 — butun jadvalni server tomonidagi iterator orqali bo‘laklab
+# eksport qilish; ?stream_format=json bo‘lsa JSON massiv, aks holda NDJSON.
+# DRF band qilgan ?format= (kontent tanlash) parametri ishlatilmaydi
+class StreamingListMixin:
+    stream_chunk_size = 2000
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get("stream") not in ("1", "true"):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        if request.query_params.get("stream_format") == "json":
+            return StreamingHttpResponse(
+                self._stream_json(queryset), content_type="application/json"
+            )
+        return StreamingHttpResponse(
+            self._stream_ndjson(queryset), content_type="application/x-ndjson"
+        )
+
+    def _stream_chunks(self, queryset):
+        chunk = []
+        for obj in queryset.iterator(chunk_size=self.stream_chunk_size):
+            chunk.append(obj)
+            if len(chunk) == self.stream_chunk_size:
+                yield self.get_serializer(chunk, many=True).data
+                chunk = []
+        if chunk:
+            yield self.get_serializer(chunk, many=True).data
+
+    def _stream_ndjson(self, queryset):
+        for rows in self._stream_chunks(queryset):
+            yield "".join(json.dumps(row, cls=JSONEncoder) + "\n" for row in rows)
+
+    def _stream_json(self, queryset):
+        yield "["
+        separator = ""
+        for rows in self._stream_chunks(queryset):
+            for row in rows:
+                yield separator + json.dumps(row, cls=JSONEncoder)
+                separator = ","
+        yield "]"
@@ -1,19 +1,26 @@
 from rest_framework.permissions import BasePermission
 
+_UNSET = object()
 
-class IsAdminOrManager(BasePermission):
-    def has_permission(self, request, view):
-        return request.user.is_authenticated and (
-            request.user.role.role in ["admin", "manager"]
-            if hasattr(request.user, "role")
-            else False
-        )
+
+# Rol: token autentifikatsiyasi keshlagan bo‘lsa so‘rovsiz, aks holda UserRole'dan
+def user_role(user):
+    role = getattr(user, "_cached_role", _UNSET)
+    if role is _UNSET:
+        role = user.role.role if hasattr(user, "role") else None
+    return role
 
 
-class IsAdminOrChef(BasePermission):
+class RolePermission(BasePermission):
+    roles = ()
+
     def has_permission(self, request, view):
-        return request.user.is_authenticated and (
-            request.user.role.role in ["admin", "chef"]
-            if hasattr(request.user, "role")
-            else False
-        )
+        return request.user.is_authenticated and user_role(request.user) in self.roles
+
+
+class IsAdminOrManager(RolePermission):
+    roles = ("admin", "manager")
+
+
+class IsAdminOrChef(RolePermission):
+    roles = ("admin", "chef")
@@ -0,0 +1,139 @@
+import math
+from datetime import timedelta
+
+import numpy as np
+
+from .graph import recipe_graph
+from .models import Meal
+from .portions import load_stock
+
+# Rejalashtirish uchun zich matritsa: satrlar — mahsulotlar, ustunlar —
+# ovqatlar. Retsept grafi o‘zgarmaguncha qayta ishlatiladi
+_matrix = {"graph": None}
+
+
+class PlanError(ValueError):
+    pass
+
+
+def recipe_matrix():
+    global _matrix
+    graph = recipe_graph()
+    snapshot = _matrix
+    if snapshot["graph"] is not graph:
+        meal_ids = sorted(graph)
+        ingredient_ids = sorted({pk for rows in graph.values() for pk, _ in rows})
+        meal_index = {pk: index for index, pk in enumerate(meal_ids)}
+        row = {pk: index for index, pk in enumerate(ingredient_ids)}
+        matrix = np.zeros((len(ingredient_ids), len(meal_ids)))
+        for meal_id, rows in graph.items():
+            for ingredient_id, quantity in rows:
+                matrix[row[ingredient_id], meal_index[meal_id]] += quantity
+        snapshot = _matrix = {
+            "graph": graph,
+            "matrix": matrix,
+            "meal_ids": np.array(meal_ids, dtype=np.int64),
+            "ingredient_ids": np.array(ingredient_ids, dtype=np.int64),
+            "meal_index": meal_index,
+        }
+    return snapshot
+
+
+# Joriy zaxira (bitta so‘rov) va retsept matritsasi
+def stock_snapshot():
+    snapshot = dict(recipe_matrix())
+    ingredient_ids = snapshot["ingredient_ids"].tolist()
+    stock = load_stock(ingredient_ids)
+    snapshot["stock"] = np.array([stock.get(pk, 0.0) for pk in ingredient_ids])
+    return snapshot
+
+
+# Har bir ovqat uchun zaxira yetadigan maksimal porsiyalar. simulate_portions
+# bilan bir xil: float "//" va musbat miqdorli mahsulotlar bo‘yicha minimum
+def max_portions(snapshot):
+    matrix, stock = snapshot["matrix"], snapshot["stock"][:, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        portions = np.where(matrix > 0, np.floor_divide(stock, matrix), np.inf)
+    return portions.min(axis=0, initial=np.inf)
+
+
+# Reja: kunlar ro‘yxati, har bir kun — [{"meal_id": .., "portions": ..}, ...].
+# Natija: kunlar x ovqatlar talab matritsasi va retseptsiz ovqatlar
+def plan_matrix(snapshot, days):
+    if not isinstance(days, list) or not days:
+        raise PlanError("Reja kunlar ro‘yxati bo‘lishi kerak")
+    meal_index = snapshot["meal_index"]
+    day_idx, meal_idx, portions = [], [], []
+    free = set()
+    for day, lines in enumerate(days):
+        if not isinstance(lines, list):
+            raise PlanError(f"{day}-kun formati noto‘g‘ri")
+        for line in lines:
+            try:
+                meal_id = int(line["meal_id"])
+                count = float(line.get("portions", 0))
+            except (KeyError, TypeError, ValueError, OverflowError, AttributeError):
+                raise PlanError(f"{day}-kun qatori noto‘g‘ri")
+            if not math.isfinite(count) or count < 0:
+                raise PlanError(f"{day}-kun porsiya soni noto‘g‘ri")
+            if meal_id not in meal_index:
+                free.add(meal_id)
+                continue
+            day_idx.append(day)
+            meal_idx.append(meal_index[meal_id])
+            portions.append(count)
+    if free:
+        # Grafda yo‘q ovqat — retseptsiz (zaxira sarflamaydi) yoki mavjud emas
+        known = Meal.objects.filter(pk__in=free).values_list("pk", flat=True)
+        missing = free - set(known)
+        if missing:
+            raise PlanError(f"Ovqat topilmadi: {min(missing)}")
+    demand = np.zeros((len(days), len(meal_index)))
+    np.add.at(demand, (day_idx, meal_idx), portions)
+    return demand, free
+
+
+# Menyu rejasini baholash: har bir mahsulot qaysi kuni tugashi, reja nechta
+# kun to‘liq bajarilishi, rejani necha marta kattalashtirish mumkinligi va
+# rejadagi ovqatlar uchun maksimal porsiyalar
+def evaluate_plan(days, start=None, snapshot=None):
+    snapshot = snapshot or stock_snapshot()
+    demand, free = plan_matrix(snapshot, days)
+    stock = snapshot["stock"]
+    # kunlar x mahsulotlar: shu kun oxirigacha jami sarf
+    used = np.cumsum(demand @ snapshot["matrix"].T, axis=0)
+    short = used > stock
+    runs_out = short.any(axis=0)
+    first_short = short.argmax(axis=0)
+
+    depletion = []
+    for index in np.flatnonzero(runs_out):
+        day = int(first_short[index])
+        item = {
+            "ingredient_id": int(snapshot["ingredient_ids"][index]),
+            "day": day,
+            "shortfall": float(used[day, index] - stock[index]),
+        }
+        if start is not None:
+            item["date"] = (start + timedelta(days=day)).isoformat()
+        depletion.append(item)
+    depletion.sort(key=lambda item: (item["day"], item["ingredient_id"]))
+    feasible_days = depletion[0]["day"] if depletion else len(days)
+
+    total = used[-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scale = np.where(total > 0, stock / total, np.inf).min(initial=np.inf)
+
+    planned = np.flatnonzero(demand.any(axis=0))
+    portions = dict.fromkeys(free)
+    for meal_id, count in zip(
+        snapshot["meal_ids"][planned].tolist(), max_portions(snapshot)[planned]
+    ):
+        portions[meal_id] = None if np.isinf(count) else int(count)
+    return {
+        "days": len(days),
+        "feasible_days": feasible_days,
+        "depletion": depletion,
+        "max_portions": portions,
+        "plan_scale": None if np.isinf(scale) else float(scale),
+    }
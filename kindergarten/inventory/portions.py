@@ -0,0 +1,185 @@
+import math
+from collections import defaultdict
+
+import numpy as np
+from django.db import connection
+from django.db.models import (
+    Case,
+    F,
+    FloatField,
+    Func,
+    IntegerField,
+    Min,
+    Q,
+    Value,
+    When,
+)
+from django.db.models.functions import Cast, Coalesce, Floor, Mod
+from django.db.models.lookups import GreaterThan
+from django.utils import timezone
+
+from .graph import ingredient_users, recipe_graph
+from .models import Ingredient, Meal, PortionEstimate, Recipe
+
+
+# Python'dagi float "//" bilan aynan bir xil natija beruvchi SQL ifodasi:
+# CPython kabi fmod orqali bo‘linadi va 0.5 dan katta kasr yuqoriga olinadi.
+# PostgreSQL'da float uchun fmod yo‘q (MOD numeric'ga o‘tkazadi) — u yerda
+# 0005 migratsiyasidagi inventory_floor_div funksiyasi chaqiriladi
+class FloorDiv(Func):
+    function = "inventory_floor_div"
+    arity = 2
+    output_field = FloatField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        dividend, divisor = self.get_source_expressions()
+        div = (dividend - Mod(dividend, divisor)) / divisor
+        expression = Floor(div) + Case(
+            When(GreaterThan(div - Floor(div), 0.5), then=Value(1.0)),
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+        return compiler.compile(expression.resolve_expression(compiler.query))
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, **extra_context)
+
+
+def floor_div(dividend, divisor):
+    return FloorDiv(dividend, divisor)
+
+
+# Har bir ovqat uchun mumkin bo‘lgan porsiyalar — bitta agregat so‘rov.
+# Retsepti yo‘q ovqat uchun eski tsikl kabi inf qaytadi
+def meal_portions():
+    return Min(
+        floor_div(F("recipes__ingredient__quantity"), F("recipes__quantity")),
+        filter=Q(recipes__quantity__gt=0),
+    )
+
+
+def portions_by_meal(meal_ids=None):
+    meals = Meal.objects.all()
+    if meal_ids is not None:
+        meals = meals.filter(pk__in=meal_ids)
+    rows = meals.annotate(portions=meal_portions()).values_list("pk", "portions")
+    return {pk: math.inf if portions is None else portions for pk, portions in rows}
+
+
+# to_count() ning SQL ko‘rinishi: retseptsiz ovqat (NULL) — 0
+def meal_counts(meals):
+    return meals.annotate(
+        portions=Cast(Coalesce(meal_portions(), 0.0), IntegerField())
+    )
+
+
+def load_stock(ingredient_ids=None):
+    ingredients = Ingredient.objects.all()
+    if ingredient_ids is not None:
+        ingredients = ingredients.filter(pk__in=ingredient_ids)
+    return dict(ingredients.values_list("pk", "quantity"))
+
+
+def load_recipes(meal_ids=None):
+    recipes = Recipe.objects.all()
+    if meal_ids is not None:
+        recipes = recipes.filter(meal_id__in=meal_ids)
+    graph = defaultdict(list)
+    for meal_id, ingredient_id, quantity in recipes.values_list(
+        "meal_id", "ingredient_id", "quantity"
+    ):
+        graph[meal_id].append((ingredient_id, quantity))
+    return graph
+
+
+# Xotiradagi hisob: "agar zaxira shunday bo‘lsa" ssenariylari uchun.
+# stock — {ingredient_id: miqdor}, recipes — {meal_id: [(ingredient_id, miqdor)]}.
+# Retsept qatorlari uchta massivga yoyiladi, bo‘linish va ovqat bo‘yicha
+# minimum NumPy'da (planning.max_portions bilan bir xil float "//")
+def simulate_portions(stock, recipes, meal_ids=None):
+    meal_ids = list(recipes.keys() if meal_ids is None else meal_ids)
+    columns, quantities, available = [], [], []
+    for column, meal_id in enumerate(meal_ids):
+        for ingredient_id, quantity in recipes.get(meal_id, ()):
+            if quantity > 0:
+                columns.append(column)
+                quantities.append(quantity)
+                available.append(stock.get(ingredient_id, 0.0))
+    portions = np.full(len(meal_ids), np.inf)
+    np.minimum.at(
+        portions,
+        np.array(columns, dtype=np.intp),
+        np.floor_divide(
+            np.array(available, dtype=float), np.array(quantities, dtype=float)
+        ),
+    )
+    return dict(zip(meal_ids, portions.tolist()))
+
+
+# Modelga saqlash uchun butun son: cheksiz (retseptsiz) qiymat 0 deb olinadi
+def to_count(portions):
+    return 0 if math.isinf(portions) else int(portions)
+
+
+# Retsept grafi bo‘yicha hisob: bazadan faqat kerakli mahsulotlar zaxirasi
+# o‘qiladi
+def graph_portions(meal_ids):
+    graph = recipe_graph()
+    ingredient_ids = {pk for meal_id in meal_ids for pk, _ in graph.get(meal_id, ())}
+    return simulate_portions(load_stock(ingredient_ids), graph, meal_ids)
+
+
+# Teskari indeks: mahsulot -> uni ishlatadigan ovqatlar
+def meals_using(ingredient_ids):
+    return ingredient_users(ingredient_ids)
+
+
+# Berilgan ovqatlar uchun PortionEstimate'ni yangilash. Faqat qiymati
+# o‘zgargan baholar yoziladi va {meal_id: porsiyalar} ko‘rinishida qaytariladi
+def refresh_estimates(meal_ids=None):
+    if connection.vendor == "postgresql":
+        return upsert_estimates(meal_ids)
+    stored = PortionEstimate.objects.all()
+    if meal_ids is not None:
+        stored = stored.filter(meal_id__in=meal_ids)
+    previous = dict(stored.values_list("meal_id", "possible_portions"))
+    changed = [
+        PortionEstimate(meal_id=meal_id, possible_portions=to_count(portions))
+        for meal_id, portions in portions_by_meal(meal_ids).items()
+        if previous.get(meal_id) != to_count(portions)
+    ]
+    if changed:
+        PortionEstimate.objects.bulk_create(
+            changed,
+            update_conflicts=True,
+            unique_fields=["meal"],
+            update_fields=["possible_portions", "updated_at"],
+        )
+    return {estimate.meal_id: estimate.possible_portions for estimate in changed}
+
+
+# PostgreSQL: hisob va yozuv bitta INSERT ... SELECT ... ON CONFLICT so‘rovida.
+# WHERE — qiymati o‘zgarmagan qatorlar yozilmaydi va RETURNING'ga tushmaydi
+def upsert_estimates(meal_ids=None):
+    meals = Meal.objects.all()
+    if meal_ids is not None:
+        meal_ids = list(meal_ids)
+        if not meal_ids:
+            return {}
+        meals = meals.filter(pk__in=meal_ids)
+    rows = meal_counts(meals).values_list("pk", "portions")
+    select_sql, params = rows.query.sql_with_params()
+    table = connection.ops.quote_name(PortionEstimate._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (meal_id, possible_portions, updated_at) "
+            f"SELECT meal_id, portions, %s FROM ({select_sql}) "
+            "AS computed (meal_id, portions) "
+            "ON CONFLICT (meal_id) DO UPDATE SET "
+            "possible_portions = EXCLUDED.possible_portions, "
+            "updated_at = EXCLUDED.updated_at "
+            f"WHERE {table}.possible_portions <> EXCLUDED.possible_portions "
+            "RETURNING meal_id, possible_portions",
+            (timezone.now(), *params),
+        )
+        return dict(cursor.fetchall())
@@ -0,0 +1,217 @@
+from datetime import date, datetime
+
+from django.db import connection
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cache import REPORTS, invalidate_on_commit
+from .models import Meal, Report, ServingDailyRollup
+from .portions import meal_counts, portions_by_meal, to_count
+
+WARNING_THRESHOLD = 15
+
+
+# "YYYY-MM" satri, date yoki datetime -> oyning birinchi kuni (date)
+def parse_month(month=None):
+    if month is None:
+        month = timezone.localdate()
+    elif isinstance(month, str):
+        month = datetime.strptime(month[:7], "%Y-%m").date()
+    elif isinstance(month, datetime):
+        if timezone.is_aware(month):
+            month = timezone.localtime(month)
+        month = month.date()
+    return month.replace(day=1)
+
+
+# Oyning aniq chegaralari: [1-kun 00:00, keyingi oy 1-kun 00:00)
+def month_bounds(month):
+    month = parse_month(month)
+    next_month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+    return (
+        timezone.make_aware(datetime.combine(month, datetime.min.time())),
+        timezone.make_aware(datetime.combine(next_month, datetime.min.time())),
+    )
+
+
+def report_values(prepared_portions, possible_portions):
+    difference_percentage = 0
+    if possible_portions:
+        difference_percentage = (
+            (possible_portions - prepared_portions) / possible_portions
+        ) * 100
+    return {
+        "prepared_portions": prepared_portions,
+        "possible_portions": possible_portions,
+        "difference_percentage": difference_percentage,
+        "warning_triggered": difference_percentage > WARNING_THRESHOLD,
+    }
+
+
+# Oyning kunlik yig‘indilari: xom qatorlar arxivlanib o‘chirilgandan keyin
+# ham saqlanadi, shuning uchun o‘tgan oylarni qayta hisoblash ham to‘g‘ri
+def month_rollups(month):
+    start, end = month_bounds(month)
+    return ServingDailyRollup.objects.filter(
+        day__gte=timezone.localdate(start), day__lt=timezone.localdate(end)
+    )
+
+
+def prepared_by_meal(month, meal_ids=None):
+    rollups = month_rollups(month)
+    if meal_ids is not None:
+        rollups = rollups.filter(meal_id__in=meal_ids)
+    return dict(
+        rollups.values("meal_id")
+        .annotate(total=Sum("portions"))
+        .values_list("meal_id", "total")
+    )
+
+
+# Oy bo‘yicha hisobot satrlarini hisoblash (bazaga yozmasdan)
+def compute_reports(month=None, meal_ids=None):
+    month = parse_month(month)
+    prepared = prepared_by_meal(month, meal_ids)
+    return [
+        Report(
+            meal_id=meal_id,
+            month=month,
+            **report_values(prepared.get(meal_id, 0), to_count(portions)),
+        )
+        for meal_id, portions in portions_by_meal(meal_ids).items()
+    ]
+
+
+def save_reports(reports):
+    saved = Report.objects.bulk_create(
+        reports,
+        update_conflicts=True,
+        unique_fields=["meal", "month"],
+        update_fields=[
+            "prepared_portions",
+            "possible_portions",
+            "difference_percentage",
+            "warning_triggered",
+        ],
+    )
+    # bulk_create signal yubormaydi — ogohlantirishlar keshini qo‘lda eskirtirish
+    invalidate_on_commit(REPORTS)
+    return saved
+
+
+# Barcha ovqatlar uchun oylik hisobot: guruhlangan so‘rov, porsiya so‘rovi
+# va bitta upsert
+def build_monthly_reports(month=None, meal_ids=None):
+    if connection.vendor == "postgresql":
+        return upsert_reports(month, meal_ids)
+    return save_reports(compute_reports(month, meal_ids))
+
+
+REPORT_FIELDS = [
+    "meal_id",
+    "month",
+    "prepared_portions",
+    "possible_portions",
+    "difference_percentage",
+    "warning_triggered",
+]
+
+
+# PostgreSQL: report_values() hisobi SQL'da — tayyorlangan porsiyalar
+# (korrelyatsiyali SUM), mumkin bo‘lganlari (MIN ... FILTER) va foiz bitta
+# INSERT ... SELECT ... ON CONFLICT so‘rovida, Python'ga qatorlar tushmaydi
+def upsert_reports(month=None, meal_ids=None):
+    month = parse_month(month)
+    meals = Meal.objects.all()
+    if meal_ids is not None:
+        meal_ids = list(meal_ids)
+        if not meal_ids:
+            return []
+        meals = meals.filter(pk__in=meal_ids)
+    prepared = (
+        month_rollups(month)
+        .filter(meal=OuterRef("pk"))
+        .values("meal")
+        .annotate(total=Sum("portions"))
+        .values("total")
+    )
+    rows = meal_counts(meals.annotate(prepared=Coalesce(Subquery(prepared), 0)))
+    select_sql, params = rows.values_list(
+        "pk", "prepared", "portions"
+    ).query.sql_with_params()
+    quote = connection.ops.quote_name
+    table = quote(Report._meta.db_table)
+    columns = ", ".join(quote(name) for name in REPORT_FIELDS)
+    updates = ", ".join(
+        f"{quote(name)} = EXCLUDED.{quote(name)}" for name in REPORT_FIELDS[2:]
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({columns}) "
+            "SELECT meal_id, %s, prepared, possible, difference, difference > %s "
+            "FROM (SELECT meal_id, prepared, possible, CASE WHEN possible > 0 "
+            "THEN ((possible - prepared)::double precision / possible) * 100 "
+            "ELSE 0 END AS difference "
+            f"FROM ({select_sql}) AS computed (meal_id, prepared, possible)) "
+            "AS counted "
+            f"ON CONFLICT (meal_id, month) DO UPDATE SET {updates} "
+            f"RETURNING id, {columns}",
+            (month, WARNING_THRESHOLD, *params),
+        )
+        reports = [
+            Report.from_db(Report.objects.db, ["id", *REPORT_FIELDS], row)
+            for row in cursor.fetchall()
+        ]
+    invalidate_on_commit(REPORTS)
+    return reports
+
+
+# [since, until] oraliqidagi oylar ro‘yxati
+def iter_months(since, until):
+    month, until = parse_month(since), parse_month(until)
+    while month <= until:
+        yield month
+        month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+# Qayta hisoblash ishini (oy x ovqatlar bo‘lagi) birliklarga bo‘lish.
+# force=False bo‘lsa mavjud hisobotlar o‘tkazib yuboriladi
+def report_units(since, until, chunk_size=100, force=False):
+    months = list(iter_months(since, until))
+    meal_ids = list(Meal.objects.order_by("pk").values_list("pk", flat=True))
+    existing = set()
+    if not force and months:
+        existing = set(
+            Report.objects.filter(month__range=(months[0], months[-1])).values_list(
+                "month", "meal_id"
+            )
+        )
+    units = []
+    for month in months:
+        pending = [pk for pk in meal_ids if (month, pk) not in existing]
+        for start in range(0, len(pending), chunk_size):
+            units.append((month.isoformat(), pending[start : start + chunk_size]))
+    return units
+
+
+# Bitta birlik uchun hisobot satrlari — jarayonlar va Celery orqali
+# uzatish uchun oddiy lug‘atlar ko‘rinishida
+def compute_report_rows(month, meal_ids):
+    return [
+        {
+            "meal_id": report.meal_id,
+            "month": report.month.isoformat(),
+            "prepared_portions": report.prepared_portions,
+            "possible_portions": report.possible_portions,
+            "difference_percentage": report.difference_percentage,
+            "warning_triggered": report.warning_triggered,
+        }
+        for report in compute_reports(month, meal_ids)
+    ]
+
+
+# Natijalarni birlashtirish: (meal, month) bo‘yicha upsert, qayta ishga
+# tushirilganda ham natija bir xil
+def merge_report_rows(rows):
+    return len(save_reports([Report(**row) for row in rows]))
@@ -0,0 +1,152 @@
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear, TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from . import materialized
+from .cache import SERVINGS, invalidate_on_commit
+from .models import Serving, ServingDailyRollup
+
+
+def closed_month(day):
+    return day < timezone.localdate().replace(day=1)
+
+
+# Porsiyalarni (kun, ovqat, foydalanuvchi) bo‘yicha kunlik yig‘indiga qo‘shish.
+# sign=-1 o‘chirilgan porsiyalarni ayirish uchun
+def record_servings(servings, sign=1):
+    totals = Counter()
+    for serving in servings:
+        day = timezone.localdate(serving.date_served)
+        totals[(day, serving.meal_id, serving.user_id)] += serving.portion_count * sign
+    for (day, meal_id, user_id), portions in totals.items():
+        if not portions:
+            continue
+        # Kalit bo‘yicha bitta qator (cheklovlar) — baribir faqat bittasi
+        # yangilanadi, aks holda delta har bir takror qatorga qo‘shilardi
+        rows = ServingDailyRollup.objects.filter(
+            pk=Subquery(
+                ServingDailyRollup.objects.filter(
+                    day=day, meal_id=meal_id, user_id=user_id
+                ).values("pk")[:1]
+            )
+        )
+        if rows.update(portions=F("portions") + portions) or portions < 0:
+            continue
+        try:
+            with transaction.atomic():
+                ServingDailyRollup.objects.create(
+                    day=day, meal_id=meal_id, user_id=user_id, portions=portions
+                )
+        except IntegrityError:
+            # Parallel so‘rov qatorni yaratib ulgurgan
+            rows.update(portions=F("portions") + portions)
+    if totals:
+        invalidate_on_commit(SERVINGS)
+        if any(closed_month(day) for day, _, _ in totals):
+            materialized.refresh_on_commit()
+
+
+# Foydalanuvchi o‘chirilishidan oldin (pre_delete): uning yig‘indilari
+# (kun, ovqat, NULL) qatorlariga qo‘shiladi. SET_NULL o‘zi qatorlarni NULL'ga
+# o‘tkazib, o‘sha kalit uchun ikkinchi qator yaratgan bo‘lardi.
+# user_id=None — barcha foydalanuvchilar (clear_db --only users)
+def detach_user_rollups(user_id=None):
+    rows = ServingDailyRollup.objects.filter(user__isnull=False)
+    if user_id is not None:
+        rows = rows.filter(user_id=user_id)
+    orphans = ServingDailyRollup.objects.filter(user__isnull=True)
+    same_key = {"day": OuterRef("day"), "meal_id": OuterRef("meal_id")}
+    totals = (
+        rows.filter(**same_key)
+        .values("day", "meal_id")
+        .annotate(total=Sum("portions"))
+        .values("total")
+    )
+    with transaction.atomic():
+        orphans.filter(Exists(totals)).update(
+            portions=F("portions") + Subquery(totals)
+        )
+        missing = (
+            rows.exclude(Exists(orphans.filter(**same_key)))
+            .values("day", "meal_id")
+            .annotate(portions=Sum("portions"))
+            .order_by()
+        )
+        ServingDailyRollup.objects.bulk_create(
+            [ServingDailyRollup(user=None, **row) for row in missing],
+            batch_size=1000,
+        )
+        moved = rows.delete()[0]
+    return moved
+
+
+# Kunlik yig‘indilarni xom Serving ma'lumotlaridan qayta qurish
+def rebuild_rollups(since=None, until=None):
+    servings = Serving.objects.annotate(day=TruncDate("date_served"))
+    rollups = ServingDailyRollup.objects.all()
+    if since:
+        servings = servings.filter(day__gte=since)
+        rollups = rollups.filter(day__gte=since)
+    if until:
+        servings = servings.filter(day__lte=until)
+        rollups = rollups.filter(day__lte=until)
+    rows = (
+        servings.values("day", "meal_id", "user_id")
+        .annotate(portions=Sum("portion_count"))
+        .order_by()
+    )
+    with transaction.atomic():
+        rollups.delete()
+        created = ServingDailyRollup.objects.bulk_create(
+            (ServingDailyRollup(**row) for row in rows.iterator()),
+            batch_size=1000,
+        )
+        invalidate_on_commit(SERVINGS)
+        materialized.refresh_on_commit()
+    return len(created)
+
+
+# Oylar bo‘yicha porsiyalar (days — day_range() filtri). PostgreSQL'da
+# yopilgan oylar materialized view'dan, qolgan kunlar jadvaldan olinadi
+def monthly_totals(days):
+    totals = {}
+    rollups = ServingDailyRollup.objects.filter(**days)
+    covered = materialized.covered_months(days.get("day__gte"), days.get("day__lte"))
+    if covered:
+        start, end = covered
+        totals = materialized.monthly_portions(start, end)
+        in_view = Q(day__lt=end) if start is None else Q(day__gte=start, day__lt=end)
+        rollups = rollups.exclude(in_view)
+    rows = (
+        rollups.values_list(ExtractYear("day"), ExtractMonth("day"))
+        .annotate(portions=Sum("portions"))
+        .order_by()
+    )
+    for year, month, portions in rows:
+        totals[(year, month)] = totals.get((year, month), 0) + portions
+    return [
+        {
+            "date_served__year": year,
+            "date_served__month": month,
+            "total_portions": portions,
+        }
+        for (year, month), portions in sorted(totals.items())
+    ]
+
+
+# ?since=YYYY-MM-DD&until=YYYY-MM-DD -> filter lug‘ati
+def day_range(params, field="day"):
+    lookups = {}
+    for param, lookup in (("since", "gte"), ("until", "lte")):
+        value = params.get(param)
+        if not value:
+            continue
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(param)
+        lookups[f"{field}__{lookup}"] = day
+    return lookups
@@ -0,0 +1,128 @@
+import threading
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import revoke_token
+from .cache import AUTH, REPORTS, SERVINGS, STOCK, invalidate, invalidate_on_commit
+from .events import broadcast_portions, broadcast_stock
+from .graph import recipes_changed
+from .models import Ingredient, Meal, Recipe, Report, Serving, UserRole
+from .portions import meals_using, refresh_estimates
+from .rollups import detach_user_rollups, record_servings
+
+_pending = threading.local()
+
+
+def _pending_changes():
+    if not hasattr(_pending, "ingredients"):
+        _pending.ingredients = set()
+        _pending.meals = set()
+    return _pending
+
+
+# Zaxira yoki retsept o‘zgarganini belgilash. Bitta tranzaksiya ichidagi
+# barcha o‘zgarishlar jamlanadi va commit'dan keyin bir marta hisoblanadi
+def stock_changed(ingredient_ids=(), meal_ids=()):
+    pending = _pending_changes()
+    pending.ingredients.update(ingredient_ids)
+    pending.meals.update(meal_ids)
+    # robust: commit'dan keyingi xato so‘rovni buzmasligi kerak (xato loglanadi)
+    transaction.on_commit(flush_stock_changes, robust=True)
+
+
+def flush_stock_changes():
+    pending = _pending_changes()
+    if not pending.ingredients and not pending.meals:
+        return
+    ingredient_ids, meal_ids = pending.ingredients, pending.meals
+    pending.ingredients, pending.meals = set(), set()
+    changed = {}
+    try:
+        if ingredient_ids:
+            meal_ids = meal_ids | meals_using(ingredient_ids)
+        if meal_ids:
+            changed = refresh_estimates(meal_ids)
+    except Exception:
+        # Keyingi commit'da qayta urinish uchun navbatga qaytarish
+        pending.ingredients |= ingredient_ids
+        pending.meals |= meal_ids
+        raise
+    # Zaxiradan hosil bo‘lgan keshlangan qiymatlar (baholar, kam zaxira)
+    invalidate(STOCK)
+    broadcast_stock(ingredient_ids)
+    broadcast_portions(changed)
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def ingredient_changed(sender, instance, **kwargs):
+    stock_changed(ingredient_ids=[instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    recipes_changed()
+    stock_changed(meal_ids=[instance.meal_id])
+
+
+@receiver([post_save, post_delete], sender=Meal)
+def meal_changed(sender, instance, **kwargs):
+    recipes_changed()
+    # Nomi va turi analitika hamda hisobot natijalarida ham qaytariladi
+    invalidate_on_commit(STOCK, SERVINGS, REPORTS)
+
+
+@receiver([post_save, post_delete], sender=Report)
+def report_changed(sender, instance, **kwargs):
+    invalidate_on_commit(REPORTS)
+
+
+@receiver(pre_save, sender=Serving)
+def serving_before_save(sender, instance, **kwargs):
+    # Tahrirlashda eski qiymatni kunlik yig‘indidan ayirish uchun saqlab qo‘yish
+    instance._rollup_previous = None
+    if instance.pk:
+        instance._rollup_previous = Serving.objects.filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=Serving)
+def serving_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_rollup_previous", None)
+    if previous is not None:
+        record_servings([previous], sign=-1)
+    record_servings([instance])
+
+
+@receiver(post_delete, sender=Serving)
+def serving_deleted(sender, instance, **kwargs):
+    record_servings([instance], sign=-1)
+
+
+@receiver(pre_delete, sender=User)
+def user_deleting(sender, instance, **kwargs):
+    detach_user_rollups(instance.pk)
+
+
+# Keshlangan token -> (foydalanuvchi, rol): rol yoki foydalanuvchi o‘zgarishi.
+# Faqat last_login yangilanishi (har login'da) keshni eskirtirmaydi
+@receiver([post_save, post_delete], sender=UserRole)
+def role_changed(sender, **kwargs):
+    invalidate_on_commit(AUTH)
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) == {"last_login"}:
+        return
+    invalidate_on_commit(AUTH)
+
+
+# Logout (yoki admin token o‘chirsa): darhol va commit'dan keyin yana —
+# oradagi parallel so‘rov eski yozuvni qayta keshlagan bo‘lsa ham
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    revoke_token(instance.key)
+    transaction.on_commit(lambda: revoke_token(instance.key), robust=True)
@@ -0,0 +1,133 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+
+from .graph import meal_recipe, recipe_graph
+from .models import Ingredient, Meal, Serving
+from .rollups import record_servings
+from .signals import stock_changed
+
+
+class InsufficientStock(Exception):
+    def __init__(self, ingredient_name, available, required):
+        self.ingredient_name = ingredient_name
+        self.available = available
+        self.required = required
+        super().__init__(
+            f"{ingredient_name} yetarli emas. Mavjud: {available}g, Talab qilinadi: {required}g"
+        )
+
+
+# Shartli F() yangilash: zaxira yetarli bo‘lsagina kamaytiriladi. Qator soni
+# 0 bo‘lsa — zaxira yetmaydi, butun tranzaksiya bekor qilinadi
+def deduct_stock(demand):
+    with transaction.atomic():
+        # Tartiblangan ketma-ketlik parallel yozuvlarda deadlockning oldini oladi
+        for ingredient_id, required in sorted(demand.items()):
+            updated = Ingredient.objects.filter(
+                pk=ingredient_id, quantity__gte=required
+            ).update(quantity=F("quantity") - required)
+            if not updated:
+                name, available = Ingredient.objects.filter(
+                    pk=ingredient_id
+                ).values_list("name", "quantity").first() or (ingredient_id, 0)
+                raise InsufficientStock(name, available, required)
+        # update() signal yubormaydi — porsiya bahosini qo‘lda belgilash
+        stock_changed(ingredient_ids=demand.keys())
+
+
+def meal_demand(meal, portion_count):
+    demand = defaultdict(float)
+    for ingredient_id, quantity in meal_recipe(meal.id):
+        demand[ingredient_id] += quantity * portion_count
+    return demand
+
+
+def _parse_lines(lines):
+    # Har bir qatorni tekshirish: (index, meal_id, portion_count, xato)
+    parsed = []
+    for index, line in enumerate(lines):
+        if not isinstance(line, dict):
+            parsed.append((index, None, None, "Qator formati noto‘g‘ri"))
+            continue
+        try:
+            meal_id = int(line.get("meal_id"))
+        except (TypeError, ValueError, OverflowError):
+            # Xom qiymat qaytarilmaydi: inf/nan javobni JSON'ga aylantirib bo‘lmaydi
+            parsed.append((index, None, None, "Ovqat topilmadi"))
+            continue
+        try:
+            portion_count = int(line.get("portion_count", 1))
+        except (TypeError, ValueError, OverflowError):
+            portion_count = None
+        if portion_count is None or portion_count < 1:
+            parsed.append((index, meal_id, portion_count, "Porsiya soni noto‘g‘ri"))
+            continue
+        parsed.append((index, meal_id, portion_count, None))
+    return parsed
+
+
+# Bir nechta ovqatni bitta tranzaksiyada berish: talab jamlanadi, zaxira bir
+# marta tekshiriladi va har bir mahsulot uchun bitta shartli UPDATE bajariladi
+def serve_batch(lines, user):
+    parsed = _parse_lines(lines)
+    meal_ids = {meal_id for _, meal_id, _, error in parsed if error is None}
+    meals = Meal.objects.in_bulk(meal_ids)
+
+    # Retseptlar xotiradagi grafdan, zaxira bitta so‘rovda
+    graph = recipe_graph()
+    recipes = {meal_id: graph.get(meal_id, ()) for meal_id in meals}
+    ingredient_ids = {i for rows in recipes.values() for i, _ in rows}
+    stock = {
+        pk: (name, quantity)
+        for pk, name, quantity in Ingredient.objects.filter(
+            pk__in=ingredient_ids
+        ).values_list("pk", "name", "quantity")
+    }
+
+    results = []
+    accepted = []
+    demand = defaultdict(float)
+    for index, meal_id, portion_count, error in parsed:
+        result = {"index": index, "meal_id": meal_id, "portion_count": portion_count}
+        meal = meals.get(meal_id)
+        if error is None and meal is None:
+            error = "Ovqat topilmadi"
+        if error is None:
+            # Oldingi qabul qilingan qatorlar bilan birga zaxirani tekshirish
+            line_demand = {}
+            for ingredient_id, quantity in recipes[meal.id]:
+                name, available = stock[ingredient_id]
+                required = quantity * portion_count
+                if available - demand[ingredient_id] < required:
+                    error = str(
+                        InsufficientStock(
+                            name, available - demand[ingredient_id], required
+                        )
+                    )
+                    break
+                line_demand[ingredient_id] = required
+            else:
+                for ingredient_id, required in line_demand.items():
+                    demand[ingredient_id] += required
+                accepted.append((meal, portion_count))
+        if error is None:
+            result["status"] = "ok"
+        else:
+            result["status"] = "error"
+            result["error"] = error
+        results.append(result)
+
+    with transaction.atomic():
+        # Parallel so‘rov zaxirani kamaytirgan bo‘lsa butun partiya bekor qilinadi
+        deduct_stock(demand)
+        servings = Serving.objects.bulk_create(
+            [
+                Serving(meal=meal, user=user, portion_count=portion_count)
+                for meal, portion_count in accepted
+            ]
+        )
+        # bulk_create signal yubormaydi — kunlik yig‘indini qo‘lda yangilash
+        record_servings(servings)
+    return results
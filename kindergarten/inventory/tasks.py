@@ -1,95 +1,78 @@
-from celery import shared_task
-from django.db.models import Sum
-from django.utils import timezone
-from django.core.cache import cache
-from .models import Meal, Serving, Report, PortionEstimate
-from datetime import datetime
+from celery import chord, shared_task
+from .archive import archive_expired
+from .cache import STOCK, invalidate
+from .events import broadcast_portions
+from .materialized import refresh_monthly_portions
+from .portions import refresh_estimates
+from .rollups import rebuild_rollups
+from .reports import (
+    build_monthly_reports,
+    compute_report_rows,
+    merge_report_rows,
+    report_units,
+)
 
 
 @shared_task
-def generate_monthly_report():
-    today = timezone.now()
-    month_start = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    month_key = month_start.strftime("%Y-%m")
-
-    for meal in Meal.objects.all():
-        # Kesh kaliti
-        cache_key = f"report_{meal.id}_{month_key}"
-        cached_report = cache.get(cache_key)
-        if cached_report:
-            continue  # Keshdan foydalanish
-
-        # Oylik tayyorlangan porsiyalar
-        prepared_portions = (
-            Serving.objects.filter(
-                meal=meal,
-                date_served__gte=month_start,
-                date_served__lt=month_start + timezone.timedelta(days=31),
-            ).aggregate(total=Sum("portion_count"))["total"]
-            or 0
-        )
-
-        # Mumkin bo‘lgan porsiyalarni hisoblash
-        min_portions = float("inf")
-        for recipe in meal.recipes.all():
-            if recipe.quantity > 0:
-                portions = recipe.ingredient.quantity // recipe.quantity
-                min_portions = min(min_portions, portions)
-
-        # Farq foizini hisoblash
-        difference_percentage = 0
-        if possible_portions := min_portions:
-            difference_percentage = (
-                (possible_portions - prepared_portions) / possible_portions
-            ) * 100
-
-        # Hisobotni yangilash yoki yaratish
-        report, _ = Report.objects.update_or_create(
-            meal=meal,
-            month=month_start,
-            defaults={
-                "prepared_portions": prepared_portions,
-                "possible_portions": possible_portions,
-                "difference_percentage": difference_percentage,
-                "warning_triggered": difference_percentage > 15,
-            },
-        )
-
-        # Keshga saqlash (30 kun)
-        cache.set(
-            cache_key,
-            {
-                "prepared_portions": prepared_portions,
-                "possible_portions": possible_portions,
-                "difference_percentage": difference_percentage,
-                "warning_triggered": difference_percentage > 15,
-            },
-            timeout=2592000,
-        )
+def generate_monthly_report(month=None):
+    # month — "YYYY-MM" (o‘tgan oylarni qayta hisoblash uchun), standart: joriy oy
+    reports = build_monthly_reports(month)
+    return len(reports)
+
+
+@shared_task
+def build_report_chunk(month, meal_ids):
+    return compute_report_rows(month, meal_ids)
+
+
+@shared_task
+def merge_report_chunks(chunks):
+    return merge_report_rows([row for rows in chunks for row in rows])
+
+
+@shared_task
+def backfill_reports(since, until, chunk_size=100, force=False):
+    # Tarixiy hisobotlarni (oy x ovqatlar bo‘lagi) birliklarga bo‘lib,
+    # workerlar bo‘ylab parallel hisoblash va bitta upsert bilan birlashtirish
+    units = report_units(since, until, chunk_size, force)
+    if not units:
+        return 0
+    chord(build_report_chunk.s(month, meal_ids) for month, meal_ids in units)(
+        merge_report_chunks.s()
+    )
+    return len(units)
 
 
 @shared_task
 def update_portion_estimates():
-    for meal in Meal.objects.all():
-        # Kesh kaliti
-        cache_key = f"portion_estimate_{meal.id}"
-        cached_estimate = cache.get(cache_key)
-        if cached_estimate:
-            continue  # Keshdan foydalanish
-
-        min_portions = float("inf")
-        for recipe in meal.recipes.all():
-            if recipe.quantity > 0:
-                portions = recipe.ingredient.quantity // recipe.quantity
-                min_portions = min(min_portions, portions)
-
-        # PortionEstimate modelida yangilash yoki yaratish
-        estimate, _ = PortionEstimate.objects.update_or_create(
-            meal=meal,
-            defaults={
-                "possible_portions": int(min_portions),
-            },
-        )
-
-        # Keshga saqlash (1 kun)
-        cache.set(cache_key, {"possible_portions": int(min_portions)}, timeout=86400)
+    # Baholar zaxira o‘zgarganda inkremental yangilanadi (signals.py).
+    # Kunlik vazifa faqat moslikni tekshiradi va farq qilganlarini tuzatadi
+    drifted = refresh_estimates()
+    if drifted:
+        # Zaxira signal chetlab o‘zgartirilgan — keshlangan qiymatlar ham eskirgan
+        invalidate(STOCK)
+        broadcast_portions(drifted)
+    return len(drifted)
+
+
+@shared_task
+def rebuild_serving_rollups(since=None, until=None):
+    return rebuild_rollups(since, until)
+
+
+@shared_task
+def refresh_materialized_views():
+    # PostgreSQL: yopilgan oylar yig‘indisi (oy almashganda yangi oy qo‘shiladi).
+    # SQLite'da hech narsa qilmaydi
+    return refresh_monthly_portions()
+
+
+@shared_task(bind=True)
+def archive_servings(self, before=None, chunk_size=10000):
+    # Saqlash muddatidan eski oylar arxivga ko‘chiriladi. Jarayon holati
+    # (oy, arxivlangan/o‘chirilgan qatorlar) AsyncResult.info orqali ko‘rinadi
+    def progress(meta):
+        if self.request.id:
+            self.update_state(state="PROGRESS", meta=meta)
+
+    return archive_expired(before, chunk_size, progress)
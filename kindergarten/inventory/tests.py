@@ -1,16 +1,80 @@
-from django.test import TestCase
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from io import StringIO
+
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.conf import settings as django_settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+
+from django.db import OperationalError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from django.contrib.auth.models import User
 from django.utils import timezone
-from datetime import date
-from .models import Ingredient, Meal, Recipe, Serving, UserRole
+from datetime import date, datetime
+from kindergarten.sqlite3.base import DatabaseWrapper as SqliteProfileWrapper
+from . import cache as derived
+from . import materialized
+from .archive import (
+    archive_expired,
+    archive_month,
+    archive_parts,
+    archived_months,
+    read_archive,
+    write_part,
+)
+from .authentication import PrincipalCache, principals
+from .models import (
+    Ingredient,
+    Meal,
+    PortionEstimate,
+    Recipe,
+    Report,
+    Serving,
+    ServingDailyRollup,
+    UserRole,
+)
+from .portions import (
+    load_recipes,
+    load_stock,
+    portions_by_meal,
+    refresh_estimates,
+    simulate_portions,
+)
+from .reports import (
+    build_monthly_reports,
+    month_bounds,
+    prepared_by_meal,
+    report_units,
+)
+from .rollups import monthly_totals, rebuild_rollups
+from .signals import flush_stock_changes, stock_changed
+from .consumers import InventoryConsumer, PortionConsumer, SubscriptionConsumer
+from .deliveries import import_deliveries, read_items
+from .graph import recipe_graph
+from .maintenance import prune_servings, wipe_plan
+from .optimizer import optimize_menu
+from .planning import PlanError, evaluate_plan, max_portions, stock_snapshot
+from .stock import InsufficientStock, deduct_stock, meal_demand
 from rest_framework.authtoken.models import Token
 
 
 class BaseTestCase(APITestCase):
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         # Foydalanuvchilar yaratish
         self.admin_user = User.objects.create_user(username="admin", password="adminpass")
@@ -101,6 +165,1858 @@ class ServingViewSetTests(BaseTestCase):
         self.assertIn("yetarli emas", response.data["error"])
 
 
+class ServeMealsBatchTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.admin_token.key}")
+        self.rice = Ingredient.objects.create(
+            name="Rice", quantity=500, min_quantity=0, delivery_date=date.today()
+        )
+        self.plov = Meal.objects.create(name="Plov", type="lunch")
+        Recipe.objects.create(meal=self.plov, ingredient=self.rice, quantity=100)
+        Recipe.objects.create(meal=self.plov, ingredient=self.ingredient, quantity=50)
+
+    def test_serve_meals_totals_demand(self):
+        data = {
+            "lines": [
+                {"meal_id": self.meal.id, "portion_count": 2},
+                {"meal_id": self.plov.id, "portion_count": 3},
+            ]
+        }
+        response = self.client.post(
+            reverse("serving-serve-meals"), data, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["served"], 2)
+        self.ingredient.refresh_from_db()
+        self.rice.refresh_from_db()
+        self.assertEqual(self.ingredient.quantity, 650)  # 1000 - 200 - 150
+        self.assertEqual(self.rice.quantity, 200)  # 500 - 300
+        self.assertEqual(Serving.objects.count(), 3)
+
+    def test_serve_meals_reports_each_line(self):
+        data = {
+            "lines": [
+                {"meal_id": self.plov.id, "portion_count": 4},
+                {"meal_id": self.plov.id, "portion_count": 2},
+                {"meal_id": 9999, "portion_count": 1},
+                {"meal_id": self.meal.id, "portion_count": 0},
+            ]
+        }
+        response = self.client.post(
+            reverse("serving-serve-meals"), data, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        statuses = [result["status"] for result in response.data["results"]]
+        self.assertEqual(statuses, ["ok", "error", "error", "error"])
+        self.assertIn("yetarli emas", response.data["results"][1]["error"])
+        self.rice.refresh_from_db()
+        self.assertEqual(self.rice.quantity, 100)
+        self.assertEqual(Serving.objects.filter(meal=self.plov).count(), 1)
+
+    def test_serve_meals_nothing_served(self):
+        data = {"lines": [{"meal_id": self.plov.id, "portion_count": 10}]}
+        response = self.client.post(
+            reverse("serving-serve-meals"), data, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.rice.refresh_from_db()
+        self.assertEqual(self.rice.quantity, 500)
+
+    def test_non_object_body_is_rejected(self):
+        for url in ("serving-serve-meal", "serving-serve-meals"):
+            for body in ([{"meal_id": self.meal.id}], 5):
+                response = self.client.post(reverse(url), body, format="json")
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(
+            reverse("serving-serve-meal"),
+            {"meal_id": self.meal.id, "portion_count": "two"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Serving.objects.filter(meal=self.meal).count(), 1)
+
+    def test_out_of_range_counts_are_rejected(self):
+        # 1e309 JSON'da inf bo‘lib keladi: int() OverflowError beradi
+        for count in ("1e309", "0", "-3"):
+            body = f'{{"meal_id": {self.meal.id}, "portion_count": {count}}}'
+            response = self.client.post(
+                reverse("serving-serve-meal"), body, content_type="application/json"
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        body = (
+            '{"lines": [{"meal_id": 1e309}, '
+            f'{{"meal_id": {self.meal.id}, "portion_count": 1e309}}]}}'
+        )
+        response = self.client.post(
+            reverse("serving-serve-meals"), body, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        statuses = [result["status"] for result in response.data["results"]]
+        self.assertEqual(statuses, ["error", "error"])
+        self.ingredient.refresh_from_db()
+        self.assertEqual(self.ingredient.quantity, 1000)
+
+    def test_serve_meals_requires_chef_or_admin(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.manager_token.key}")
+        data = {"lines": [{"meal_id": self.meal.id, "portion_count": 1}]}
+        response = self.client.post(
+            reverse("serving-serve-meals"), data, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class DeductStockTests(BaseTestCase):
+    def test_partial_deduction_rolls_back(self):
+        rice = Ingredient.objects.create(
+            name="Rice", quantity=10, min_quantity=0, delivery_date=date.today()
+        )
+        with self.assertRaises(InsufficientStock):
+            deduct_stock({self.ingredient.id: 100, rice.id: 50})
+        self.ingredient.refresh_from_db()
+        self.assertEqual(self.ingredient.quantity, 1000)
+
+    def test_serve_meal_rolls_back_on_shortage(self):
+        rice = Ingredient.objects.create(
+            name="Rice", quantity=10, min_quantity=0, delivery_date=date.today()
+        )
+        Recipe.objects.create(meal=self.meal, ingredient=rice, quantity=50)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.admin_token.key}")
+        data = {"meal_id": self.meal.id, "portion_count": 1}
+        response = self.client.post(reverse("serving-serve-meal"), data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.ingredient.refresh_from_db()
+        self.assertEqual(self.ingredient.quantity, 1000)
+
+
+class DeductStockConcurrencyTests(TransactionTestCase):
+    THREADS = 8
+    ATTEMPTS = 25
+
+    def test_parallel_deductions_never_oversell(self):
+        flour = Ingredient.objects.create(
+            name="Flour", quantity=100, min_quantity=0, delivery_date=date.today()
+        )
+        eggs = Ingredient.objects.create(
+            name="Eggs", quantity=300, min_quantity=0, delivery_date=date.today()
+        )
+        demand = {flour.id: 1, eggs.id: 3}
+        succeeded = []
+        start = threading.Barrier(self.THREADS)
+
+        def worker():
+            done = 0
+            try:
+                start.wait()
+                for _ in range(self.ATTEMPTS):
+                    while True:
+                        try:
+                            deduct_stock(demand)
+                            done += 1
+                        except InsufficientStock:
+                            pass
+                        except OperationalError:
+                            # Test bazasi (shared-cache SQLite) qulflangan — qayta urinish
+                            time.sleep(0.001)
+                            continue
+                        break
+            finally:
+                succeeded.append(done)
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        flour.refresh_from_db()
+        eggs.refresh_from_db()
+        self.assertEqual(sum(succeeded), 100)
+        self.assertEqual(flour.quantity, 0)
+        self.assertEqual(eggs.quantity, 0)
+
+
+class SqliteProfileTests(TestCase):
+    def setUp(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("SQLite profili faqat SQLite bazasi uchun")
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "profile.sqlite3")
+
+    # Profil standart holatda o‘chiq (SQLITE_PROFILE=production yoqadi) —
+    # alohida fayl bazaga profil backendi orqali yangi ulanishlar
+    def file_connection(self, **options):
+        settings_dict = {
+            **connection.settings_dict,
+            "ENGINE": "kindergarten.sqlite3",
+            "NAME": self.path,
+            "PRAGMAS": {"busy_timeout": 50},
+            **options,
+        }
+        wrapper = SqliteProfileWrapper(settings_dict, alias="profile")
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_connection_pragmas(self):
+        wrapper = self.file_connection()
+        self.assertEqual(self.pragma(wrapper, "synchronous"), 1)  # NORMAL
+        self.assertEqual(self.pragma(wrapper, "cache_size"), -64 * 1024)
+        self.assertEqual(self.pragma(wrapper, "temp_store"), 2)  # MEMORY
+        self.assertEqual(self.pragma(wrapper, "busy_timeout"), 50)
+
+    def test_deferred_transaction_mode(self):
+        first = self.file_connection(TRANSACTION_MODE="DEFERRED")
+        second = self.file_connection(TRANSACTION_MODE="DEFERRED")
+        # Faqat o‘qiydigan tranzaksiyalar bir-birini kutmaydi
+        first._start_transaction_under_autocommit()
+        second._start_transaction_under_autocommit()
+        for wrapper in (first, second):
+            with wrapper.cursor() as cursor:
+                cursor.execute("ROLLBACK")
+
+    def test_wal_and_immediate_write_transactions(self):
+        writer, other = self.file_connection(), self.file_connection()
+        self.assertEqual(self.pragma(writer, "journal_mode"), "wal")
+        self.assertEqual(self.pragma(writer, "busy_timeout"), 50)
+        with writer.cursor() as cursor:
+            cursor.execute("CREATE TABLE item (value INTEGER)")
+            cursor.execute("INSERT INTO item VALUES (1)")
+
+        # atomic() ochgan tranzaksiya hali hech narsa yozmasdan qulfni oladi
+        writer._start_transaction_under_autocommit()
+        with self.assertRaisesMessage(OperationalError, "locked"):
+            other._start_transaction_under_autocommit()
+        # WAL: yozuvchi ochiq bo‘lsa ham o‘quvchi kutmaydi
+        with other.cursor() as cursor:
+            cursor.execute("SELECT value FROM item")
+            self.assertEqual(cursor.fetchall(), [(1,)])
+        with writer.cursor() as cursor:
+            cursor.execute("ROLLBACK")
+
+
+def loop_portions(meal):
+    # Eski hisoblash usuli — taqqoslash uchun
+    min_portions = float("inf")
+    for recipe in meal.recipes.all():
+        if recipe.quantity > 0:
+            portions = recipe.ingredient.quantity // recipe.quantity
+            min_portions = min(min_portions, portions)
+    return min_portions
+
+
+class PortionEngineTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        # Float bo‘lishda floor(a / b) va a // b farq qiladigan holatlar
+        quantities = [(1.0, 0.1), (0.3, 0.1), (7.5, 2.5), (0.0, 3.0), (1e6, 3.3)]
+        for index, (stock, per_portion) in enumerate(quantities):
+            ingredient = Ingredient.objects.create(
+                name=f"Item{index}",
+                quantity=stock,
+                min_quantity=0,
+                delivery_date=date.today(),
+            )
+            meal = Meal.objects.create(name=f"Meal{index}")
+            Recipe.objects.create(meal=meal, ingredient=ingredient, quantity=per_portion)
+            Recipe.objects.create(meal=meal, ingredient=self.ingredient, quantity=1)
+        self.empty_meal = Meal.objects.create(name="Water")
+        zero_meal = Meal.objects.create(name="Zero")
+        Recipe.objects.create(meal=zero_meal, ingredient=self.ingredient, quantity=0)
+
+    def test_matches_python_loop(self):
+        portions = portions_by_meal()
+        for meal in Meal.objects.all():
+            self.assertEqual(portions[meal.id], loop_portions(meal), meal.name)
+        self.assertEqual(portions[self.empty_meal.id], float("inf"))
+
+    def test_single_query(self):
+        with self.assertNumQueries(1):
+            portions_by_meal()
+
+    def test_simulation_matches_database(self):
+        stock = load_stock()
+        recipes = load_recipes()
+        meal_ids = Meal.objects.values_list("pk", flat=True)
+        self.assertEqual(
+            simulate_portions(stock, recipes, meal_ids), portions_by_meal()
+        )
+        stock[self.ingredient.id] = 0
+        self.assertEqual(
+            simulate_portions(stock, recipes, [self.meal.id]), {self.meal.id: 0}
+        )
+
+    def test_portion_estimate_endpoint(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.user_token.key}")
+        response = self.client.get(
+            reverse("serving-portion-estimate"), {"meal_id": self.meal.id}
+        )
+        self.assertEqual(response.data["possible_portions"], 10)
+        response = self.client.get(
+            reverse("serving-portion-estimate"), {"meal_id": self.empty_meal.id}
+        )
+        self.assertEqual(response.data["possible_portions"], 0)
+
+    def test_tasks_use_engine(self):
+        from .tasks import generate_monthly_report, update_portion_estimates
+
+        update_portion_estimates()
+        generate_monthly_report()
+        estimate = PortionEstimate.objects.get(meal=self.meal)
+        self.assertEqual(estimate.possible_portions, 10)
+        self.assertEqual(Report.objects.get(meal=self.meal).possible_portions, 10)
+
+
+class IncrementalEstimateTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.bread = Ingredient.objects.create(
+            name="Bread", quantity=100, min_quantity=0, delivery_date=date.today()
+        )
+        self.sandwich = Meal.objects.create(name="Sandwich")
+        Recipe.objects.create(meal=self.sandwich, ingredient=self.bread, quantity=10)
+        # setUp'dagi o‘zgarishlar commit qilinmaydi — navbatni qo‘lda bo‘shatish
+        flush_stock_changes()
+
+    def estimate(self, meal):
+        return PortionEstimate.objects.get(meal=meal).possible_portions
+
+    def test_serve_meal_refreshes_affected_meals(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.admin_token.key}")
+        data = {"meal_id": self.meal.id, "portion_count": 2}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("serving-serve-meal"), data)
+        self.assertEqual(self.estimate(self.meal), 8)
+        self.assertEqual(self.estimate(self.sandwich), 10)
+
+    def test_ingredient_update_refreshes_only_users(self):
+        before = PortionEstimate.objects.get(meal=self.meal).updated_at
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.manager_token.key}")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                reverse("ingredient-detail", args=[self.bread.id]), {"quantity": 55}
+            )
+        self.assertEqual(self.estimate(self.sandwich), 5)
+        self.assertEqual(PortionEstimate.objects.get(meal=self.meal).updated_at, before)
+
+    def test_changes_coalesced_per_transaction(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                for quantity in (90, 80, 70):
+                    self.bread.quantity = quantity
+                    self.bread.save()
+            # Teskari indeks, eski baholar, agregat, upsert, WebSocket holati va
+            # o‘zgargan ovqatlar nomlari. PostgreSQL'da eski baholar, agregat
+            # va upsert — bitta so‘rov
+            queries = 4 if connection.vendor == "postgresql" else 6
+            with self.assertNumQueries(queries):
+                flush_stock_changes()
+        self.assertEqual(self.estimate(self.sandwich), 7)
+
+    def test_refresh_writes_only_changed_estimates(self):
+        self.assertEqual(refresh_estimates(), {})
+        Ingredient.objects.filter(pk=self.bread.pk).update(quantity=20)
+        self.assertEqual(refresh_estimates(), {self.sandwich.id: 2})
+
+    def test_daily_sweep_fixes_drift(self):
+        from .tasks import update_portion_estimates
+
+        Ingredient.objects.filter(pk=self.bread.pk).update(quantity=30)
+        self.assertEqual(update_portion_estimates(), 1)
+        self.assertEqual(self.estimate(self.sandwich), 3)
+        self.assertEqual(update_portion_estimates(), 0)
+
+
+class DerivedCacheTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        flush_stock_changes()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def test_read_through_computes_once(self):
+        self.assertEqual(derived.get_or_compute(derived.STOCK, ("x",), self.compute), 1)
+        self.assertEqual(derived.get_or_compute(derived.STOCK, ("x",), self.compute), 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_invalidate_bumps_only_its_namespace(self):
+        stock_key = derived.make_key(derived.STOCK, "x")
+        reports_key = derived.make_key(derived.REPORTS, "x")
+        derived.invalidate(derived.STOCK)
+        self.assertNotEqual(derived.make_key(derived.STOCK, "x"), stock_key)
+        self.assertEqual(derived.make_key(derived.REPORTS, "x"), reports_key)
+
+    def test_redis_outage_falls_back_to_compute(self):
+        # Ishlab chiqarish sozlamasi, lekin hech narsa tinglamaydigan port
+        down = {**django_settings.REDIS_CACHE, "LOCATION": "redis://127.0.0.1:1/1"}
+        with override_settings(CACHES={"default": down}):
+            for expected in (1, 2):
+                value = derived.get_or_compute(derived.STOCK, ("x",), self.compute)
+                self.assertEqual(value, expected)
+            derived.invalidate(derived.STOCK)
+            self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.user_token.key}")
+            response = self.client.get(reverse("ingredient-low-stock"))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_waits_for_lock_holder(self):
+        key = derived.make_key(derived.STOCK, "x")
+        cache.add(f"{key}:lock", 1)
+        threading.Timer(0.1, cache.set, args=(key, "ready")).start()
+        value = derived.get_or_compute(derived.STOCK, ("x",), self.compute)
+        self.assertEqual(value, "ready")
+        self.assertEqual(self.calls, 0)
+
+    def test_computes_without_caching_when_lock_times_out(self):
+        key = derived.make_key(derived.STOCK, "x")
+        cache.add(f"{key}:lock", 1)
+        threading.Timer(0.1, cache.delete, args=(f"{key}:lock",)).start()
+        self.assertEqual(derived.get_or_compute(derived.STOCK, ("x",), self.compute), 1)
+        self.assertIsNone(cache.get(key))
+
+    def test_serve_meal_invalidates_estimate_and_analytics(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.admin_token.key}")
+        estimate_url = reverse("serving-portion-estimate")
+        params = {"meal_id": self.meal.id}
+        self.assertEqual(
+            self.client.get(estimate_url, params).data["possible_portions"], 10
+        )
+        by_user = self.client.get(reverse("serving-by-user")).data
+        self.assertEqual(by_user, [{"user__username": "user", "total_portions": 1}])
+
+        data = {"meal_id": self.meal.id, "portion_count": 2}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("serving-serve-meal"), data)
+
+        self.assertEqual(
+            self.client.get(estimate_url, params).data["possible_portions"], 8
+        )
+        by_user = self.client.get(reverse("serving-by-user")).data
+        self.assertEqual(
+            [row["total_portions"] for row in by_user], [2, 1]  # admin, user
+        )
+
+    def test_ingredient_write_invalidates_low_stock(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.manager_token.key}")
+        self.assertEqual(self.client.get(reverse("ingredient-low-stock")).data, [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                reverse("ingredient-detail", args=[self.ingredient.id]),
+                {"quantity": 150},
+            )
+        low_stock = self.client.get(reverse("ingredient-low-stock")).data
+        self.assertEqual([item["name"] for item in low_stock], ["Tomato"])
+
+    def test_recipe_write_invalidates_estimate(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.manager_token.key}")
+        estimate_url = reverse("serving-portion-estimate")
+        params = {"meal_id": self.meal.id}
+        self.client.get(estimate_url, params)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                reverse("recipe-detail", args=[self.recipe.id]), {"quantity": 250}
+            )
+        self.assertEqual(
+            self.client.get(estimate_url, params).data["possible_portions"], 4
+        )
+
+
+class AsyncApiTests(BaseTestCase):
+    paths = [
+        ("ingredient-list", "async-ingredient-list", {}),
+        ("ingredient-low-stock", "async-ingredient-low-stock", {}),
+        ("report-warnings", "async-report-warnings", {}),
+        ("serving-portion-estimate", "async-serving-portion-estimate", None),
+        ("serving-by-user", "async-serving-by-user", {"since": "2025-01-01"}),
+        ("serving-by-date", "async-serving-by-date", {}),
+        ("meal-by-type", "async-meal-by-type", {}),
+    ]
+
+    def setUp(self):
+        super().setUp()
+        rebuild_rollups()
+        Ingredient.objects.create(
+            name="Salt", quantity=5, min_quantity=10, delivery_date=date.today()
+        )
+        for month in (4, 5, 6):
+            Report.objects.create(
+                meal=self.meal, month=date(2025, month, 1), warning_triggered=True
+            )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.user_token.key}")
+
+    def test_matches_sync_endpoints(self):
+        for sync_name, async_name, params in self.paths:
+            params = {"meal_id": self.meal.id} if params is None else params
+            # Kesh tozalanadi: ikkala yo‘l ham natijani o‘zi hisoblaydi
+            response = self.client.get(reverse(async_name), params)
+            cache.clear()
+            expected = self.client.get(reverse(sync_name), params)
+            cache.clear()
+            self.assertEqual(response.status_code, 200, async_name)
+            self.assertEqual(response.json(), json.loads(expected.content), async_name)
+        expected = json.loads(self.client.get(reverse("report-list")).content)
+        response = self.client.get(reverse("async-report-list")).json()
+        self.assertEqual(response["results"], expected["results"])
+
+    def test_report_keyset_pagination(self):
+        url = reverse("async-report-list")
+        page = self.client.get(url, {"page_size": 2}).json()
+        months = [row["month"] for row in page["results"]]
+        self.assertEqual(months, ["2025-06-01", "2025-05-01"])
+        page = self.client.get(page["next"]).json()
+        self.assertEqual([row["month"] for row in page["results"]], ["2025-04-01"])
+        self.assertIsNone(page["next"])
+        response = self.client.get(url, {"cursor": "bad"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_authentication_and_errors(self):
+        url = reverse("async-ingredient-low-stock")
+        self.assertEqual(self.client.post(url).status_code, 405)
+        self.client.credentials(HTTP_AUTHORIZATION="Token wrong")
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.credentials()
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_login(self.regular_user)
+        self.assertEqual(self.client.get(url).json()[0]["name"], "Salt")
+        response = self.client.get(reverse("async-serving-by-date"), {"since": "May"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse("async-serving-portion-estimate"))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(SERVING_ARCHIVE_ROOT=os.path.join(tempfile.gettempdir(), "none"))
+class CachedTokenAuthTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        principals.clear()
+        self.url = reverse("serving-archive")  # faqat admin/menejer
+
+    def test_single_joined_query_then_cached(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.manager_token.key}")
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Jarayon LRU'si: token ham, rol ham so‘rovsiz
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+        # Umumiy kesh: boshqa jarayon (bo‘sh LRU) ham bazaga bormaydi
+        principals.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_role_change_invalidates(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.manager_token.key}")
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            role = UserRole.objects.get(user=self.manager_user)
+            role.role = "chef"
+            role.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_logout_revokes_token_immediately(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.manager_token.key}")
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        # Commit kutilmaydi: bekor qilish belgisi darhol qo‘yiladi
+        self.client.post(reverse("logout"))
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(principals.stats()["revoked"], 1)
+
+    def test_rolled_back_revocation_keeps_token_valid(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.manager_token.key}")
+        self.client.get(self.url)
+        with transaction.atomic():
+            Token.objects.get(pk=self.manager_token.pk).delete()
+            transaction.set_rollback(True)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_shared_tier_is_optional(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.manager_token.key}")
+        with override_settings(AUTH_CACHE_SHARED=False):
+            self.client.get(self.url)
+            principals.clear()
+            with self.assertNumQueries(1):
+                self.client.get(self.url)
+
+    def test_stats_endpoint(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.manager_token.key}")
+        self.client.get(self.url)
+        stats = self.client.get(reverse("auth-cache")).data
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["shared_misses"], 1)
+        self.assertEqual(stats["size"], 1)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.user_token.key}")
+        response = self.client.get(reverse("auth-cache"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_last_login_does_not_invalidate(self):
+        version = derived.namespace_version(derived.AUTH)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("login"), {"username": "manager", "password": "managerpass"}
+            )
+        self.assertEqual(derived.namespace_version(derived.AUTH), version)
+
+    def test_lru_is_bounded_and_expires(self):
+        lru = PrincipalCache(maxsize=2, ttl=60)
+        for key in "abc":
+            lru.set(key, 1, key)
+        self.assertIsNone(lru.get("a", 1))
+        self.assertEqual(lru.get("c", 1), "c")
+        self.assertIsNone(lru.get("c", 2))
+        lru.ttl = -1
+        lru.set("d", 1, "d")
+        self.assertIsNone(lru.get("d", 1))
+
+
+class RecipeGraphTests(TransactionTestCase):
+    # Commit'lar haqiqiy bo‘lishi uchun TransactionTestCase
+    def setUp(self):
+        cache.clear()
+        self.flour = Ingredient.objects.create(
+            name="Flour", quantity=1000, min_quantity=0, delivery_date=date.today()
+        )
+        self.milk = Ingredient.objects.create(
+            name="Milk", quantity=1000, min_quantity=0, delivery_date=date.today()
+        )
+        self.pancake = Meal.objects.create(name="Pancake")
+        self.recipe = Recipe.objects.create(
+            meal=self.pancake, ingredient=self.flour, quantity=50
+        )
+
+    def test_built_once_per_version(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(recipe_graph()[self.pancake.id], ((self.flour.id, 50),))
+        with self.assertNumQueries(0):
+            recipe_graph()
+            self.assertEqual(meal_demand(self.pancake, 2), {self.flour.id: 100})
+
+    def test_recipe_write_rebuilds_graph(self):
+        recipe_graph()
+        Recipe.objects.create(meal=self.pancake, ingredient=self.milk, quantity=20)
+        self.assertEqual(
+            set(recipe_graph()[self.pancake.id]),
+            {(self.flour.id, 50), (self.milk.id, 20)},
+        )
+
+    def test_version_bump_from_other_worker(self):
+        recipe_graph()
+        # Boshqa jarayon yozgan va versiyani oshirgan holat
+        Recipe.objects.filter(pk=self.recipe.pk).update(quantity=80)
+        self.assertEqual(recipe_graph()[self.pancake.id], ((self.flour.id, 50),))
+        derived.invalidate(derived.RECIPES)
+        self.assertEqual(recipe_graph()[self.pancake.id], ((self.flour.id, 80),))
+
+    def test_rebuilt_from_database_during_cache_outage(self):
+        down = {**django_settings.REDIS_CACHE, "LOCATION": "redis://127.0.0.1:1/1"}
+        with override_settings(CACHES={"default": down}):
+            self.assertEqual(recipe_graph()[self.pancake.id], ((self.flour.id, 50),))
+            Recipe.objects.create(meal=self.pancake, ingredient=self.milk, quantity=20)
+            self.assertEqual(len(recipe_graph()[self.pancake.id]), 2)
+            # Umumiy versiya o‘qilmaydi — har chaqiruvda yangi (vaqtdan) versiya,
+            # shuning uchun boshqa jarayon yozuvi ham bazadan qayta o‘qiladi
+            Recipe.objects.filter(pk=self.recipe.pk).update(quantity=80)
+            time.sleep(0.002)
+            self.assertIn((self.flour.id, 80), recipe_graph()[self.pancake.id])
+
+    def test_rolled_back_changes_not_published(self):
+        recipe_graph()
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                Recipe.objects.create(
+                    meal=self.pancake, ingredient=self.milk, quantity=20
+                )
+                self.assertEqual(len(recipe_graph()[self.pancake.id]), 2)
+                raise RuntimeError
+        self.assertEqual(recipe_graph()[self.pancake.id], ((self.flour.id, 50),))
+
+
+class PlanningTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.rice = Ingredient.objects.create(
+            name="Rice", quantity=950.5, min_quantity=0, delivery_date=date.today()
+        )
+        self.pilaf = Meal.objects.create(name="Pilaf")
+        Recipe.objects.create(meal=self.pilaf, ingredient=self.rice, quantity=150)
+        Recipe.objects.create(meal=self.pilaf, ingredient=self.ingredient, quantity=30)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.manager_token.key}")
+
+    def test_max_portions_matches_simulation(self):
+        snapshot = stock_snapshot()
+        expected = simulate_portions(load_stock(), load_recipes())
+        computed = dict(zip(snapshot["meal_ids"].tolist(), max_portions(snapshot)))
+        self.assertEqual(computed, expected)
+
+    def test_depletion_day_and_feasible_days(self):
+        day = [
+            {"meal_id": self.meal.id, "portions": 4},
+            {"meal_id": self.pilaf.id, "portions": 2},
+        ]
+        result = evaluate_plan([day, day, day], start=date(2025, 6, 2))
+        # Tomato: 460, 920, 1380 > 1000 (uchinchi kun); Rice: 900 <= 950.5
+        self.assertEqual(
+            result["depletion"],
+            [
+                {
+                    "ingredient_id": self.ingredient.id,
+                    "day": 2,
+                    "shortfall": 380.0,
+                    "date": "2025-06-04",
+                }
+            ],
+        )
+        self.assertEqual(result["feasible_days"], 2)
+        self.assertEqual(result["max_portions"], {self.meal.id: 10, self.pilaf.id: 6})
+        self.assertAlmostEqual(result["plan_scale"], 1000 / 1380)
+
+    def test_plan_endpoint(self):
+        data = {"days": [[{"meal_id": self.pilaf.id, "portions": 1}]] * 7}
+        response = self.client.post(reverse("meal-plan"), data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["feasible_days"], 6)
+        self.assertEqual(response.data["depletion"][0]["ingredient_id"], self.rice.id)
+
+    def test_plan_endpoint_rejects_unknown_meal(self):
+        data = {"days": [[{"meal_id": 999, "portions": 1}]]}
+        response = self.client.post(reverse("meal-plan"), data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("Ovqat topilmadi", response.data["error"])
+
+    def test_plan_endpoint_rejects_non_finite_portions(self):
+        for portions in ("inf", "nan", "-inf", -1):
+            data = {"days": [[{"meal_id": self.pilaf.id, "portions": portions}]]}
+            response = self.client.post(reverse("meal-plan"), data, format="json")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("porsiya soni", response.data["error"])
+
+    def test_plan_endpoint_rejects_malformed_body(self):
+        url = reverse("meal-plan")
+        body = '{"days": [[{"meal_id": 1e309, "portions": 1}]]}'
+        response = self.client.post(url, body, content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(url, [{"days": []}], format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_plan_endpoint_requires_manager(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.user_token.key}")
+        data = {"days": [[{"meal_id": self.pilaf.id, "portions": 1}]]}
+        response = self.client.post(reverse("meal-plan"), data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class MenuOptimizerTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.bread = Ingredient.objects.create(
+            name="Bread", quantity=600, min_quantity=0, delivery_date=date.today()
+        )
+        self.soup = Meal.objects.create(name="Soup")
+        Recipe.objects.create(meal=self.soup, ingredient=self.ingredient, quantity=50)
+        Recipe.objects.create(meal=self.soup, ingredient=self.bread, quantity=100)
+        self.sandwich = Meal.objects.create(name="Sandwich")
+        Recipe.objects.create(meal=self.sandwich, ingredient=self.bread, quantity=200)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.manager_token.key}")
+
+    def assertFits(self, portions):
+        used = {self.ingredient.id: 0, self.bread.id: 0}
+        for meal_id, rows in recipe_graph().items():
+            for ingredient_id, quantity in rows:
+                used[ingredient_id] += quantity * portions.get(meal_id, 0)
+        self.assertLessEqual(used[self.ingredient.id], 1000)
+        self.assertLessEqual(used[self.bread.id], 600)
+
+    def test_maximizes_total_portions_over_shared_stock(self):
+        # Alohida maksimumlar (10 + 6 + 3) birga erishib bo‘lmaydi
+        result = optimize_menu(method="greedy")
+        self.assertEqual(result["total_portions"], 13)
+        self.assertFits(result["portions"])
+        self.assertEqual(
+            set(result["bottlenecks"]), {self.ingredient.id, self.bread.id}
+        )
+
+    def test_respects_mix_constraints_and_weights(self):
+        meals = [
+            {"meal_id": self.meal.id, "max": 5},
+            {"meal_id": self.soup.id, "min": 2},
+            {"meal_id": self.sandwich.id, "weight": 10},
+        ]
+        result = optimize_menu(meals, method="greedy")
+        self.assertEqual(
+            result["portions"],
+            {self.meal.id: 5, self.soup.id: 2, self.sandwich.id: 2},
+        )
+        self.assertEqual(result["objective"], 27.0)
+
+    def test_milp_beats_greedy_on_shared_ingredient(self):
+        flour = Ingredient.objects.create(
+            name="Flour", quantity=160, min_quantity=0, delivery_date=date.today()
+        )
+        oil = Ingredient.objects.create(
+            name="Oil", quantity=100, min_quantity=0, delivery_date=date.today()
+        )
+        pancake = Meal.objects.create(name="Pancake")
+        Recipe.objects.create(meal=pancake, ingredient=flour, quantity=30)
+        pie = Meal.objects.create(name="Pie")
+        Recipe.objects.create(meal=pie, ingredient=flour, quantity=20)
+        Recipe.objects.create(meal=pie, ingredient=oil, quantity=20)
+        meals = [{"meal_id": pancake.id}, {"meal_id": pie.id}]
+
+        greedy = optimize_menu(meals, method="greedy")
+        self.assertEqual(greedy["total_portions"], 6)
+        # Optimum: 2 * 30 + 5 * 20 = 160 un, 5 * 20 = 100 yog‘
+        result = optimize_menu(meals, method="milp")
+        self.assertEqual(result["method"], "milp")
+        self.assertEqual(result["portions"], {pancake.id: 2, pie.id: 5})
+        self.assertEqual(set(result["bottlenecks"]), {flour.id, oil.id})
+        self.assertEqual(optimize_menu(meals)["method"], "milp")
+
+    def test_milp_respects_bounds_and_stock(self):
+        meals = [
+            {"meal_id": self.meal.id, "max": 5},
+            {"meal_id": self.soup.id, "min": 2},
+            {"meal_id": self.sandwich.id, "weight": 10},
+        ]
+        result = optimize_menu(meals, method="milp")
+        self.assertEqual(result["objective"], 27.0)
+        self.assertEqual(result["portions"][self.meal.id], 5)
+        self.assertEqual(result["portions"][self.soup.id], 2)
+        self.assertFits(result["portions"])
+        self.assertEqual(optimize_menu(method="milp")["total_portions"], 13)
+
+    def test_rejects_infeasible_minimum(self):
+        with self.assertRaises(PlanError):
+            optimize_menu([{"meal_id": self.sandwich.id, "min": 4}])
+        with self.assertRaises(PlanError):
+            optimize_menu([{"meal_id": self.sandwich.id, "min": 4}], method="milp")
+
+    def test_rejects_non_finite_weight(self):
+        for weight in ("nan", "inf", -1):
+            with self.assertRaises(PlanError):
+                optimize_menu([{"meal_id": self.soup.id, "weight": weight}])
+
+    def test_meal_without_recipe_needs_max(self):
+        tea = Meal.objects.create(name="Tea")
+        with self.assertRaises(PlanError):
+            optimize_menu([{"meal_id": tea.id}])
+        result = optimize_menu([{"meal_id": tea.id, "max": 30}])
+        self.assertEqual(result["portions"], {tea.id: 30})
+
+    def test_optimize_endpoint(self):
+        response = self.client.post(
+            reverse("meal-optimize"), {"method": "greedy"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["total_portions"], 13)
+        response = self.client.post(
+            reverse("meal-optimize"), {"method": "milp"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["method"], "milp")
+        self.assertEqual(response.data["total_portions"], 13)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.user_token.key}")
+        response = self.client.post(reverse("meal-optimize"), {}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_optimize_endpoint_rejects_malformed_body(self):
+        url = reverse("meal-optimize")
+        meal_id = self.sandwich.id
+        for item in (
+            '{"meal_id": 1e309}',
+            f'{{"meal_id": {meal_id}, "min": 1e309}}',
+            f'{{"meal_id": {meal_id}, "max": 1e309}}',
+        ):
+            body = f'{{"meals": [{item}]}}'
+            response = self.client.post(url, body, content_type="application/json")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(url, [{"method": "greedy"}], format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class DeliveryImportTests(BaseTestCase):
+    def test_adds_quantities_and_creates_new_ingredients(self):
+        rows = [
+            {"name": "Tomato", "quantity": 500, "delivery_date": "2030-01-05"},
+            {"name": "Onion", "quantity": 300, "min_quantity": 50},
+            {"name": "Tomato", "quantity": "100.5", "delivery_date": "2030-01-02"},
+        ]
+        summary = import_deliveries(read_items(rows))
+        self.assertEqual(
+            {key: summary[key] for key in ("rows", "applied", "created", "failed")},
+            {"rows": 3, "applied": 3, "created": 1, "failed": 0},
+        )
+        self.ingredient.refresh_from_db()
+        self.assertEqual(self.ingredient.quantity, 1600.5)
+        self.assertEqual(self.ingredient.delivery_date, date(2030, 1, 5))
+        onion = Ingredient.objects.get(name="Onion")
+        self.assertEqual((onion.quantity, onion.min_quantity), (300, 50))
+
+    def test_bad_rows_reported_without_aborting(self):
+        rows = [
+            {"name": "", "quantity": 1},
+            {"name": "Tomato", "quantity": -5},
+            {"name": "Tomato", "quantity": 10, "delivery_date": "05.01.2030"},
+            "Tomato",
+            {"name": "Tomato", "quantity": 10},
+        ]
+        summary = import_deliveries(read_items(rows))
+        self.assertEqual(summary["applied"], 1)
+        self.assertEqual([error["line"] for error in summary["errors"]], [1, 2, 3, 4])
+        self.ingredient.refresh_from_db()
+        self.assertEqual(self.ingredient.quantity, 1010)
+
+    def test_one_recompute_per_batch(self):
+        rows = [{"name": "Tomato", "quantity": 1}] * 5
+        with self.captureOnCommitCallbacks() as callbacks:
+            import_deliveries(read_items(rows), batch_size=2)
+        flushes = [cb for cb in callbacks if cb is flush_stock_changes]
+        self.assertEqual(len(flushes), 3)
+        flush_stock_changes()
+        self.assertEqual(
+            PortionEstimate.objects.get(meal=self.meal).possible_portions, 10
+        )
+
+    def test_deliveries_endpoint_json_and_csv(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.manager_token.key}")
+        url = reverse("ingredient-deliveries")
+        response = self.client.post(
+            url, {"rows": [{"name": "Tomato", "quantity": 200}]}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        upload = SimpleUploadedFile(
+            "delivery.csv",
+            b"name,quantity,delivery_date\nTomato,300,2030-02-01\nSalt,abc,\n",
+        )
+        response = self.client.post(url, {"file": upload}, format="multipart")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["failed"], 1)
+        self.assertEqual(response.data["errors"][0]["line"], 3)
+        self.ingredient.refresh_from_db()
+        self.assertEqual(self.ingredient.quantity, 1500)
+
+    def test_non_finite_min_quantity_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.manager_token.key}")
+        url = reverse("ingredient-deliveries")
+        upload = SimpleUploadedFile(
+            "delivery.csv",
+            b"name,quantity,min_quantity\nSalt,10,inf\nPepper,10,nan\n",
+        )
+        response = self.client.post(url, {"file": upload}, format="multipart")
+        self.assertEqual(response.data["failed"], 2)
+        body = '{"rows": [{"name": "Salt", "quantity": 10, "min_quantity": 1e309}]}'
+        response = self.client.post(url, body, content_type="application/json")
+        self.assertEqual(response.data["failed"], 1)
+        self.assertEqual(Ingredient.objects.count(), 1)
+        response = self.client.get(reverse("ingredient-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_read_error_returns_partial_summary(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.manager_token.key}")
+        upload = SimpleUploadedFile(
+            "delivery.csv",
+            b"name,quantity\nTomato,100\nTomato,200\nTomato,\xff\xfe\nTomato,400\n",
+        )
+        response = self.client.post(
+            reverse("ingredient-deliveries"), {"file": upload}, format="multipart"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        # Birinchi ikki qator qo‘llangan: qayta yuborish 4-qatordan
+        self.assertEqual(response.data["applied"], 2)
+        self.assertEqual(response.data["stopped_at"]["line"], 4)
+        self.ingredient.refresh_from_db()
+        self.assertEqual(self.ingredient.quantity, 1300)
+
+    def test_deliveries_endpoint_requires_manager(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.user_token.key}")
+        response = self.client.post(
+            reverse("ingredient-deliveries"),
+            [{"name": "Tomato", "quantity": 200}],
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_import_deliveries_command(self):
+        with tempfile.NamedTemporaryFile(
+            "w", suffix=".ndjson", delete=False, encoding="utf-8"
+        ) as handle:
+            handle.write('{"name": "Tomato", "quantity": 250}\n\nnot json\n')
+        self.addCleanup(os.unlink, handle.name)
+        out, err = StringIO(), StringIO()
+        call_command("import_deliveries", handle.name, stdout=out, stderr=err)
+        self.assertIn("1/2", out.getvalue())
+        self.assertIn("3-qator", err.getvalue())
+        self.ingredient.refresh_from_db()
+        self.assertEqual(self.ingredient.quantity, 1250)
+
+        # Fayl qismlab dekodlanadi: xato baytgacha bo‘lgan partiyalar qo‘llanadi
+        with tempfile.NamedTemporaryFile(suffix=".csv", delete=False) as handle:
+            handle.write(b"name,quantity\n" + b"Tomato,1\n" * 3000 + b"Tomato,\xff\n")
+        self.addCleanup(os.unlink, handle.name)
+        with self.assertRaises(CommandError) as raised:
+            call_command("import_deliveries", handle.name, stdout=StringIO())
+        # Ko‘rsatilgan qatordan oldingi barcha qatorlar (sarlavhadan keyin) qo‘llangan
+        line = int(re.match(r"(\d+)-qatorda to'xtadi", str(raised.exception))[1])
+        self.assertGreater(line, 2)
+        self.ingredient.refresh_from_db()
+        self.assertEqual(self.ingredient.quantity, 1250 + line - 2)
+
+
+class PopulateDataTests(TestCase):
+    options = {
+        "users": 3,
+        "meals": 4,
+        "ingredients": 12,
+        "days": 6,
+        "servings_per_day": 5,
+        "seed": 7,
+    }
+
+    def populate(self, **options):
+        call_command("populate_data", stdout=StringIO(), **{**self.options, **options})
+
+    def counts(self):
+        return [
+            model.objects.count()
+            for model in (User, UserRole, Ingredient, Meal, Recipe, Serving)
+        ]
+
+    def test_generates_requested_volume(self):
+        self.populate()
+        self.assertEqual(self.counts()[:4], [3, 3, 12, 4])
+        self.assertEqual(Serving.objects.count(), 30)
+        self.assertTrue(Ingredient.objects.filter(name="Ingredient 12").exists())
+        # auto_now_add chetlab o‘tilgan: porsiyalar 6 kunga taqsimlangan
+        self.assertEqual(len(Serving.objects.dates("date_served", "day")), 6)
+        self.assertTrue(Serving._meta.get_field("date_served").auto_now_add)
+        self.assertEqual(
+            ServingDailyRollup.objects.aggregate(total=Sum("portions"))["total"],
+            Serving.objects.aggregate(total=Sum("portion_count"))["total"],
+        )
+        self.assertTrue(User.objects.get(username="user1").check_password("password"))
+
+    def test_rerun_is_idempotent(self):
+        self.populate()
+        counts = self.counts()
+        self.populate(seed=8)
+        self.assertEqual(self.counts(), counts)
+
+    def test_rerun_with_more_days_fills_only_missing_days(self):
+        self.populate()
+        self.populate(days=8)
+        self.assertEqual(Serving.objects.count(), 40)
+
+
+class ServingHistoryTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.soup = Meal.objects.create(name="Soup")
+        Recipe.objects.create(meal=self.soup, ingredient=self.ingredient, quantity=200)
+        # Oy chegaralari: 31-may 23:59 va 1-iyun 00:00 (mahalliy vaqt)
+        for moment, portions in [
+            (datetime(2025, 5, 31, 23, 59), 3),
+            (datetime(2025, 6, 1, 0, 0), 4),
+            (datetime(2025, 6, 30, 12, 0), 5),
+            (datetime(2025, 7, 1, 0, 0), 7),
+        ]:
+            serving = Serving.objects.create(
+                meal=self.meal, user=self.regular_user, portion_count=portions
+            )
+            Serving.objects.filter(pk=serving.pk).update(
+                date_served=timezone.make_aware(moment)
+            )
+        # update() signal yubormaydi — kunlik yig‘indilar qayta quriladi
+        rebuild_rollups()
+
+
+class MonthlyReportTests(ServingHistoryTestCase):
+    def test_exact_month_window(self):
+        self.assertEqual(prepared_by_meal("2025-06"), {self.meal.id: 9})
+        self.assertEqual(prepared_by_meal(date(2025, 5, 17)), {self.meal.id: 3})
+
+    def test_build_reports_in_constant_queries(self):
+        # PostgreSQL'da INSERT ... SELECT ... ON CONFLICT bitta so‘rov
+        with self.assertNumQueries(1 if connection.vendor == "postgresql" else 3):
+            build_monthly_reports("2025-06")
+        report = Report.objects.get(meal=self.meal, month=date(2025, 6, 1))
+        self.assertEqual(report.prepared_portions, 9)
+        self.assertEqual(report.possible_portions, 10)
+        self.assertAlmostEqual(report.difference_percentage, 10.0)
+        self.assertFalse(report.warning_triggered)
+        soup = Report.objects.get(meal=self.soup, month=date(2025, 6, 1))
+        self.assertEqual(soup.prepared_portions, 0)
+        self.assertTrue(soup.warning_triggered)
+
+    def test_rebuild_is_idempotent(self):
+        build_monthly_reports("2025-06")
+        Serving.objects.filter(meal=self.meal).update(portion_count=1)
+        rebuild_rollups()
+        build_monthly_reports("2025-06")
+        self.assertEqual(Report.objects.filter(month=date(2025, 6, 1)).count(), 2)
+        report = Report.objects.get(meal=self.meal, month=date(2025, 6, 1))
+        self.assertEqual(report.prepared_portions, 2)
+
+
+class BackfillReportsTests(ServingHistoryTestCase):
+    def test_units_split_by_month_and_chunk(self):
+        units = report_units("2025-05", "2025-07", chunk_size=1)
+        self.assertEqual(len(units), 6)
+        self.assertEqual(units[0], ("2025-05-01", [self.meal.id]))
+
+    def test_command_backfills_and_skips_existing(self):
+        out = StringIO()
+        call_command("backfill_reports", since="2025-05", until="2025-07", stdout=out)
+        self.assertIn("6 hisobot", out.getvalue())
+        prepared = dict(
+            Report.objects.filter(meal=self.meal).values_list(
+                "month", "prepared_portions"
+            )
+        )
+        self.assertEqual(
+            prepared,
+            {date(2025, 5, 1): 3, date(2025, 6, 1): 9, date(2025, 7, 1): 7},
+        )
+        self.assertEqual(report_units("2025-05", "2025-07"), [])
+
+        Serving.objects.update(portion_count=1)
+        rebuild_rollups()
+        call_command(
+            "backfill_reports", since="2025-06", until="2025-06", force=True, stdout=out
+        )
+        report = Report.objects.get(meal=self.meal, month=date(2025, 6, 1))
+        self.assertEqual(report.prepared_portions, 2)
+        self.assertEqual(Report.objects.count(), 6)
+
+    def test_invalid_month_rejected_before_dispatch(self):
+        for options in ({"since": "June"}, {"since": "2025-05", "until": "2025-13"}):
+            with self.assertRaises(CommandError):
+                call_command(
+                    "backfill_reports", celery=True, stdout=StringIO(), **options
+                )
+
+    def test_default_since_covers_pruned_months(self):
+        list(prune_servings(date(2025, 7, 1)))
+        out = StringIO()
+        call_command("backfill_reports", until="2025-07", stdout=out)
+        self.assertIn("2025-05 — 2025-07", out.getvalue())
+        report = Report.objects.get(meal=self.meal, month=date(2025, 5, 1))
+        self.assertEqual(report.prepared_portions, 3)
+
+
+class ServingRollupTests(ServingHistoryTestCase):
+    def rollup(self):
+        return dict(
+            ServingDailyRollup.objects.values("day")
+            .annotate(total=Sum("portions"))
+            .values_list("day", "total")
+        )
+
+    def test_rollup_matches_raw_after_rebuild(self):
+        self.assertEqual(rebuild_rollups(), 5)
+        self.assertEqual(self.rollup()[date(2025, 6, 1)], 4)
+        self.assertEqual(self.rollup()[date(2025, 5, 31)], 3)
+
+    def test_rollup_maintained_incrementally(self):
+        rebuild_rollups()
+        today = timezone.localdate()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.admin_token.key}")
+        self.client.post(
+            reverse("serving-serve-meal"), {"meal_id": self.meal.id, "portion_count": 2}
+        )
+        self.client.post(
+            reverse("serving-serve-meals"),
+            {"lines": [{"meal_id": self.meal.id, "portion_count": 3}]},
+            format="json",
+        )
+        self.assertEqual(self.rollup()[today], 1 + 2 + 3)
+        serving = Serving.objects.filter(user=self.admin_user, portion_count=3).get()
+        serving.portion_count = 1
+        serving.save()
+        self.assertEqual(self.rollup()[today], 4)
+        serving.delete()
+        self.assertEqual(self.rollup()[today], 3)
+
+    def test_deleted_users_share_one_rollup_row(self):
+        today = timezone.localdate()
+        first = Serving.objects.create(
+            meal=self.soup, user=self.manager_user, portion_count=2
+        )
+        Serving.objects.create(meal=self.soup, user=self.admin_user, portion_count=3)
+        self.manager_user.delete()
+        self.admin_user.delete()
+        rows = ServingDailyRollup.objects.filter(day=today, meal=self.soup)
+        self.assertEqual(list(rows.values_list("user", "portions")), [(None, 5)])
+        Serving.objects.get(pk=first.pk).delete()
+        self.assertEqual(list(rows.values_list("user", "portions")), [(None, 3)])
+        Serving.objects.create(meal=self.soup, user=None, portion_count=4)
+        self.assertEqual(list(rows.values_list("user", "portions")), [(None, 7)])
+
+    def test_analytics_served_from_rollup(self):
+        rebuild_rollups()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.user_token.key}")
+        # PostgreSQL: materialized view chegarasi ham o‘qiladi
+        with self.assertNumQueries(3 if connection.vendor == "postgresql" else 2):
+            response = self.client.get(reverse("serving-by-date"))
+        totals = [
+            (row["date_served__month"], row["total_portions"]) for row in response.data
+        ]
+        self.assertEqual(totals[:3], [(5, 3), (6, 9), (7, 7)])
+        response = self.client.get(
+            reverse("serving-by-user"), {"since": "2025-06-01", "until": "2025-06-30"}
+        )
+        self.assertEqual(
+            list(response.data), [{"user__username": "user", "total_portions": 9}]
+        )
+        response = self.client.get(reverse("meal-by-type"), {"since": "2025-07-01"})
+        by_type = {row["type"]: row["portions"] for row in response.data}
+        self.assertEqual(by_type["lunch"], 7 + 1)
+        response = self.client.get(reverse("serving-by-user"), {"since": "June"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RollupMigrationTests(TransactionTestCase):
+    # Jadval yaratilganda mavjud porsiyalar kunlik yig‘indiga to‘ldiriladi
+    before = [("inventory", "0002_recipe_recipe_ingredient_meal_idx")]
+    after = [("inventory", "0003_servingdailyrollup")]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def setUp(self):
+        latest = MigrationExecutor(connection).loader.graph.leaf_nodes()
+        self.addCleanup(self.migrate, latest)
+
+    def test_rollup_filled_from_existing_servings(self):
+        apps = self.migrate(self.before)
+        user = apps.get_model("auth", "User").objects.create(username="chef")
+        meal = apps.get_model("inventory", "Meal").objects.create(name="Soup")
+        servings = apps.get_model("inventory", "Serving").objects
+        for moment, owner, portions in [
+            (datetime(2025, 6, 1, 9, 0), user, 2),
+            (datetime(2025, 6, 1, 23, 59), user, 3),
+            (datetime(2025, 6, 2, 0, 0), None, 4),
+        ]:
+            serving = servings.create(meal=meal, user=owner, portion_count=portions)
+            servings.filter(pk=serving.pk).update(
+                date_served=timezone.make_aware(moment)
+            )
+
+        apps = self.migrate(self.after)
+        rollups = apps.get_model("inventory", "ServingDailyRollup").objects
+        self.assertEqual(
+            sorted(rollups.values_list("day", "user_id", "portions")),
+            [(date(2025, 6, 1), user.pk, 5), (date(2025, 6, 2), None, 4)],
+        )
+
+
+class MonthlyTotalsTests(ServingHistoryTestCase):
+    RANGES = [
+        {},
+        {"day__gte": date(2025, 6, 1)},
+        {"day__gte": date(2025, 5, 15), "day__lte": date(2025, 6, 30)},
+        {"day__lte": date(2025, 6, 29)},
+        {"day__gte": date(2025, 6, 2), "day__lte": date(2025, 6, 29)},
+    ]
+
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            rebuild_rollups()
+
+    def live(self, days):
+        rows = (
+            ServingDailyRollup.objects.filter(**days)
+            .values(
+                date_served__year=ExtractYear("day"),
+                date_served__month=ExtractMonth("day"),
+            )
+            .annotate(total_portions=Sum("portions"))
+            .order_by("date_served__year", "date_served__month")
+        )
+        return list(rows)
+
+    def june(self):
+        totals = monthly_totals({"day__gte": date(2025, 6, 1)})
+        return totals[0]["total_portions"]
+
+    def test_matches_live_aggregation(self):
+        for days in self.RANGES:
+            with self.subTest(days):
+                self.assertEqual(monthly_totals(days), self.live(days))
+
+    def test_closed_months_served_from_view(self):
+        from .tasks import refresh_materialized_views
+
+        if not materialized.enabled():
+            self.skipTest("Materialized view'lar faqat PostgreSQL'da")
+        self.assertEqual(
+            materialized.covered_months(date(2025, 5, 15)),
+            (date(2025, 6, 1), timezone.localdate().replace(day=1)),
+        )
+        # Signal chetlab o‘zgartirilgan yig‘indi — view yangilanguncha eski qiymat
+        ServingDailyRollup.objects.filter(day=date(2025, 6, 30)).update(
+            portions=F("portions") + 100
+        )
+        self.assertEqual(self.june(), 9)
+        self.assertTrue(refresh_materialized_views())
+        self.assertEqual(self.june(), 109)
+
+    def test_backdated_change_refreshes_view(self):
+        if not materialized.enabled():
+            self.skipTest("Materialized view'lar faqat PostgreSQL'da")
+        serving = Serving.objects.get(portion_count=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            serving.delete()
+        self.assertEqual(self.june(), 4)
+        self.assertEqual(monthly_totals({}), self.live({}))
+
+
+class ClearDbTests(ServingHistoryTestCase):
+    def clear(self, **options):
+        out = StringIO()
+        call_command("clear_db", stdout=out, **options)
+        return out.getvalue()
+
+    def test_requires_confirm(self):
+        self.assertIn("--confirm", self.clear())
+        self.assertEqual(Serving.objects.count(), 5)
+
+    def test_full_wipe_resets_sequences(self):
+        rebuild_rollups()
+        stock_changed(ingredient_ids=[self.ingredient.id])
+        output = self.clear(confirm=True)
+        self.assertIn("inventory_serving: 5 ta yozuv", output)
+        models = [User, Token, UserRole, Ingredient, Meal, Recipe, Serving]
+        for model in models + [ServingDailyRollup, PortionEstimate, Report]:
+            self.assertFalse(model.objects.exists(), model)
+        salt = Ingredient.objects.create(
+            name="Salt", quantity=1, delivery_date=date.today()
+        )
+        self.assertEqual(salt.pk, 1)
+
+    def test_scoped_wipe_keeps_other_tables(self):
+        rebuild_rollups()
+        self.clear(confirm=True, only=["servings"])
+        self.assertFalse(Serving.objects.exists())
+        self.assertFalse(ServingDailyRollup.objects.exists())
+        self.assertEqual(Meal.objects.count(), 2)
+        self.clear(confirm=True, only=["users"])
+        self.assertFalse(Token.objects.exists())
+        self.assertEqual(Ingredient.objects.count(), 1)
+
+    def test_user_wipe_nulls_servings(self):
+        rebuild_rollups()
+        # Ikki foydalanuvchi bir kunda bir ovqatni bergan + egasiz qator bor
+        Serving.objects.create(meal=self.meal, user=self.admin_user, portion_count=2)
+        Serving.objects.create(meal=self.soup, user=self.admin_user, portion_count=6)
+        Serving.objects.create(meal=self.soup, user=None, portion_count=4)
+        self.clear(confirm=True, only=["users"])
+        self.assertEqual(Serving.objects.filter(user__isnull=True).count(), 8)
+        today = ServingDailyRollup.objects.filter(day=timezone.localdate())
+        self.assertEqual(
+            sorted(today.values_list("meal_id", "user", "portions")),
+            sorted([(self.meal.id, None, 3), (self.soup.id, None, 10)]),
+        )
+        self.assertFalse(ServingDailyRollup.objects.filter(user__isnull=False).exists())
+        self.assertEqual(
+            ServingDailyRollup.objects.aggregate(total=Sum("portions"))["total"],
+            Serving.objects.aggregate(total=Sum("portion_count"))["total"],
+        )
+
+    def test_truncate_flushes_in_one_statement_set(self):
+        self.clear(confirm=True, truncate=True, only=["meals"])
+        self.assertFalse(Recipe.objects.exists())
+        self.assertFalse(Serving.objects.exists())
+        self.assertEqual(Ingredient.objects.count(), 1)
+
+    def test_truncate_falls_back_to_delete_for_referenced_tables(self):
+        # inventory_serving.user_id (SET_NULL) auth_user'ga bog‘langan:
+        # PostgreSQL'da TRUNCATE auth_user rad etiladi
+        order, nullify = wipe_plan([UserRole, User])
+        self.assertIn(User, order)
+        self.assertIn((Serving, Serving._meta.get_field("user")), nullify)
+        output = self.clear(confirm=True, truncate=True, only=["users"])
+        self.assertIn("auth_user: 3 ta yozuv", output)
+        self.assertFalse(User.objects.exists())
+        self.assertEqual(Serving.objects.filter(user__isnull=True).count(), 5)
+
+    def test_prune_servings_before_date(self):
+        rebuild_rollups()
+        output = self.clear(confirm=True, servings_before="2025-06-30", chunk_size=1)
+        self.assertIn("2 ta porsiya", output)
+        self.assertEqual(Serving.objects.count(), 3)
+        # Kunlik yig‘indilar saqlanadi
+        self.assertEqual(ServingDailyRollup.objects.count(), 5)
+        self.assertEqual(
+            ServingDailyRollup.objects.aggregate(total=Sum("portions"))["total"],
+            1 + 3 + 4 + 5 + 7,
+        )
+        with self.assertRaises(CommandError):
+            self.clear(confirm=True, servings_before="June")
+
+    def test_prune_servings_at_local_midnight(self):
+        # 31-may 23:59 o‘chadi, 1-iyun 00:00 (mahalliy vaqt) qoladi
+        deleted = sum(count for count, _ in prune_servings(date(2025, 6, 1)))
+        self.assertEqual(deleted, 1)
+        june = timezone.make_aware(datetime(2025, 6, 1))
+        self.assertFalse(Serving.objects.filter(date_served__lt=june).exists())
+        self.assertEqual(Serving.objects.count(), 4)
+
+
+class ServingArchiveTests(ServingHistoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        settings = override_settings(SERVING_ARCHIVE_ROOT=self.root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_archives_expired_months_and_keeps_aggregates(self):
+        events = []
+        results = archive_expired("2025-07", chunk_size=1, progress=events.append)
+        self.assertEqual(
+            [(row["month"], row["archived"], row["deleted"]) for row in results],
+            [("2025-05", 1, 1), ("2025-06", 2, 2)],
+        )
+        self.assertEqual(events[-1]["months_done"], 1)
+        self.assertEqual(events[-1]["months_total"], 2)
+        self.assertEqual(archived_months(), ["2025-05", "2025-06"])
+        self.assertEqual(Serving.objects.count(), 2)
+        june = ServingDailyRollup.objects.filter(day__month=6, day__year=2025)
+        self.assertEqual(june.aggregate(total=Sum("portions"))["total"], 9)
+        report = Report.objects.get(meal=self.meal, month=date(2025, 6, 1))
+        self.assertEqual(report.prepared_portions, 9)
+        rows = list(read_archive("2025-06"))
+        self.assertEqual([row["portion_count"] for row in rows], [4, 5])
+        self.assertEqual(rows[0]["user_id"], self.regular_user.id)
+        self.assertEqual(list(read_archive("2025-06", meal_id=self.soup.id)), [])
+
+    def test_keeps_existing_reports_unchanged(self):
+        # Saqlangan hisobot tarix: joriy zaxiradan qayta yozilmaydi
+        fields = [
+            "prepared_portions",
+            "possible_portions",
+            "difference_percentage",
+            "warning_triggered",
+        ]
+        stored = Report.objects.create(
+            meal=self.meal,
+            month=date(2025, 6, 1),
+            prepared_portions=30,
+            possible_portions=100,
+            difference_percentage=70.0,
+            warning_triggered=True,
+        )
+        archive_month("2025-06")
+        report = Report.objects.get(pk=stored.pk)
+        self.assertEqual(
+            [getattr(report, name) for name in fields],
+            [getattr(stored, name) for name in fields],
+        )
+        # Yo‘q hisobot yaratiladi
+        soup = Report.objects.get(meal=self.soup, month=date(2025, 6, 1))
+        self.assertEqual(soup.prepared_portions, 0)
+        archived = sum(row["portion_count"] for row in read_archive("2025-06"))
+        self.assertEqual(archived, 9)
+
+    def test_regenerating_archived_month_keeps_prepared(self):
+        from .tasks import generate_monthly_report
+
+        archive_month("2025-06")
+        self.assertFalse(Serving.objects.filter(portion_count__in=[4, 5]).exists())
+        generate_monthly_report("2025-06")
+        call_command(
+            "backfill_reports",
+            since="2025-06",
+            until="2025-06",
+            force=True,
+            stdout=StringIO(),
+        )
+        report = Report.objects.get(meal=self.meal, month=date(2025, 6, 1))
+        self.assertEqual(report.prepared_portions, 9)
+
+    def test_rerun_after_interrupted_delete(self):
+        # Qism yozilgan, lekin qatorlar o‘chirilmagan
+        start, end = month_bounds("2025-06")
+        write_part(
+            "2025-06",
+            Serving.objects.filter(date_served__gte=start, date_served__lt=end),
+        )
+        result = archive_month("2025-06")
+        self.assertEqual(result["deleted"], 2)
+        self.assertEqual(len(archive_parts("2025-06")), 2)
+        self.assertEqual(len(list(read_archive("2025-06"))), 2)
+
+    def test_archive_read_endpoint(self):
+        archive_expired("2025-07")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.manager_token.key}")
+        response = self.client.get(reverse("serving-archive"))
+        self.assertEqual(response.data["months"], ["2025-05", "2025-06"])
+        response = self.client.get(
+            reverse("serving-archive"),
+            {"month": "2025-06", "meal_id": self.meal.id},
+        )
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)["portion_count"] for line in lines], [4, 5])
+        response = self.client.get(reverse("serving-archive"), {"month": "2024-01"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse("serving-archive"), {"month": "June"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.user_token.key}")
+        response = self.client.get(reverse("serving-archive"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_command_archives_before_month(self):
+        out = StringIO()
+        call_command("archive_servings", before="2025-06", stdout=out)
+        self.assertIn("2025-05: 1 ta arxivlandi", out.getvalue())
+        self.assertEqual(Serving.objects.count(), 4)
+
+    def test_command_rejects_invalid_month_before_dispatch(self):
+        for celery in (False, True):
+            with self.assertRaisesMessage(CommandError, "YYYY-MM"):
+                call_command(
+                    "archive_servings", before="June", celery=celery, stdout=StringIO()
+                )
+        self.assertEqual(Serving.objects.count(), 5)
+
+
+# Test jadvallari kichik — PostgreSQL indeks bo‘lsa ham Seq Scan va hash
+# join tanlaydi. Ular o‘chirilganda to‘liq skan Seq Scan yoki shartsiz
+# (Index Cond'siz) Index Scan bo‘lib qoladi. SQLite'dagi COVERING INDEX kabi
+# Index Only Scan va qisman indeks skani to‘liq skan hisoblanmaydi
+def pg_full_scans(queryset):
+    with transaction.atomic(), connection.cursor() as cursor:
+        for setting in ("enable_seqscan", "enable_hashjoin", "enable_mergejoin"):
+            cursor.execute(f"SET LOCAL {setting} = off")
+        plan = queryset.explain()
+        cursor.execute(
+            "SELECT indexrelid::regclass::text FROM pg_index "
+            "WHERE indpred IS NOT NULL"
+        )
+        partial = {name for (name,) in cursor.fetchall()}
+    nodes = []
+    for line in plan.splitlines():
+        match = re.search(
+            r"(?<!Bitmap )(Seq Scan|Index Only Scan|Index Scan)(?: using (\w+))? "
+            r"on (\w+)",
+            line,
+        )
+        if match:
+            kind, index, table = match.groups()
+            nodes.append({"kind": kind, "index": index, "table": table})
+        elif "Index Cond:" in line and nodes:
+            nodes[-1]["cond"] = True
+    return [
+        node["table"]
+        for node in nodes
+        if node["kind"] == "Seq Scan"
+        or node["kind"] == "Index Scan"
+        and not (node.get("cond") or node["index"] in partial)
+    ]
+
+
+def full_table_scans(queryset):
+    # EXPLAIN natijasidan indekssiz to‘liq skanerlangan jadvallarni ajratish
+    if connection.vendor == "postgresql":
+        return pg_full_scans(queryset)
+    plan = queryset.explain()
+    return re.findall(r"\bSCAN (\w+)(?! USING)\s*$", plan, re.MULTILINE)
+
+
+class QueryPlanTests(BaseTestCase):
+    def hot_queries(self):
+        start, end = month_bounds("2025-06")
+        return {
+            "monthly_report": Serving.objects.filter(
+                date_served__gte=start, date_served__lt=end
+            )
+            .values("meal_id")
+            .annotate(total=Sum("portion_count")),
+            "meal_month": Serving.objects.filter(
+                meal=self.meal, date_served__gte=start, date_served__lt=end
+            ),
+            "low_stock": Ingredient.objects.filter(quantity__lte=F("min_quantity")),
+            "warnings": Report.objects.filter(warning_triggered=True)
+            .values("meal__name")
+            .annotate(count=Count("pk")),
+            "by_user": ServingDailyRollup.objects.values("user__username").annotate(
+                total_portions=Sum("portions")
+            ),
+            "by_date": ServingDailyRollup.objects.filter(day__gte=date(2025, 1, 1))
+            .values(year=ExtractYear("day"), month=ExtractMonth("day"))
+            .annotate(total_portions=Sum("portions")),
+        }
+
+    def test_hot_queries_use_indexes(self):
+        for name, queryset in self.hot_queries().items():
+            with self.subTest(name):
+                self.assertEqual(full_table_scans(queryset), [], queryset.explain())
+
+    def test_detects_full_scan(self):
+        # Ifoda bo‘yicha filtr — hech bir indeks ishlatilolmaydi (PostgreSQL
+        # portion_count'ni kompozit indeksning ikkinchi ustunidan ham o‘qiy oladi)
+        queryset = Serving.objects.alias(doubled=F("portion_count") * 2).filter(
+            doubled__gt=2
+        )
+        self.assertEqual(full_table_scans(queryset), ["inventory_serving"])
+
+
+class QueryCountTests(BaseTestCase):
+    # Token keshdan (0) + asosiy so‘rov (1)
+    EXPECTED_QUERIES = 1
+
+    def setUp(self):
+        super().setUp()
+        for index in range(5):
+            ingredient = Ingredient.objects.create(
+                name=f"Extra{index}",
+                quantity=100,
+                min_quantity=0,
+                delivery_date=date.today(),
+            )
+            meal = Meal.objects.create(name=f"Dish{index}")
+            Recipe.objects.create(meal=meal, ingredient=ingredient, quantity=10)
+            Serving.objects.create(meal=meal, user=self.regular_user, portion_count=1)
+            Report.objects.create(month=date(2025, 6, 1), meal=meal)
+        flush_stock_changes()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.user_token.key}")
+        # Birinchi so‘rov tokenni bitta JOIN so‘rov bilan keshga yuklaydi
+        self.client.get(reverse("ingredient-list"))
+
+    def test_list_and_detail_endpoints(self):
+        endpoints = {
+            "ingredient": Ingredient,
+            "meal": Meal,
+            "recipe": Recipe,
+            "serving": Serving,
+            "report": Report,
+            "portion-estimate": PortionEstimate,
+        }
+        for basename, model in endpoints.items():
+            with self.subTest(basename):
+                with self.assertNumQueries(self.EXPECTED_QUERIES):
+                    response = self.client.get(reverse(f"{basename}-list"))
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                rows = response.data
+                if isinstance(rows, dict):
+                    rows = rows["results"]
+                self.assertGreater(len(rows), 1)
+                pk = model.objects.values_list("pk", flat=True).first()
+                with self.assertNumQueries(self.EXPECTED_QUERIES):
+                    response = self.client.get(reverse(f"{basename}-detail", args=[pk]))
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class PaginationTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        for _ in range(4):
+            Serving.objects.create(
+                meal=self.meal, user=self.regular_user, portion_count=2
+            )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.user_token.key}")
+
+    def test_cursor_pagination(self):
+        response = self.client.get(reverse("serving-list"), {"page_size": 2})
+        self.assertEqual(len(response.data["results"]), 2)
+        seen = [row["id"] for row in response.data["results"]]
+        while response.data["next"]:
+            response = self.client.get(response.data["next"])
+            seen += [row["id"] for row in response.data["results"]]
+        expected = Serving.objects.order_by("-pk").values_list("pk", flat=True)
+        self.assertEqual(seen, list(expected))
+
+    def test_stream_ndjson(self):
+        response = self.client.get(reverse("serving-list"), {"stream": "1"})
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(json.loads(lines[0])["meal"], "Salad")
+
+    def test_stream_json_array_respects_filters(self):
+        other = Meal.objects.create(name="Tea")
+        Recipe.objects.create(meal=other, ingredient=self.ingredient, quantity=1)
+        response = self.client.get(
+            reverse("recipe-list"),
+            {"stream": "1", "stream_format": "json", "meal": other.id},
+        )
+        rows = json.loads(b"".join(response.streaming_content))
+        self.assertEqual([row["meal"] for row in rows], ["Tea"])
+
+    def test_dashboard_reports_stream_past_first_page(self):
+        Report.objects.bulk_create(
+            Report(meal=self.meal, month=date(2000 + index // 12, index % 12 + 1, 1))
+            for index in range(120)
+        )
+        response = self.client.get(
+            reverse("report-list"), {"stream": "1", "stream_format": "json"}
+        )
+        rows = json.loads(b"".join(response.streaming_content))
+        months = sorted(row["month"] for row in rows)
+        self.assertEqual(len(months), 120)
+        self.assertEqual((months[0], months[-1]), ("2000-01-01", "2009-12-01"))
+
+
+class FastInventoryConsumer(InventoryConsumer):
+    debounce = 0.05
+
+
+class ConsumerTestCase(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="chef", password="chefpass")
+        self.flour = Ingredient.objects.create(
+            name="Flour", quantity=300, min_quantity=200, delivery_date=date.today()
+        )
+        self.milk = Ingredient.objects.create(
+            name="Milk", quantity=100, min_quantity=50, delivery_date=date.today()
+        )
+        self.bread = Meal.objects.create(name="Bread")
+        Recipe.objects.create(meal=self.bread, ingredient=self.flour, quantity=60)
+
+
+class InventoryConsumerTests(ConsumerTestCase):
+    async def connect(self, user=None):
+        communicator = WebsocketCommunicator(
+            FastInventoryConsumer.as_asgi(), "/ws/inventory/"
+        )
+        communicator.scope["user"] = user or self.user
+        connected, _ = await communicator.connect()
+        return communicator, connected
+
+    async def test_rejects_anonymous(self):
+        _, connected = await self.connect(AnonymousUser())
+        self.assertFalse(connected)
+
+    def test_base_consumer_is_abstract(self):
+        with self.assertRaises(TypeError):
+            SubscriptionConsumer()
+
+    async def test_pushes_only_transitions_for_subscribed_meals(self):
+        communicator, connected = await self.connect()
+        self.assertTrue(connected)
+        self.assertEqual((await communicator.receive_json_from())["low_stock"], [])
+        await communicator.send_json_to(
+            {"action": "subscribe", "meals": [self.bread.id]}
+        )
+        await communicator.receive_json_from()
+
+        deduct = database_sync_to_async(deduct_stock)
+        await deduct({self.flour.id: 60})  # 240 — hali kam emas
+        await deduct({self.flour.id: 60})  # 180 — kam zaxiraga o‘tdi
+        await deduct({self.milk.id: 80})  # obuna qilinmagan
+        message = await communicator.receive_json_from(timeout=2)
+        self.assertEqual(message["type"], "low_stock")
+        self.assertEqual(
+            [(item["name"], item["low"]) for item in message["events"]],
+            [("Flour", True)],
+        )
+
+        await deduct({self.flour.id: 60})  # hali ham kam — hodisa yo‘q
+        self.assertTrue(await communicator.receive_nothing(timeout=0.2))
+        await database_sync_to_async(
+            Ingredient.objects.filter(pk=self.flour.pk).update
+        )(quantity=1000)
+        await database_sync_to_async(stock_changed)([self.flour.id])
+        message = await communicator.receive_json_from(timeout=2)
+        self.assertEqual(message["events"][0]["low"], False)
+        await communicator.disconnect()
+
+    async def test_rejects_malformed_subscription(self):
+        communicator, _ = await self.connect()
+        await communicator.receive_json_from()
+        for message in [
+            {"action": "subscribe", "ingredients": 5},
+            {"action": "subscribe", "ingredients": "1,2"},
+            {"action": "subscribe", "ingredients": [[1]]},
+            {"action": "subscribe", "meals": ["bread"]},
+        ]:
+            await communicator.send_json_to(message)
+            reply = await communicator.receive_json_from()
+            self.assertEqual(reply["type"], "error")
+        # Satr ko‘rinishidagi id'lar songa keltiriladi
+        await communicator.send_json_to(
+            {"action": "subscribe", "ingredients": [str(self.flour.id)]}
+        )
+        await communicator.receive_json_from()
+        await database_sync_to_async(deduct_stock)({self.flour.id: 120})
+        message = await communicator.receive_json_from(timeout=2)
+        self.assertEqual([item["name"] for item in message["events"]], ["Flour"])
+        await communicator.disconnect()
+
+
+class PortionConsumerTests(ConsumerTestCase):
+    async def connect(self, user=None):
+        communicator = WebsocketCommunicator(
+            PortionConsumer.as_asgi(), "/ws/portions/"
+        )
+        communicator.scope["user"] = user or self.user
+        connected, _ = await communicator.connect()
+        return communicator, connected
+
+    async def test_pushes_only_changed_meals(self):
+        milkshake = await Meal.objects.acreate(name="Milkshake")
+        await Recipe.objects.acreate(meal=milkshake, ingredient=self.milk, quantity=10)
+        await database_sync_to_async(refresh_estimates)()
+        communicator, connected = await self.connect()
+        snapshot = await communicator.receive_json_from()
+        self.assertEqual(
+            {item["meal"]: item["possible_portions"] for item in snapshot["portions"]},
+            {"Bread": 5, "Milkshake": 10},
+        )
+
+        await database_sync_to_async(deduct_stock)({self.flour.id: 50})
+        message = await communicator.receive_json_from(timeout=2)
+        # Snapshot bilan bir xil maydonlar
+        self.assertEqual(
+            message["portions"],
+            [{"meal_id": self.bread.id, "meal": "Bread", "possible_portions": 4}],
+        )
+        self.assertEqual(message["portions"][0].keys(), snapshot["portions"][0].keys())
+        # Porsiya soni o‘zgarmagan — xabar yo‘q
+        await database_sync_to_async(deduct_stock)({self.flour.id: 1})
+        self.assertTrue(await communicator.receive_nothing(timeout=0.2))
+
+        await communicator.send_json_to(
+            {"action": "subscribe", "meals": [milkshake.id]}
+        )
+        snapshot = await communicator.receive_json_from()
+        self.assertEqual(len(snapshot["portions"]), 1)
+        await database_sync_to_async(deduct_stock)({self.flour.id: 60})
+        self.assertTrue(await communicator.receive_nothing(timeout=0.2))
+        await communicator.disconnect()
+
+    async def test_rejects_malformed_subscription(self):
+        communicator, _ = await self.connect()
+        await communicator.receive_json_from()
+        for meals in [3, {"id": 3}, [None], [True]]:
+            await communicator.send_json_to({"action": "subscribe", "meals": meals})
+            reply = await communicator.receive_json_from()
+            self.assertEqual(reply["type"], "error")
+        await communicator.send_json_to(
+            {"action": "subscribe", "meals": [str(self.bread.id)]}
+        )
+        snapshot = await communicator.receive_json_from()
+        self.assertEqual([item["meal"] for item in snapshot["portions"]], ["Bread"])
+        await communicator.disconnect()
+
+
 class LoginViewTests(BaseTestCase):
     def test_login_valid_credentials(self):
         data = {"username": "user", "password": "userpass"}
@@ -1,14 +1,17 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import async_views
 from .views import (
     IngredientViewSet,
     MealViewSet,
     RecipeViewSet,
     ServingViewSet,
     ReportViewSet,
+    PortionEstimateViewSet,
     LoginView,
     RegisterView,
     LogoutView,
+    AuthCacheStatsView,
 )
 
 router = DefaultRouter()
@@ -17,10 +20,48 @@ router.register(r"meals", MealViewSet, basename="meal")
 router.register(r"recipes", RecipeViewSet, basename="recipe")
 router.register(r"servings", ServingViewSet, basename="serving")
 router.register(r"reports", ReportViewSet, basename="report")
+router.register(
+    r"portion-estimates", PortionEstimateViewSet, basename="portion-estimate"
+)
+
+# O‘qish uchun async muqobillar (/api/async/...): ASGI ostida ishchi oqimni
+# band qilmaydi. Yo‘llar sinxron API bilan bir xil
+async_urlpatterns = [
+    path("ingredients/", async_views.ingredient_list, name="async-ingredient-list"),
+    path(
+        "ingredients/low_stock/",
+        async_views.low_stock,
+        name="async-ingredient-low-stock",
+    ),
+    path("reports/", async_views.report_list, name="async-report-list"),
+    path(
+        "reports/warnings/",
+        async_views.report_warnings,
+        name="async-report-warnings",
+    ),
+    path(
+        "servings/portion_estimate/",
+        async_views.portion_estimate,
+        name="async-serving-portion-estimate",
+    ),
+    path(
+        "servings/by_user/",
+        async_views.servings_by_user,
+        name="async-serving-by-user",
+    ),
+    path(
+        "servings/by_date/",
+        async_views.servings_by_date,
+        name="async-serving-by-date",
+    ),
+    path("meals/by_type/", async_views.meals_by_type, name="async-meal-by-type"),
+]
 
 urlpatterns = [
+    path("async/", include(async_urlpatterns)),
     path("", include(router.urls)),
     path("login/", LoginView.as_view(), name="login"),
     path("register/", RegisterView.as_view(), name="register"),
     path("logout/", LogoutView.as_view(), name="logout"),
+    path("auth-cache/", AuthCacheStatsView.as_view(), name="auth-cache"),
 ]
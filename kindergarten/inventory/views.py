@@ -1,12 +1,18 @@
+import json
+import os
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.shortcuts import render
 from django.db import transaction
 from django.db.models import F
 from django.contrib.auth.models import User
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from datetime import datetime
 from django.contrib.auth import authenticate, login, logout
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Sum
+from django.db.models import Count, Q, Sum
 
 from rest_framework import viewsets, status
 from rest_framework.views import APIView
@@ -16,7 +22,16 @@ from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.authtoken.models import Token
 from rest_framework.permissions import IsAuthenticated, AllowAny
 
-from .models import Ingredient, Meal, Recipe, Serving, UserRole, Report, PortionEstimate
+from .models import (
+    Ingredient,
+    Meal,
+    Recipe,
+    Serving,
+    ServingDailyRollup,
+    UserRole,
+    Report,
+    PortionEstimate,
+)
 from .serializers import (
     IngredientSerializer,
     MealSerializer,
@@ -27,7 +42,33 @@ from .serializers import (
     UserSerializer,
     PortionEstimateSerializer,
 )
-from .permissions import IsAdminOrManager
+from .archive import archived_months, archive_parts, read_archive
+from .authentication import principals
+from .cache import REPORTS, SERVINGS, STOCK, get_or_compute
+from .pagination import (
+    RecipeCursorPagination,
+    ReportCursorPagination,
+    ServingCursorPagination,
+    StreamingListMixin,
+)
+from .permissions import IsAdminOrChef, IsAdminOrManager
+from .deliveries import (
+    FORMATS as DELIVERY_FORMATS,
+    guess_format,
+    import_deliveries,
+    read_items,
+    read_upload,
+)
+from .optimizer import optimize_menu
+from .planning import PlanError, evaluate_plan
+from .portions import graph_portions, to_count
+from .rollups import day_range, monthly_totals
+from .stock import InsufficientStock, deduct_stock, meal_demand, serve_batch
+
+
+# Sana oralig‘i uchun kesh kaliti qismlari
+def range_key(name, days):
+    return (name, *(f"{lookup}={day}" for lookup, day in sorted(days.items())))
 
 
 # Frontend sahifalari uchun view funksiyalar
@@ -59,17 +100,58 @@ class IngredientViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
 
     def get_permissions(self):
-        if self.action in ["create", "update", "partial_update", "destroy"]:
+        if self.action in [
+            "create",
+            "update",
+            "partial_update",
+            "destroy",
+            "deliveries",
+        ]:
             return [IsAuthenticated(), IsAdminOrManager()]
         return [IsAuthenticated()]
 
+    # Ko‘plab yetkazib berishlarni bitta so‘rovda qabul qilish: JSON ro‘yxat
+    # ({"rows": [...]}) yoki CSV/NDJSON fayl (multipart "file" maydoni).
+    # Miqdorlar mavjud zaxiraga qo‘shiladi, xato qatorlar alohida qaytariladi
+    @action(detail=False, methods=["post"])
+    def deliveries(self, request):
+        upload = request.FILES.get("file")
+        if upload is not None:
+            fmt = request.data.get("format") or guess_format(upload.name)
+            if fmt not in DELIVERY_FORMATS:
+                return Response(
+                    {"error": "Fayl formati csv yoki ndjson bo‘lishi kerak"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            rows = read_upload(upload, fmt)
+        else:
+            items = request.data
+            if isinstance(items, dict):
+                items = items.get("rows")
+            if not isinstance(items, list) or not items:
+                return Response(
+                    {"error": "Qatorlar ro‘yxati kiritilishi shart"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            rows = read_items(items)
+        summary = import_deliveries(rows)
+        # O‘qish xatosida ham hisobot qaytadi: qaysi qatorgacha qo‘llangani
+        ok = summary["applied"] and summary["stopped_at"] is None
+        return Response(
+            summary,
+            status=status.HTTP_200_OK if ok else status.HTTP_400_BAD_REQUEST,
+        )
+
     @action(detail=False, methods=["get"])
     def low_stock(self, request):
-        low_stock_ingredients = Ingredient.objects.filter(
-            quantity__lte=F("min_quantity")
-        )
-        serializer = self.get_serializer(low_stock_ingredients, many=True)
-        return Response(serializer.data)
+        def compute():
+            low_stock_ingredients = Ingredient.objects.filter(
+                quantity__lte=F("min_quantity")
+            )
+            serializer = self.get_serializer(low_stock_ingredients, many=True)
+            return list(serializer.data)
+
+        return Response(get_or_compute(STOCK, ("low_stock",), compute))
 
 
 # Meal ViewSet
@@ -78,17 +160,74 @@ class MealViewSet(viewsets.ModelViewSet):
     serializer_class = MealSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_permissions(self):
+        if self.action in ["plan", "optimize"]:
+            return [IsAuthenticated(), IsAdminOrManager()]
+        return [IsAuthenticated()]
+
+    # "Shu menyuni bersak nima qachon tugaydi?" — joriy zaxira bo‘yicha
+    # {"start": "YYYY-MM-DD", "days": [[{"meal_id": 1, "portions": 20}], ...]}
+    @action(detail=False, methods=["post"])
+    def plan(self, request):
+        if not isinstance(request.data, dict):
+            return Response(
+                {"error": "So‘rov tanasi obyekt bo‘lishi kerak"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        start = request.data.get("start")
+        if start:
+            start = parse_date(str(start))
+            if start is None:
+                return Response(
+                    {"error": "Sana YYYY-MM-DD formatida bo‘lishi kerak"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        try:
+            result = evaluate_plan(request.data.get("days"), start or None)
+        except PlanError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+
+    # Umumiy mahsulotlarni hisobga olib jami porsiyalarni (yoki og‘irlikli
+    # qiymatni) maksimallashtiruvchi menyu:
+    # {"meals": [{"meal_id": 1, "min": 10, "max": 50, "weight": 2}], "method": "auto"}
+    @action(detail=False, methods=["post"])
+    def optimize(self, request):
+        if not isinstance(request.data, dict):
+            return Response(
+                {"error": "So‘rov tanasi obyekt bo‘lishi kerak"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            result = optimize_menu(
+                request.data.get("meals"), request.data.get("method", "auto")
+            )
+        except PlanError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+
     @action(detail=False, methods=["get"])
     def by_type(self, request):
-        meals = Meal.objects.values("type").annotate(
-            portions=Sum("servings__portion_count")
+        try:
+            days = day_range(request.query_params, "daily_rollups__day")
+        except ValueError:
+            return Response(
+                {"error": "Sana YYYY-MM-DD formatida bo‘lishi kerak"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        portions = Sum("daily_rollups__portions", filter=Q(**days) if days else None)
+        meals = get_or_compute(
+            SERVINGS,
+            range_key("by_type", days),
+            lambda: list(Meal.objects.values("type").annotate(portions=portions)),
         )
         return Response(meals)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
-    queryset = Recipe.objects.all()
+class RecipeViewSet(StreamingListMixin, viewsets.ModelViewSet):
+    queryset = Recipe.objects.select_related("meal", "ingredient")
     serializer_class = RecipeSerializer
+    pagination_class = RecipeCursorPagination
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ["meal"]
@@ -99,35 +238,41 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return [IsAuthenticated()]
 
 
-class ServingViewSet(viewsets.ModelViewSet):
-    queryset = Serving.objects.all()
+class ServingViewSet(StreamingListMixin, viewsets.ModelViewSet):
+    queryset = Serving.objects.select_related("meal", "user")
     serializer_class = ServingSerializer
+    pagination_class = ServingCursorPagination
     permission_classes = [IsAuthenticated]
 
     def get_permissions(self):
-        if self.action in ["create", "serve_meal"]:
+        if self.action in ["create", "serve_meal", "serve_meals"]:
             return [IsAuthenticated(), IsAdminOrChef()]
+        if self.action == "archive":
+            return [IsAuthenticated(), IsAdminOrManager()]
         return [IsAuthenticated()]
 
     @action(detail=False, methods=["post"])
     def serve_meal(self, request):
+        if not isinstance(request.data, dict):
+            return Response(
+                {"error": "So‘rov tanasi obyekt bo‘lishi kerak"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
         meal_id = request.data.get("meal_id")
-        portion_count = int(request.data.get("portion_count", 1))
+        try:
+            portion_count = int(request.data.get("portion_count", 1))
+        except (TypeError, ValueError, OverflowError):
+            portion_count = None
+        # serve_batch bilan bir xil: kamida bitta porsiya
+        if portion_count is None or portion_count < 1:
+            return Response(
+                {"error": "Porsiya soni noto‘g‘ri"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
         try:
             meal = Meal.objects.get(id=meal_id)
             with transaction.atomic():
-                for recipe in meal.recipes.all():
-                    ingredient = recipe.ingredient
-                    required_quantity = recipe.quantity * portion_count
-                    if ingredient.quantity < required_quantity:
-                        return Response(
-                            {
-                                "error": f"{ingredient.name} yetarli emas. Mavjud: {ingredient.quantity}g, Talab qilinadi: {required_quantity}g"
-                            },
-                            status=status.HTTP_400_BAD_REQUEST,
-                        )
-                    ingredient.quantity -= required_quantity
-                    ingredient.save()
+                deduct_stock(meal_demand(meal, portion_count))
                 Serving.objects.create(
                     meal=meal, user=request.user, portion_count=portion_count
                 )
@@ -135,23 +280,42 @@ class ServingViewSet(viewsets.ModelViewSet):
                 {"message": "Ovqat muvaffaqiyatli berildi"},
                 status=status.HTTP_201_CREATED,
             )
+        except InsufficientStock as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
         except Meal.DoesNotExist:
             return Response(
                 {"error": "Ovqat topilmadi"}, status=status.HTTP_404_NOT_FOUND
             )
 
+    @action(detail=False, methods=["post"])
+    def serve_meals(self, request):
+        lines = request.data.get("lines") if isinstance(request.data, dict) else None
+        if not isinstance(lines, list) or not lines:
+            return Response(
+                {"error": "Qatorlar ro‘yxati kiritilishi shart"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            results = serve_batch(lines, request.user)
+        except InsufficientStock as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_409_CONFLICT)
+        served = sum(1 for result in results if result["status"] == "ok")
+        return Response(
+            {"served": served, "results": results},
+            status=status.HTTP_201_CREATED if served else status.HTTP_400_BAD_REQUEST,
+        )
+
     @action(detail=False, methods=["get"])
     def portion_estimate(self, request):
         meal_id = request.query_params.get("meal_id")
         try:
             meal = Meal.objects.get(id=meal_id)
-            min_portions = float("inf")
-            for recipe in meal.recipes.all():
-                ingredient = recipe.ingredient
-                if recipe.quantity > 0:
-                    portions = ingredient.quantity // recipe.quantity
-                    min_portions = min(min_portions, portions)
-            return Response({"meal": meal.name, "possible_portions": int(min_portions)})
+            portions = get_or_compute(
+                STOCK,
+                ("portions", meal.id),
+                lambda: to_count(graph_portions([meal.id])[meal.id]),
+            )
+            return Response({"meal": meal.name, "possible_portions": portions})
         except Meal.DoesNotExist:
             return Response(
                 {"error": "Ovqat topilmadi"}, status=status.HTTP_404_NOT_FOUND
@@ -159,24 +323,78 @@ class ServingViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=["get"])
     def by_user(self, request):
-        servings = Serving.objects.values("user__username").annotate(
-            total_portions=Sum("portion_count")
+        try:
+            days = day_range(request.query_params)
+        except ValueError:
+            return Response(
+                {"error": "Sana YYYY-MM-DD formatida bo‘lishi kerak"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        servings = (
+            ServingDailyRollup.objects.filter(**days)
+            .values("user__username")
+            .annotate(total_portions=Sum("portions"))
+            .order_by("user__username")
+        )
+        servings = get_or_compute(
+            SERVINGS, range_key("by_user", days), lambda: list(servings)
         )
         return Response(servings)
 
     @action(detail=False, methods=["get"])
     def by_date(self, request):
-        servings = (
-            Serving.objects.values("date_served__year", "date_served__month")
-            .annotate(total_portions=Sum("portion_count"))
-            .order_by("date_served__year", "date_served__month")
+        try:
+            days = day_range(request.query_params)
+        except ValueError:
+            return Response(
+                {"error": "Sana YYYY-MM-DD formatida bo‘lishi kerak"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        servings = get_or_compute(
+            SERVINGS, range_key("by_date", days), lambda: monthly_totals(days)
         )
         return Response(servings)
 
+    # Arxivlangan oylar ro‘yxati yoki ?month=YYYY-MM qatorlari (NDJSON oqimi),
+    # ixtiyoriy ?meal_id= va ?user_id= filtrlari bilan
+    @action(detail=False, methods=["get"])
+    def archive(self, request):
+        month = request.query_params.get("month")
+        if not month:
+            return Response({"months": archived_months()})
+        try:
+            parts = archive_parts(month)
+        except ValueError:
+            return Response(
+                {"error": "Oy YYYY-MM formatida bo‘lishi kerak"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            filters = {
+                key: int(request.query_params[key])
+                for key in ("meal_id", "user_id")
+                if request.query_params.get(key)
+            }
+        except ValueError:
+            return Response(
+                {"error": "meal_id va user_id butun son bo‘lishi kerak"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not parts:
+            return Response(
+                {"error": "Arxiv topilmadi"}, status=status.HTTP_404_NOT_FOUND
+            )
+        rows = read_archive(month, **filters)
+        return StreamingHttpResponse(
+            (json.dumps(row) + "\n" for row in rows),
+            content_type="application/x-ndjson",
+        )
+
 
-class ReportViewSet(viewsets.ModelViewSet):
-    queryset = Report.objects.all()
+class ReportViewSet(StreamingListMixin, viewsets.ModelViewSet):
+    queryset = Report.objects.select_related("meal")
     serializer_class = ReportSerializer
+    pagination_class = ReportCursorPagination
     permission_classes = [IsAuthenticated]
 
     def get_permissions(self):
@@ -189,13 +407,13 @@ class ReportViewSet(viewsets.ModelViewSet):
         warnings = (
             Report.objects.filter(warning_triggered=True)
             .values("meal__name")
-            .annotate(count=Sum("warning_triggered"))
+            .annotate(count=Count("pk"))
         )
-        return Response(warnings)
+        return Response(get_or_compute(REPORTS, ("warnings",), lambda: list(warnings)))
 
 
 class PortionEstimateViewSet(viewsets.ModelViewSet):
-    queryset = PortionEstimate.objects.all()
+    queryset = PortionEstimate.objects.select_related("meal")
     serializer_class = PortionEstimateSerializer
     permission_classes = [IsAuthenticated]
 
@@ -304,7 +522,8 @@ class LogoutView(APIView):
 
     def post(self, request):
         try:
-            # Tokenni o‘chirish
+            # Tokenni o‘chirish — token keshidan ham darhol bekor qilinadi
+            # (signals.token_deleted)
             request.user.auth_token.delete()
             # Sessionni tozalash
             logout(request)
@@ -317,23 +536,15 @@ class LogoutView(APIView):
             )
 
 
-# Ruxsatlarni tekshirish uchun maxsus permission class
-from rest_framework.permissions import BasePermission
-
-
-class IsAdminOrManager(BasePermission):
-    def has_permission(self, request, view):
-        return request.user.is_authenticated and (
-            request.user.role.role in ["admin", "manager"]
-            if hasattr(request.user, "role")
-            else False
-        )
-
+# Token keshi hisoblagichlari (shu jarayon uchun: har bir worker o‘zinikini)
+class AuthCacheStatsView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminOrManager]
 
-class IsAdminOrChef(BasePermission):
-    def has_permission(self, request, view):
-        return request.user.is_authenticated and (
-            request.user.role.role in ["admin", "chef"]
-            if hasattr(request.user, "role")
-            else False
+    def get(self, request):
+        return Response(
+            {
+                "pid": os.getpid(),
+                "shared": settings.AUTH_CACHE_SHARED,
+                **principals.stats(),
+            }
         )
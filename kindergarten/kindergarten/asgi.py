@@ -13,4 +13,19 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'kindergarten.settings')
 
-application = get_asgi_application()
+# Django ilovasi routing (va modellar) import qilinishidan oldin yuklanishi kerak
+django_asgi_app = get_asgi_application()
+
+from channels.auth import AuthMiddlewareStack  # noqa: E402
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+
+from kindergarten.routing import websocket_urlpatterns  # noqa: E402
+
+application = ProtocolTypeRouter(
+    {
+        # HTTP: sinxron DRF view'lar oqimda, /api/async/ view'lari esa event
+        # loop'da (faqat ORM/kesh chaqiruvlari qisqa muddat oqimga o‘tadi)
+        "http": django_asgi_app,
+        "websocket": AuthMiddlewareStack(URLRouter(websocket_urlpatterns)),
+    }
+)
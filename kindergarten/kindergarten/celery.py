@@ -7,8 +7,6 @@ app = Celery("kindergarten")
 
 app.config_from_object("django.conf:settings", namespace="CELERY")
 
-app.conf.broker_url = "redis://localhost:6379/0"
-app.conf.result_backend = "redis://localhost:6379/0"
 app.conf.result_expires = 604800  # 7 kun
 
 app.autodiscover_tasks()
@@ -22,4 +20,12 @@ app.conf.beat_schedule = {
         "task": "inventory.tasks.update_portion_estimates",
         "schedule": 86400.0,  # 1 kun
     },
+    "refresh-materialized-views": {
+        "task": "inventory.tasks.refresh_materialized_views",
+        "schedule": 86400.0,  # 1 kun
+    },
+    "archive-servings": {
+        "task": "inventory.tasks.archive_servings",
+        "schedule": 2592000.0,  # 30 kun
+    },
 }
\ No newline at end of file
@@ -1,6 +1,7 @@
 from django.urls import re_path
-from inventory.consumers import InventoryConsumer
+from inventory.consumers import InventoryConsumer, PortionConsumer
 
 websocket_urlpatterns = [
     re_path(r"ws/inventory/$", InventoryConsumer.as_asgi()),
+    re_path(r"ws/portions/$", PortionConsumer.as_asgi()),
 ]
@@ -0,0 +1,49 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.signals import connection_created
+from django.db.backends.sqlite3 import base
+
+# Ishlab chiqarish profili: WAL — o‘quvchilar yozuvchini kutmaydi,
+# synchronous=NORMAL — WAL'da har commit'da fsync shart emas (elektr uzilsa
+# faqat oxirgi tranzaksiyalar yo‘qolishi mumkin, baza buzilmaydi),
+# busy_timeout — qulf band bo‘lsa darhol "database is locked" o‘rniga kutish,
+# mmap va sahifa keshi o‘qishlarni tezlashtiradi. settings DATABASES'dagi
+# "PRAGMAS" qiymatlari ustun turadi
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,  # manfiy — KiB, ya'ni 64 MiB
+    "temp_store": "MEMORY",
+}
+
+
+TRANSACTION_MODES = ("DEFERRED", "IMMEDIATE", "EXCLUSIVE")
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    # atomic() tranzaksiyasi yozuv qulfini boshidayoq oladi (TRANSACTION_MODE,
+    # standart IMMEDIATE). Oddiy BEGIN'da tranzaksiya avval o‘qiydi, keyin
+    # yozishga o‘tmoqchi bo‘lganda boshqa yozuvchi band qilgan bo‘lsa SQLite
+    # busy_timeout'ni kutmasdan xato qaytaradi. Evaziga faqat o‘qiydigan
+    # atomic() bloklari ham yozuvchilar bilan navbatga turadi — ilovadagi
+    # barcha atomic() bloklari yozadi, autocommit o‘qishlar (WAL) kutmaydi.
+    # Faqat o‘qiydigan tranzaksiyalar ko‘p bo‘lsa: TRANSACTION_MODE=DEFERRED
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict.get("TRANSACTION_MODE", "IMMEDIATE").upper()
+        if mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f"TRANSACTION_MODE quyidagilardan biri bo‘lishi kerak: "
+                f"{', '.join(TRANSACTION_MODES)}"
+            )
+        self.cursor().execute(f"BEGIN {mode}")
+
+
+def configure_connection(sender, connection, **kwargs):
+    pragmas = {**PRAGMAS, **connection.settings_dict.get("PRAGMAS", {})}
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+connection_created.connect(configure_connection, sender=DatabaseWrapper)
@@ -7,6 +7,9 @@ import sys
 def main():
     """Run administrative tasks."""
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'kindergarten.settings')
+    if sys.argv[1:2] == ['test']:
+        # Test keshi va channel layer (settings.TESTING)
+        os.environ.setdefault('DJANGO_TESTING', '1')
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc: